@@ -3,12 +3,12 @@ __author__ = 'pjuluri'
 import config_dash
 from adaptation import calculate_rate_index
 
-def basic_dash(segment_number, bitrates, average_dwn_time,
+def basic_dash(segment_number, ladder, average_dwn_time,
                segment_download_time, curr_rate):
     """
     Module to predict the next_bitrate using the basic_dash algorithm
     :param segment_number: Current segment number
-    :param bitrates: A tuple/list of available bitrates
+    :param ladder: estimators.BitrateLadder of the available bitrates
     :param average_dwn_time: Average download time observed so far
     :param segment_download_time:  Time taken to download the current segment
     :param curr_rate: Current bitrate being used
@@ -24,8 +24,7 @@ def basic_dash(segment_number, bitrates, average_dwn_time,
                                                                                                      updated_dwn_time,
                                                                                                      average_dwn_time))
 
-    #bitrates = [float(i) for i in bitrates]
-    bitrates.sort()
+    bitrates = ladder.bitrates
     try:
         sigma_download = average_dwn_time / segment_download_time
         config_dash.LOG.debug("Sigma Download = {}/{} = {}".format(average_dwn_time, segment_download_time,
@@ -34,8 +33,8 @@ def basic_dash(segment_number, bitrates, average_dwn_time,
         config_dash.LOG.error("Download time = 0. Unable to calculate the sigma_download")
         return curr_rate, updated_dwn_time
     try:
-        curr = bitrates.index(curr_rate)
-    except ValueError:
+        curr = ladder.index[curr_rate]
+    except KeyError:
         config_dash.LOG.error("Current Bitrate not in the bitrate lsit. Setting to minimum")
         curr = calculate_rate_index(bitrates, curr_rate)
     next_rate = curr_rate
@@ -1,37 +1,31 @@
 __author__ = 'pjuluri'
 
+import logging
 import config_dash
 
 
-def basic_dash2(segment_number, bitrates, average_dwn_time,
-                recent_download_sizes, previous_segment_times, current_bitrate):
+def basic_dash2(segment_number, ladder, average_dwn_time, segment_history, current_bitrate):
     """
     Module to predict the next_bitrate using the basic_dash algorithm. Selects the bitrate that is one lower than the
     current network capacity.
     :param segment_number: Current segment number
-    :param bitrates: A tuple/list of available bitrates
+    :param ladder: estimators.BitrateLadder of the available bitrates
     :param average_dwn_time: Average download time observed so far
-    :param segment_download_time:  Time taken to download the current segment
+    :param segment_history: estimators.SegmentHistory of the last BASIC_DELTA_COUNT segments
     :return: next_rate : Bitrate for the next segment
     :return: updated_dwn_time: Updated average download time
     """
-    # Truncating the list of download times and segment sizes
-    while len(previous_segment_times) > config_dash.BASIC_DELTA_COUNT:
-        previous_segment_times.pop(0)
-    while len(recent_download_sizes) > config_dash.BASIC_DELTA_COUNT:
-        recent_download_sizes.pop(0)
-    if len(previous_segment_times) == 0 or len(recent_download_sizes) == 0:
-        return bitrates[0], None
+    if len(segment_history) == 0:
+        return ladder.min, None
 
-    updated_dwn_time = sum(previous_segment_times) / len(previous_segment_times)
+    updated_dwn_time = segment_history.download_times.mean()
 
-    config_dash.LOG.debug("The average download time upto segment {} is {}. Before it was {}".format(segment_number,
-                                                                                                     updated_dwn_time,
-                                                                                                     average_dwn_time))
+    if config_dash.LOG.isEnabledFor(logging.DEBUG):
+        config_dash.LOG.debug("The average download time upto segment {} is {}. Before it was {}".format(
+            segment_number, updated_dwn_time, average_dwn_time))
     # Calculate the running download_rate in Kbps for the most recent segments
-    download_rate = sum(recent_download_sizes) * 8 / (updated_dwn_time * len(previous_segment_times))
-    #bitrates = [float(i) for i in bitrates]
-    bitrates.sort()
+    download_rate = segment_history.sizes.total * 8 / (updated_dwn_time * len(segment_history))
+    bitrates = ladder.bitrates
     next_rate = bitrates[0]
 
     # Check if we need to increase or decrease bitrate
@@ -44,9 +38,9 @@ def basic_dash2(segment_number, bitrates, average_dwn_time,
         else:
             # if the bitrate is not at maximum then select the next higher bitrate
             try:
-                current_index = bitrates.index(current_bitrate)
+                current_index = ladder.index[current_bitrate]
                 next_rate = bitrates[current_index + 1]
-            except ValueError:
+            except KeyError:
                 current_index = bitrates[0]
     else:
         # If the download_rate is lower than the current bitrate then pick the most suitable bitrate
@@ -56,6 +50,7 @@ def basic_dash2(segment_number, bitrates, average_dwn_time,
             else:
                 next_rate = bitrates[index - 1]
                 break
-    config_dash.LOG.info("Basic Adaptation: Download Rate = %dKbps, next_bitrate = %dKbps" % \
-            (int(download_rate) >> 10, next_rate >> 10))
+    if config_dash.LOG.isEnabledFor(logging.INFO):
+        config_dash.LOG.info("Basic Adaptation: Download Rate = %dKbps, next_bitrate = %dKbps" % \
+                (int(download_rate) >> 10, next_rate >> 10))
     return next_rate, updated_dwn_time
\ No newline at end of file
@@ -0,0 +1,236 @@
+"""
+Throughput estimators and bitrate ladders shared by the adaptation algorithms.
+
+The estimators keep the last samples in a fixed-size ring buffer and update their
+running sums in O(1) when a sample is added (the sample that leaves the window is
+subtracted). The sums are recomputed from the window each time the ring buffer wraps,
+so the rounding errors of the subtractions do not add up over a session.
+SlidingPercentile also keeps its window sorted, and EWMA only needs its running average.
+
+A BitrateLadder holds the structures that only depend on the bitrates of the MPD
+(sorted bitrates, index of each bitrate, Netflix rate map), computed once per MPD
+instead of on every decision.
+"""
+from __future__ import division
+from bisect import bisect_left, insort
+from collections import OrderedDict
+import config_dash
+
+
+class RingBuffer(object):
+    """ The last `capacity` values, oldest first """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        # Index of the slot of the next value
+        self.head = 0
+        self.count = 0
+
+    def append(self, value):
+        """ Add a value
+        :return: The value that left the buffer, or None if the buffer was not full
+        """
+        evicted = self.slots[self.head] if self.count == self.capacity else None
+        self.slots[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return evicted
+
+    def wrapped(self):
+        """ :return: True if the last append filled the last slot """
+        return self.head == 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        start = (self.head - self.count) % self.capacity
+        for index in range(start, start + self.count):
+            yield self.slots[index % self.capacity]
+
+
+class SlidingSum(object):
+    """ Sum of the last `window` values """
+    def __init__(self, window):
+        self.values = RingBuffer(window)
+        self.total = 0
+
+    def update(self, value):
+        evicted = self.values.append(value)
+        if self.values.wrapped():
+            self.total = sum(self.values)
+        else:
+            self.total += value - (evicted or 0)
+        return self.total
+
+    def mean(self):
+        """ :return: Mean of the values in the window (0 if empty) """
+        return self.total / len(self.values) if self.values else 0
+
+    def __len__(self):
+        return len(self.values)
+
+
+class HarmonicMean(object):
+    """ Weighted harmonic mean of the last `window` values: sum(weights) / sum(weight / value).
+        http://en.wikipedia.org/wiki/Harmonic_mean#Weighted_harmonic_mean
+    """
+    def __init__(self, window):
+        # (weight, value) of the samples
+        self.samples = RingBuffer(window)
+        self.weights = 0
+        self.inverses = 0
+        # Samples with a value of 0, which make the mean 0
+        self.zeros = 0
+
+    def update(self, value, weight=1):
+        """ Add a sample
+        :return: The updated mean
+        """
+        evicted = self.samples.append((weight, value))
+        if self.samples.wrapped():
+            self.recompute()
+        else:
+            self.add(weight, value, 1)
+            if evicted:
+                self.add(evicted[0], evicted[1], -1)
+        return self.value()
+
+    def add(self, weight, value, sign):
+        self.weights += sign * weight
+        if value:
+            self.inverses += sign * weight / value
+        else:
+            self.zeros += sign
+
+    def recompute(self):
+        """ Recompute the sums from the samples in the window """
+        self.weights = sum(weight for weight, _ in self.samples)
+        self.inverses = sum(weight / value for weight, value in self.samples if value)
+        self.zeros = sum(1 for _, value in self.samples if not value)
+
+    def value(self):
+        """ :return: The harmonic mean (0 if there are no samples or a sample is 0) """
+        if self.zeros or not self.inverses:
+            return 0
+        return self.weights / self.inverses
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class EWMA(object):
+    """ Exponentially weighted moving average: value = alpha * sample + (1 - alpha) * value """
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.mean = None
+
+    def update(self, sample):
+        if self.mean is None:
+            self.mean = sample
+        else:
+            self.mean = self.alpha * sample + (1 - self.alpha) * self.mean
+        return self.mean
+
+    def value(self):
+        """ :return: The average (0 before the first sample) """
+        return self.mean or 0
+
+
+class SlidingPercentile(object):
+    """ Percentiles of the last `window` values.
+        The values of the window are also kept sorted: an update is a bisection and a
+        list insert/delete of at most `window` elements, a percentile is an index.
+    """
+    def __init__(self, window):
+        self.values = RingBuffer(window)
+        self.sorted_values = list()
+
+    def update(self, value):
+        full = len(self.values) == self.values.capacity
+        evicted = self.values.append(value)
+        if full:
+            del self.sorted_values[bisect_left(self.sorted_values, evicted)]
+        insort(self.sorted_values, value)
+
+    def percentile(self, percent):
+        """ :return: The nearest-rank percentile of the window (None if empty) """
+        if not self.sorted_values:
+            return None
+        rank = int(-(-percent * len(self.sorted_values) // 100))
+        return self.sorted_values[min(max(rank, 1), len(self.sorted_values)) - 1]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class SegmentHistory(object):
+    """ Sizes and download times of the last `window` segments, as used by basic_dash2 and fastmpc_dash """
+    def __init__(self, window=None):
+        if window is None:
+            window = config_dash.BASIC_DELTA_COUNT
+        self.sizes = SlidingSum(window)
+        self.download_times = SlidingSum(window)
+        # Harmonic mean of the download rates in Kbps (integers, as in the FastMPC prediction)
+        self.kbps_mean = HarmonicMean(window)
+
+    def update(self, segment_size, segment_download_time):
+        """ Add a downloaded segment (size in bytes, download time in seconds) """
+        self.sizes.update(segment_size)
+        self.download_times.update(segment_download_time)
+        self.kbps_mean.update(int(8 * segment_size / segment_download_time) >> 10)
+
+    def __len__(self):
+        return len(self.sizes)
+
+
+class BitrateLadder(object):
+    """ The bitrates of an MPD with the structures the adaptation algorithms look up """
+    def __init__(self, bitrates, bitrate_unit='Kbps'):
+        """
+        :param bitrate_unit: Unit of the bitrates (see config_dash.BITRATE_UNITS)
+        """
+        self.bitrates = sorted(int(bitrate) for bitrate in bitrates)
+        self.bitrate_unit = bitrate_unit
+        self.key = (tuple(self.bitrates), bitrate_unit)
+        self.index = dict((bitrate, index) for index, bitrate in enumerate(self.bitrates))
+        self.min = self.bitrates[0]
+        self.max = self.bitrates[-1]
+        # Netflix rate map: buffer occupancy markers (ascending) and their bitrates
+        self.rate_map = get_rate_map(self.bitrates)
+        self.rate_map_markers = list(self.rate_map.keys())
+        self.rate_map_bitrates = list(self.rate_map.values())
+
+    def __len__(self):
+        return len(self.bitrates)
+
+    def __iter__(self):
+        return iter(self.bitrates)
+
+
+def get_rate_map(bitrates):
+    """
+    Module to generate the Netflix rate map for the bitrates, reservoir, and cushion
+    """
+    rate_map = OrderedDict()
+    rate_map[config_dash.NETFLIX_RESERVOIR] = bitrates[0]
+    intermediate_levels = bitrates[1:-1]
+    marker_length = (config_dash.NETFLIX_CUSHION - config_dash.NETFLIX_RESERVOIR)/(len(intermediate_levels)+1)
+    current_marker = config_dash.NETFLIX_RESERVOIR + marker_length
+    for bitrate in intermediate_levels:
+        rate_map[current_marker] = bitrate
+        current_marker += marker_length
+    rate_map[config_dash.NETFLIX_CUSHION] = bitrates[-1]
+    return rate_map
+
+
+# (bitrates, bitrate unit) -> BitrateLadder
+LADDERS = dict()
+
+
+def get_ladder(bitrates, bitrate_unit='Kbps'):
+    """ :return: The BitrateLadder of the bitrates (cached) """
+    key = (tuple(bitrates), bitrate_unit)
+    if key not in LADDERS:
+        LADDERS[key] = BitrateLadder(bitrates, bitrate_unit)
+    return LADDERS[key]
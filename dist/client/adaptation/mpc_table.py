@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+"""
+Lookup tables of the FastMPC adaptation (adaptation/fastmpc_dash.py)
+
+    Yin, Xiaoqi, et al. "A control-theoretic approach for dynamic adaptive video streaming over HTTP."
+    Proceedings of the 2015 ACM conference on SIGCOMM. ACM, 2015.
+
+A table gives the next bitrate for every (predicted bandwidth, buffer length, previous bitrate)
+bin. It is stored as a NumPy .npy array of uint8 bitrate indices with the shape
+(bandwidth bins, buffer bins, bitrates) and a .json file with the bins and the bitrates.
+The bandwidth bins are in Kbps. The bitrates are those of the MPD, in its unit (bps for the
+MPD files, Kbps for the config files), and are converted to Kbps to solve the MPC problem.
+The .npy file is memory-mapped on the first lookup.
+
+The tables are generated by solving the MPC problem exhaustively: for every bin, all the
+bitrate sequences over the horizon are scored with the QoE of DashPlayer.sum_qoe
+(bitrate - bitrate switches - rebuffering) and the first bitrate of the best one is kept.
+The horizon is shortened for the large sets of bitrates (see config_dash.MPC_MAX_SEQUENCES).
+
+To generate the table for the bitrates of an MPD/config file:
+    python dist/client/adaptation/mpc_table.py -m dist/sample_mpd/mot17-10.config
+To convert a text table (bw<TAB>buffer<TAB>prerate<TAB>next lines):
+    python dist/client/adaptation/mpc_table.py -l mpc_table.log -o MPC_TABLES/mpc_table.npy
+"""
+from __future__ import division
+import os
+import sys
+import math
+import json
+import logging
+import hashlib
+import itertools
+from argparse import ArgumentParser
+from multiprocessing import Pool, cpu_count, current_process
+sys.path.append("./dist/util/")
+import numpy as np
+import config_dash
+
+# Sequences of bitrate indices for each (number of bitrates, horizon)
+SEQUENCE_CACHE = dict()
+# Maximum number of (buffer bin, sequence) scores computed at once
+BLOCK_SIZE = 1 << 21
+
+
+class LookupTable:
+    """ FastMPC lookup table loaded from a .npy file and its .json metadata """
+    def __init__(self, fname):
+        self.fname = fname
+        with open(get_metadata_file(fname)) as metadata_file:
+            self.metadata = json.load(metadata_file)
+        self.bitrates = self.metadata['bitrates']
+        self.prerate_bins = dict((bitrate, index) for index, bitrate in enumerate(self.bitrates))
+        self.bw_start, self.gap_bw, self.bw_count = self.metadata['bw_bins']
+        self.buffer_start, self.gap_buffer, self.buffer_count = self.metadata['buffer_bins']
+        self.bitrate_array = np.array(self.bitrates)
+        self.lookup_table = None
+
+    def load(self):
+        """ Memory-map the table """
+        if self.lookup_table is None:
+            self.lookup_table = np.load(self.fname, mmap_mode='r')
+            config_dash.LOG.info("FastMPC: loaded the lookup table {} {}".format(self.fname,
+                                                                                self.lookup_table.shape))
+        return self.lookup_table
+
+    def get_indices(self, bw, buffer):
+        """ :return: The bandwidth and buffer bins of bw and buffer (scalars or arrays) """
+        index_bw = np.clip(np.floor((np.asarray(bw, dtype=float) - self.bw_start) / self.gap_bw),
+                           0, self.bw_count - 1).astype(int)
+        index_buffer = np.clip(np.floor((np.asarray(buffer, dtype=float) - self.buffer_start) / self.gap_buffer),
+                               0, self.buffer_count - 1).astype(int)
+        return index_bw, index_buffer
+
+    def get_next_rates(self, bw, buffer, pre_rate):
+        """ Vectorized get_next_rate
+        :param bw: Array of predicted bandwidths (Kbps)
+        :param buffer: Array of buffer lengths (seconds)
+        :param pre_rate: Array of previous bitrates (unit of the MPD)
+        :return: Array of the next bitrates (unit of the MPD)
+        """
+        index_bw, index_buffer = self.get_indices(bw, buffer)
+        index_prerate = np.searchsorted(self.bitrate_array, pre_rate)
+        return self.bitrate_array[self.load()[index_bw, index_buffer, index_prerate]]
+
+    def get_next_rate(self, bw, buffer, pre_rate):
+        """ Scalar get_next_rate. Same bins as get_indices, without the NumPy overhead of one decision """
+        index_bw = int(min(max(math.floor((float(bw) - self.bw_start) / self.gap_bw), 0), self.bw_count - 1))
+        index_buffer = int(min(max(math.floor((float(buffer) - self.buffer_start) / self.gap_buffer), 0),
+                               self.buffer_count - 1))
+        next_rate = self.bitrates[int(self.load()[index_bw, index_buffer, self.prerate_bins[pre_rate]])]
+        if config_dash.LOG.isEnabledFor(logging.INFO):
+            config_dash.LOG.info("FastMPC: bw: {} Kbps buffer: {} rate: {} next_bitrate: {}".format(
+                bw, buffer, pre_rate, next_rate))
+        return next_rate
+
+
+def get_metadata_file(fname):
+    """ :return: The .json metadata file of the .npy table """
+    return os.path.splitext(fname)[0] + ".json"
+
+
+def save_table(fname, table, metadata):
+    """ Write the table and its metadata. The files are renamed into place once complete """
+    folder = os.path.dirname(fname)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(fname + ".tmp", 'wb') as table_file:
+        np.save(table_file, np.ascontiguousarray(table, dtype=np.uint8))
+    with open(get_metadata_file(fname) + ".tmp", 'w') as metadata_file:
+        json.dump(metadata, metadata_file, indent=2, sort_keys=True)
+    os.rename(get_metadata_file(fname) + ".tmp", get_metadata_file(fname))
+    os.rename(fname + ".tmp", fname)
+    config_dash.LOG.info("FastMPC: wrote the lookup table {} {}".format(fname, table.shape))
+
+
+def get_sequences(bitrate_count, horizon):
+    """ :return: Array (bitrate_count ** horizon, horizon) of all the sequences of bitrate indices """
+    key = (bitrate_count, horizon)
+    if key not in SEQUENCE_CACHE:
+        SEQUENCE_CACHE[key] = np.array(list(itertools.product(range(bitrate_count), repeat=horizon)),
+                                       dtype=np.uint8).reshape(-1, horizon)
+    return SEQUENCE_CACHE[key]
+
+
+def solve_bw_row(args):
+    """ Solve the MPC problem for all the buffer bins and previous bitrates of one bandwidth bin
+    :param args: (bw, buffer_bins, bitrates, segment_duration, buffer_size, parameters)
+    :return: Array (buffer bins, bitrates) of the indices of the next bitrates
+    """
+    bw, buffer_bins, bitrates, segment_duration, buffer_size, parameters = args
+    bitrates = np.array(bitrates, dtype=float)
+    sequences = get_sequences(len(bitrates), parameters['horizon'])
+    rates = bitrates[sequences]
+    # Download time of each segment of the sequences
+    download_times = rates * segment_duration / max(bw, 1)
+    quality = rates.sum(axis=1) - parameters['smooth_penalty'] * np.abs(np.diff(rates, axis=1)).sum(axis=1)
+    # Switch penalty from the previous bitrate (columns) to the first bitrate of the sequence (rows)
+    first_switch = parameters['smooth_penalty'] * np.abs(bitrates[:, None] - bitrates[None, :])
+    next_rates = np.empty((len(buffer_bins), len(bitrates)), dtype=np.uint8)
+    block = max(1, BLOCK_SIZE // len(sequences))
+    for first in range(0, len(buffer_bins), block):
+        buffer = np.repeat(np.asarray(buffer_bins[first:first + block], dtype=float)[:, None], len(sequences), axis=1)
+        rebuffer = np.zeros_like(buffer)
+        for segment in range(parameters['horizon']):
+            rebuffer += np.maximum(download_times[:, segment] - buffer, 0)
+            buffer = np.minimum(np.maximum(buffer - download_times[:, segment], 0) + segment_duration, buffer_size)
+        score = quality - parameters['rebuffer_penalty'] * rebuffer
+        # The sequences are ordered by their first bitrate: best score for each first bitrate
+        best_scores = score.reshape(len(score), len(bitrates), -1).max(axis=2)
+        next_rates[first:first + block] = np.argmax(best_scores[:, :, None] - first_switch[None], axis=1)
+    return next_rates
+
+
+def get_horizon(bitrate_count):
+    """ :return: config_dash.MPC_HORIZON, or less if there would be more than MPC_MAX_SEQUENCES sequences """
+    horizon = config_dash.MPC_HORIZON
+    while horizon > 1 and bitrate_count ** horizon > config_dash.MPC_MAX_SEQUENCES:
+        horizon -= 1
+    return horizon
+
+
+def get_parameters(bitrate_count):
+    """ :return: The MPC parameters of config_dash for the number of bitrates """
+    return {'horizon': get_horizon(bitrate_count),
+            'rebuffer_penalty': config_dash.MPC_REBUFFER_PENALTY,
+            'smooth_penalty': config_dash.MPC_SMOOTH_PENALTY}
+
+
+def get_kbps(bitrates, bitrate_unit):
+    """ :return: The bitrates in Kbps """
+    return [bitrate * config_dash.BITRATE_UNITS[bitrate_unit] / 1000 for bitrate in bitrates]
+
+
+def generate_table(fname, bitrates, segment_duration, processes=None, bitrate_unit='Kbps'):
+    """ Generate the lookup table for the bitrates
+    :param bitrates: The available bitrates
+    :param segment_duration: Playback duration of each segment (seconds)
+    :param processes: Number of worker processes. Default: number of cores
+    :param bitrate_unit: Unit of the bitrates (see config_dash.BITRATE_UNITS)
+    """
+    bitrates = sorted(bitrates)
+    # The bandwidth bins and the QoE weights of the MPC problem are in Kbps
+    rates = get_kbps(bitrates, bitrate_unit)
+    parameters = get_parameters(len(bitrates))
+    buffer_size = config_dash.NETFLIX_BUFFER_SIZE * segment_duration
+    bw_bins = np.linspace(0, config_dash.MPC_MAX_BW_FACTOR * rates[-1], config_dash.MPC_BW_BINS)
+    buffer_bins = np.linspace(0, buffer_size, config_dash.MPC_BUFFER_BINS)
+    config_dash.LOG.info("FastMPC: generating the lookup table for {} with {} sequences per bin".format(
+        bitrates, len(bitrates) ** parameters['horizon']))
+    rows = [(bw, buffer_bins, rates, segment_duration, buffer_size, parameters) for bw in bw_bins]
+    if processes == 1 or current_process().daemon:
+        # Worker processes (Eg: of dash_sweep.py) cannot have their own pool
+        table = map(solve_bw_row, rows)
+    else:
+        pool = Pool(processes or cpu_count())
+        try:
+            table = pool.map(solve_bw_row, rows)
+        finally:
+            pool.close()
+            pool.join()
+    metadata = {'bitrates': bitrates,
+                'bitrate_unit': bitrate_unit,
+                'bw_bins': [0, float(bw_bins[1] - bw_bins[0]), len(bw_bins)],
+                'buffer_bins': [0, float(buffer_bins[1] - buffer_bins[0]), len(buffer_bins)],
+                'segment_duration': segment_duration,
+                'buffer_size': buffer_size,
+                'parameters': parameters}
+    save_table(fname, np.array(table), metadata)
+    return fname
+
+
+def convert_legacy_table(text_fname, fname):
+    """ Convert a text table (bw<TAB>buffer<TAB>prerate<TAB>next lines) to the .npy format """
+    rows = list()
+    with open(text_fname, "r") as fin:
+        for line in fin:
+            words = line.split("\t")
+            if words[0].isdigit():
+                rows.append((int(words[0]), float(words[1]), int(words[2]), int(words[3])))
+    rows = np.array(rows)
+    bw_bins = np.unique(rows[:, 0])
+    buffer_bins = np.unique(rows[:, 1])
+    bitrates = np.unique(np.concatenate((rows[:, 2], rows[:, 3]))).astype(int)
+    table = np.zeros((len(bw_bins), len(buffer_bins), len(bitrates)), dtype=np.uint8)
+    table[np.searchsorted(bw_bins, rows[:, 0]), np.searchsorted(buffer_bins, rows[:, 1]),
+          np.searchsorted(bitrates, rows[:, 2])] = np.searchsorted(bitrates, rows[:, 3])
+    metadata = {'bitrates': bitrates.tolist(),
+                'bw_bins': [float(bw_bins[0]), (bw_bins[-1] - bw_bins[0]) / (len(bw_bins) - 1), len(bw_bins)],
+                'buffer_bins': [float(buffer_bins[0]), (buffer_bins[-1] - buffer_bins[0]) / (len(buffer_bins) - 1),
+                                len(buffer_bins)],
+                'source': text_fname}
+    save_table(fname, table, metadata)
+    return fname
+
+
+def get_table_fname(bitrates, segment_duration, bitrate_unit='Kbps'):
+    """ :return: The file of the generated table for the bitrates in config_dash.MPC_TABLE_FOLDER """
+    key = json.dumps([sorted(bitrates), bitrate_unit, segment_duration, config_dash.NETFLIX_BUFFER_SIZE,
+                      config_dash.MPC_BW_BINS, config_dash.MPC_BUFFER_BINS, config_dash.MPC_MAX_BW_FACTOR,
+                      get_parameters(len(bitrates))],
+                     sort_keys=True)
+    return os.path.join(config_dash.MPC_TABLE_FOLDER, "mpc_table_{}.npy".format(hashlib.md5(key).hexdigest()[:12]))
+
+
+def get_lookup_table(bitrates, segment_duration, bitrate_unit='Kbps'):
+    """ :return: LookupTable of config_dash.LOOKUP_FNAME or of the bitrates (generated if it does not exist) """
+    if config_dash.LOOKUP_FNAME:
+        fname = config_dash.LOOKUP_FNAME
+        if not fname.endswith(".npy"):
+            npy_fname = os.path.join(config_dash.MPC_TABLE_FOLDER,
+                                     os.path.splitext(os.path.basename(fname))[0] + ".npy")
+            if not os.path.exists(npy_fname):
+                convert_legacy_table(fname, npy_fname)
+            fname = npy_fname
+    else:
+        fname = get_table_fname(bitrates, segment_duration, bitrate_unit)
+        if not os.path.exists(fname):
+            generate_table(fname, bitrates, segment_duration, bitrate_unit=bitrate_unit)
+    return LookupTable(fname)
+
+
+def create_arguments(parser):
+    """ Adding arguments to the parser """
+    parser.add_argument('-m', '--MPD', help="Local MPD/config file with the bitrates")
+    parser.add_argument('-b', '--BITRATES', nargs='+', type=int, help="Bitrates (Kbps) if there is no MPD file")
+    parser.add_argument('-d', '--SEGMENT_DURATION', type=float, help="Segment duration (seconds). Default from the MPD")
+    parser.add_argument('-l', '--LEGACY', help="Text table to convert")
+    parser.add_argument('-o', '--OUTPUT', help="Table file (.npy). Default in %s" % config_dash.MPC_TABLE_FOLDER)
+    parser.add_argument('-j', '--PROCESSES', type=int, help="Number of worker processes. Default number of cores")
+
+
+def main():
+    """ Main Program wrapper """
+    parser = ArgumentParser(description='Generate the FastMPC lookup tables')
+    create_arguments(parser)
+    args = parser.parse_args()
+    from configure_log_file import configure_log_file
+    configure_log_file(log_file=None)
+    if args.LEGACY:
+        fname = args.OUTPUT or os.path.join(config_dash.MPC_TABLE_FOLDER,
+                                            os.path.splitext(os.path.basename(args.LEGACY))[0] + ".npy")
+        convert_legacy_table(args.LEGACY, fname)
+        return
+    bitrates, segment_duration, bitrate_unit = args.BITRATES, args.SEGMENT_DURATION, 'Kbps'
+    if args.MPD:
+        import read_mpd
+        sys.path.append("./dist/server/")
+        from virtual_video import DashPlayback
+        dp_object, segment_duration = read_mpd.read_mpd(args.MPD, DashPlayback())
+        bitrates = dp_object.video.keys()
+        bitrate_unit = dp_object.manifest.bitrate_unit
+        segment_duration = args.SEGMENT_DURATION or segment_duration
+    if not bitrates or not segment_duration:
+        parser.error("The bitrates and the segment duration are needed (-m or -b and -d)")
+    generate_table(args.OUTPUT or get_table_fname(bitrates, segment_duration, bitrate_unit), bitrates,
+                   segment_duration, args.PROCESSES, bitrate_unit)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
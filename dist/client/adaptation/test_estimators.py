@@ -0,0 +1,179 @@
+""" Tests of estimators.py. Run from the root of the repository with:
+    python -m unittest discover -s dist/client/adaptation -p 'test_*.py'
+"""
+from __future__ import division
+import os
+import sys
+import math
+import random
+import unittest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "util"))
+import config_dash
+import estimators
+
+
+def get_harmonic_mean(samples):
+    """ :return: Weighted harmonic mean of the (weight, value) samples, computed from scratch """
+    if not samples or any(value == 0 for _, value in samples):
+        return 0
+    return sum(weight for weight, _ in samples) / sum(weight / value for weight, value in samples)
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_eviction(self):
+        ring = estimators.RingBuffer(3)
+        self.assertEqual([ring.append(value) for value in range(3)], [None, None, None])
+        self.assertTrue(ring.wrapped())
+        self.assertEqual(ring.append(3), 0)
+        self.assertEqual(ring.append(4), 1)
+        self.assertFalse(ring.wrapped())
+        self.assertEqual(len(ring), 3)
+
+    def test_order(self):
+        ring = estimators.RingBuffer(4)
+        self.assertEqual(list(ring), [])
+        for value in range(10):
+            ring.append(value)
+            # Oldest first, across the wrap-arounds
+            self.assertEqual(list(ring), list(range(max(0, value - 3), value + 1)))
+
+    def test_evicted_none(self):
+        """ A None value is stored like the others """
+        ring = estimators.RingBuffer(2)
+        ring.append(None)
+        ring.append(1)
+        self.assertEqual(list(ring), [None, 1])
+        self.assertEqual(ring.append(2), None)
+        self.assertEqual(list(ring), [1, 2])
+
+
+class SlidingSumTest(unittest.TestCase):
+    def test_window(self):
+        sliding_sum = estimators.SlidingSum(3)
+        self.assertEqual(sliding_sum.mean(), 0)
+        values = [5, 1, 7, 2, 9, 4, 4, 8]
+        for count, value in enumerate(values, 1):
+            window = values[max(0, count - 3):count]
+            self.assertEqual(sliding_sum.update(value), sum(window))
+            self.assertEqual(sliding_sum.mean(), sum(window) / len(window))
+            self.assertEqual(len(sliding_sum), len(window))
+
+    def test_rounding(self):
+        """ The sum is recomputed at each wrap-around, so the rounding errors do not add up """
+        random.seed(1)
+        sliding_sum = estimators.SlidingSum(5)
+        values = [random.uniform(0, 1e6) * 10 ** random.randint(-6, 6) for _ in range(10000)]
+        for value in values:
+            sliding_sum.update(value)
+        self.assertTrue(sliding_sum.values.wrapped())
+        self.assertEqual(sliding_sum.total, sum(values[-5:]))
+
+
+class HarmonicMeanTest(unittest.TestCase):
+    def test_window(self):
+        random.seed(2)
+        harmonic_mean = estimators.HarmonicMean(4)
+        self.assertEqual(harmonic_mean.value(), 0)
+        samples = [(random.uniform(0.5, 2), random.uniform(100, 5000)) for _ in range(50)]
+        for count, (weight, value) in enumerate(samples, 1):
+            window = samples[max(0, count - 4):count]
+            self.assertAlmostEqual(harmonic_mean.update(value, weight), get_harmonic_mean(window), places=6)
+            self.assertEqual(len(harmonic_mean), len(window))
+
+    def test_zero_eviction(self):
+        """ A sample of 0 makes the mean 0 until it leaves the window """
+        harmonic_mean = estimators.HarmonicMean(3)
+        harmonic_mean.update(100)
+        self.assertEqual(harmonic_mean.update(0), 0)
+        self.assertEqual(harmonic_mean.update(300), 0)
+        # Evicts 100: the window wraps and the sums are recomputed
+        self.assertEqual(harmonic_mean.update(300), 0)
+        # Evicts the 0
+        self.assertAlmostEqual(harmonic_mean.update(300), 300)
+        self.assertEqual(harmonic_mean.zeros, 0)
+
+    def test_segment_history(self):
+        """ Same prediction as the harmonic mean of the FastMPC paper, on the last BASIC_DELTA_COUNT segments """
+        history = estimators.SegmentHistory(3)
+        segments = [(100000, 1.0), (250000, 0.5), (80000, 2.0), (500000, 0.8)]
+        for segment_size, download_time in segments:
+            history.update(segment_size, download_time)
+        rates = [int(8 * segment_size / download_time) >> 10 for segment_size, download_time in segments[-3:]]
+        self.assertAlmostEqual(history.kbps_mean.value(), len(rates) / sum(1 / rate for rate in rates))
+        self.assertEqual(history.sizes.total, 250000 + 80000 + 500000)
+        self.assertEqual(len(history), 3)
+        self.assertEqual(len(estimators.SegmentHistory()), 0)
+        self.assertEqual(estimators.SegmentHistory().sizes.values.capacity, config_dash.BASIC_DELTA_COUNT)
+
+
+class EWMATest(unittest.TestCase):
+    def test_average(self):
+        ewma = estimators.EWMA(0.25)
+        self.assertEqual(ewma.value(), 0)
+        # The first sample is the average
+        self.assertEqual(ewma.update(1000), 1000)
+        self.assertEqual(ewma.update(2000), 1250)
+        self.assertEqual(ewma.update(0), 937.5)
+        self.assertEqual(ewma.value(), 937.5)
+
+    def test_recurrence(self):
+        random.seed(3)
+        ewma = estimators.EWMA(0.1)
+        samples = [random.uniform(100, 5000) for _ in range(100)]
+        for sample in samples:
+            ewma.update(sample)
+        # Closed form: the weight of a sample decays by (1 - alpha) per newer sample
+        expected = samples[0] * 0.9 ** 99 + sum(0.1 * sample * 0.9 ** (99 - index)
+                                                for index, sample in enumerate(samples) if index)
+        self.assertAlmostEqual(ewma.value(), expected, places=6)
+
+
+def get_percentile(values, percent):
+    """ :return: Nearest-rank percentile of the values, computed from scratch """
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100 * len(ordered)))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class SlidingPercentileTest(unittest.TestCase):
+    def test_window(self):
+        random.seed(4)
+        sliding_percentile = estimators.SlidingPercentile(7)
+        self.assertEqual(sliding_percentile.percentile(50), None)
+        # Repeated values, so the evicted value has duplicates in the sorted window
+        values = [random.randint(0, 20) for _ in range(200)]
+        for count, value in enumerate(values, 1):
+            sliding_percentile.update(value)
+            window = values[max(0, count - 7):count]
+            self.assertEqual(sliding_percentile.sorted_values, sorted(window))
+            self.assertEqual(len(sliding_percentile), len(window))
+            for percent in (0, 10, 50, 90, 100):
+                self.assertEqual(sliding_percentile.percentile(percent), get_percentile(window, percent))
+
+    def test_nearest_rank(self):
+        sliding_percentile = estimators.SlidingPercentile(4)
+        for value in (400, 100, 300, 200):
+            sliding_percentile.update(value)
+        self.assertEqual([sliding_percentile.percentile(percent) for percent in (0, 25, 26, 50, 75, 100)],
+                         [100, 100, 200, 200, 300, 400])
+        # Evicts 400
+        sliding_percentile.update(50)
+        self.assertEqual(sliding_percentile.percentile(100), 300)
+        self.assertEqual(sliding_percentile.percentile(0), 50)
+
+
+class BitrateLadderTest(unittest.TestCase):
+    def test_ladder(self):
+        ladder = estimators.get_ladder([3000, 1200, 6000, 2000], 'Kbps')
+        self.assertEqual(ladder.bitrates, [1200, 2000, 3000, 6000])
+        self.assertEqual(ladder.index[3000], 2)
+        self.assertEqual((ladder.min, ladder.max), (1200, 6000))
+        self.assertEqual(ladder.rate_map_markers[0], config_dash.NETFLIX_RESERVOIR)
+        self.assertEqual(ladder.rate_map_markers[-1], config_dash.NETFLIX_CUSHION)
+        self.assertEqual(ladder.rate_map_bitrates, ladder.bitrates)
+        self.assertTrue(estimators.get_ladder([3000, 1200, 6000, 2000], 'Kbps') is ladder)
+        self.assertNotEqual(estimators.get_ladder([3000, 1200, 6000, 2000], 'bps').key, ladder.key)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+""" Tests of mpc_table.py. Run from the root of the repository with:
+    python -m unittest discover -s dist/client/adaptation -p 'test_*.py'
+"""
+from __future__ import division
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import itertools
+import unittest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "util"))
+import numpy as np
+import config_dash
+import mpc_table
+
+# Bitrates of an MPD file (bps)
+BPS_BITRATES = [300000, 750000, 1500000, 3000000]
+SEGMENT_DURATION = 4
+# Small tables so that each test generates its tables in a fraction of a second
+TEST_CONFIG = {'MPC_HORIZON': 3,
+               'MPC_BW_BINS': 21,
+               'MPC_BUFFER_BINS': 13,
+               'NETFLIX_BUFFER_SIZE': 6,
+               'MPC_MAX_SEQUENCES': 10000,
+               'LOOKUP_FNAME': None}
+
+
+def get_score(sequence, bw, buffer, segment_duration, buffer_size, previous, parameters):
+    """ QoE of a sequence of bitrates (Kbps), as scored by the MPC problem, one segment at a time """
+    score = 0
+    for rate in sequence:
+        download_time = rate * segment_duration / max(bw, 1)
+        score += rate - parameters['smooth_penalty'] * abs(rate - previous)
+        score -= parameters['rebuffer_penalty'] * max(download_time - buffer, 0)
+        buffer = min(max(buffer - download_time, 0) + segment_duration, buffer_size)
+        previous = rate
+    return score
+
+
+def get_best_scores(rates, bw, buffer, segment_duration, buffer_size, previous, parameters):
+    """ :return: Best score of the sequences of the horizon for each first bitrate, by brute force """
+    best_scores = dict()
+    for sequence in itertools.product(rates, repeat=parameters['horizon']):
+        score = get_score(sequence, bw, buffer, segment_duration, buffer_size, previous, parameters)
+        best_scores[sequence[0]] = max(best_scores.get(sequence[0], score), score)
+    return best_scores
+
+
+class MpcTableTest(unittest.TestCase):
+    def setUp(self):
+        config_dash.LOG = logging.getLogger(config_dash.LOG_NAME)
+        self.saved_config = dict((name, getattr(config_dash, name)) for name in TEST_CONFIG)
+        self.saved_folder = config_dash.MPC_TABLE_FOLDER
+        for name, value in TEST_CONFIG.items():
+            setattr(config_dash, name, value)
+        config_dash.MPC_TABLE_FOLDER = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(config_dash.MPC_TABLE_FOLDER)
+        config_dash.MPC_TABLE_FOLDER = self.saved_folder
+        for name, value in self.saved_config.items():
+            setattr(config_dash, name, value)
+
+    def get_table(self, bitrates, bitrate_unit):
+        fname = mpc_table.get_table_fname(bitrates, SEGMENT_DURATION, bitrate_unit)
+        mpc_table.generate_table(fname, bitrates, SEGMENT_DURATION, processes=1, bitrate_unit=bitrate_unit)
+        return mpc_table.LookupTable(fname)
+
+    def test_metadata(self):
+        table = self.get_table(BPS_BITRATES, 'bps')
+        self.assertEqual(table.bitrates, BPS_BITRATES)
+        self.assertEqual(table.metadata['bitrate_unit'], 'bps')
+        self.assertEqual(table.load().shape, (TEST_CONFIG['MPC_BW_BINS'], TEST_CONFIG['MPC_BUFFER_BINS'],
+                                              len(BPS_BITRATES)))
+        # The bandwidth bins are in Kbps
+        self.assertAlmostEqual(table.gap_bw * (table.bw_count - 1),
+                               config_dash.MPC_MAX_BW_FACTOR * BPS_BITRATES[-1] / 1000)
+
+    def test_brute_force(self):
+        """ The table gives the first bitrate of a best sequence for every bin of a bps ladder """
+        table = self.get_table(BPS_BITRATES, 'bps')
+        rates = mpc_table.get_kbps(BPS_BITRATES, 'bps')
+        buffer_size = table.metadata['buffer_size']
+        parameters = table.metadata['parameters']
+        for index_bw, index_buffer in itertools.product(range(table.bw_count), range(table.buffer_count)):
+            bw = index_bw * table.gap_bw
+            buffer = index_buffer * table.gap_buffer
+            for previous, previous_rate in zip(BPS_BITRATES, rates):
+                # Lookup in the middle of the bin
+                next_rate = table.get_next_rate(bw + table.gap_bw / 2, buffer + table.gap_buffer / 2, previous)
+                best_scores = get_best_scores(rates, bw, buffer, SEGMENT_DURATION, buffer_size, previous_rate,
+                                              parameters)
+                self.assertAlmostEqual(best_scores[rates[BPS_BITRATES.index(next_rate)]],
+                                       max(best_scores.values()), places=6,
+                                       msg="bw {} buffer {} previous {}".format(bw, buffer, previous))
+
+    def test_vectorized(self):
+        table = self.get_table(BPS_BITRATES, 'bps')
+        bws = np.linspace(0, 7000, 50)
+        buffers = np.linspace(0, 30, 50)
+        previous = np.array(BPS_BITRATES * 13)[:50]
+        expected = [table.get_next_rate(bw, buffer, pre_rate) for bw, buffer, pre_rate in zip(bws, buffers, previous)]
+        self.assertEqual(table.get_next_rates(bws, buffers, previous).tolist(), expected)
+
+    def test_units(self):
+        """ The table of a bps ladder makes the same decisions as the table of the same ladder in Kbps """
+        bps_table = self.get_table(BPS_BITRATES, 'bps')
+        kbps_bitrates = [bitrate // 1000 for bitrate in BPS_BITRATES]
+        kbps_table = self.get_table(kbps_bitrates, 'Kbps')
+        self.assertNotEqual(bps_table.fname, kbps_table.fname)
+        self.assertEqual(bps_table.load().tolist(), kbps_table.load().tolist())
+
+    def test_mpd_ladder(self):
+        """ The measured bandwidth (Kbps) picks the bitrates of a bps ladder above the lowest one """
+        table = self.get_table(BPS_BITRATES, 'bps')
+        buffer_size = table.metadata['buffer_size']
+        self.assertEqual(table.get_next_rate(10000, buffer_size, BPS_BITRATES[-1]), BPS_BITRATES[-1])
+        self.assertGreater(table.get_next_rate(2000, buffer_size / 2, BPS_BITRATES[1]), BPS_BITRATES[0])
+        self.assertEqual(table.get_next_rate(0, 0, BPS_BITRATES[0]), BPS_BITRATES[0])
+
+    def test_horizon(self):
+        """ The horizon is shortened so that there are at most MPC_MAX_SEQUENCES sequences """
+        self.assertEqual(mpc_table.get_horizon(len(BPS_BITRATES)), TEST_CONFIG['MPC_HORIZON'])
+        config_dash.MPC_MAX_SEQUENCES = 400
+        self.assertEqual(mpc_table.get_horizon(20), 2)
+        self.assertEqual(mpc_table.get_horizon(500), 1)
+        self.assertEqual(mpc_table.get_parameters(20)['horizon'], 2)
+        # The horizon is part of the key of the table
+        self.assertNotEqual(mpc_table.get_table_fname(range(20), SEGMENT_DURATION),
+                            mpc_table.get_table_fname(range(4), SEGMENT_DURATION))
+
+    def test_blocks(self):
+        """ Solving the buffer bins in blocks gives the same table """
+        table = self.get_table(BPS_BITRATES, 'bps').load().tolist()
+        block_size = mpc_table.BLOCK_SIZE
+        # Blocks of 2 buffer bins, the last one shorter
+        mpc_table.BLOCK_SIZE = 2 * len(BPS_BITRATES) ** TEST_CONFIG['MPC_HORIZON']
+        try:
+            self.assertEqual(self.get_table(BPS_BITRATES, 'bps').load().tolist(), table)
+        finally:
+            mpc_table.BLOCK_SIZE = block_size
+
+    def test_get_lookup_table(self):
+        table = mpc_table.get_lookup_table(BPS_BITRATES, SEGMENT_DURATION, 'bps')
+        modified = os.path.getmtime(table.fname)
+        # The generated table is reused
+        self.assertEqual(mpc_table.get_lookup_table(BPS_BITRATES, SEGMENT_DURATION, 'bps').fname, table.fname)
+        self.assertEqual(os.path.getmtime(table.fname), modified)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,19 +1,19 @@
 __author__ = 'pjuluri'
 
+import logging
 import config_dash
 
 
-def weighted_dash(bitrates, dash_player, weighted_dwn_rate, curr_bitrate, next_segment_sizes):
+def weighted_dash(ladder, dash_player, weighted_dwn_rate, curr_bitrate, next_segment_sizes):
     """
     Module to predict the next_bitrate using the weighted_dash algorithm
-    :param bitrates: List of bitrates
+    :param ladder: estimators.BitrateLadder of the available bitrates
     :param weighted_dwn_rate:
     :param curr_bitrate:
     :param next_segment_sizes: A dict mapping bitrate: size of next segment
     :return: next_bitrate, delay
     """
-    bitrates = [int(i) for i in bitrates]
-    bitrates.sort()
+    bitrates = ladder.bitrates
     # Waiting time before downloading the next segment
     delay = 0
     next_bitrate = None
@@ -21,12 +21,13 @@ def weighted_dash(bitrates, dash_player, weighted_dwn_rate, curr_bitrate, next_s
     # If the buffer is less that the Initial buffer, playback remains at th lowest bitrate
     # i.e dash_buffer.current_buffer < dash_buffer.initial_buffer
     available_video_duration = available_video_segments * dash_player.segment_duration
-    config_dash.LOG.debug("Buffer_length = {} Initial Buffer = {} Available video = {} seconds, alpha = {}. "
-                          "Beta = {} WDR = {}, curr Rate = {}".format(dash_player.buffer.qsize(),
-                                                                      dash_player.initial_buffer,
-                                                                      available_video_duration, dash_player.alpha,
-                                                                      dash_player.beta, weighted_dwn_rate,
-                                                                      curr_bitrate))
+    if config_dash.LOG.isEnabledFor(logging.DEBUG):
+        config_dash.LOG.debug("Buffer_length = {} Initial Buffer = {} Available video = {} seconds, alpha = {}. "
+                              "Beta = {} WDR = {}, curr Rate = {}".format(dash_player.buffer.qsize(),
+                                                                          dash_player.initial_buffer,
+                                                                          available_video_duration, dash_player.alpha,
+                                                                          dash_player.beta, weighted_dwn_rate,
+                                                                          curr_bitrate))
 
     if weighted_dwn_rate == 0 or available_video_segments == 0:
         next_bitrate = bitrates[0]
@@ -44,24 +45,25 @@ def weighted_dash(bitrates, dash_player, weighted_dwn_rate, curr_bitrate, next_s
             next_bitrate = bitrates[0]
     elif available_video_segments <= dash_player.alpha:
         config_dash.LOG.debug("available_video <= dash_player.alpha")
-        if curr_bitrate >= max(bitrates):
+        if curr_bitrate >= ladder.max:
             config_dash.LOG.info("Current bitrate is MAX = {}".format(curr_bitrate))
             next_bitrate = curr_bitrate
         else:
-            higher_bitrate = bitrates[bitrates.index(curr_bitrate)+1]
+            higher_bitrate = bitrates[ladder.index[curr_bitrate]+1]
             # Jump only one if suitable else stick to the current bitrate
-            config_dash.LOG.info("next_segment_sizes[higher_bitrate] = {}, weighted_dwn_rate = {} , "
-                                 "available_video={} seconds, ratio = {}".format(next_segment_sizes[higher_bitrate],
-                                                                                 weighted_dwn_rate,
-                                                                                 available_video_duration,
-                                                                                float(next_segment_sizes[higher_bitrate])/weighted_dwn_rate))
+            if config_dash.LOG.isEnabledFor(logging.INFO):
+                config_dash.LOG.info("next_segment_sizes[higher_bitrate] = {}, weighted_dwn_rate = {} , "
+                                     "available_video={} seconds, ratio = {}".format(
+                                         next_segment_sizes[higher_bitrate], weighted_dwn_rate,
+                                         available_video_duration,
+                                         float(next_segment_sizes[higher_bitrate])/weighted_dwn_rate))
             if float(next_segment_sizes[higher_bitrate])/weighted_dwn_rate < available_video_duration:
                 next_bitrate = higher_bitrate
             else:
                 next_bitrate = curr_bitrate
     elif available_video_segments <= dash_player.beta:
         config_dash.LOG.debug("available_video <= dash_player.beta")
-        if curr_bitrate >= max(bitrates):
+        if curr_bitrate >= ladder.max:
             next_bitrate = curr_bitrate
         else:
             for bitrate in reversed(bitrates):
@@ -74,7 +76,7 @@ def weighted_dash(bitrates, dash_player, weighted_dwn_rate, curr_bitrate, next_s
 
     elif available_video_segments > dash_player.beta:
         config_dash.LOG.debug("available_video > dash_player.beta")
-        if curr_bitrate >= max(bitrates):
+        if curr_bitrate >= ladder.max:
             next_bitrate = curr_bitrate
         else:
             for bitrate in reversed(bitrates):
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the adaptation algorithms.
+
+Replays the segment downloads recorded in session logs (the ASTREAM JSON logs written by
+dash_client.py and dash_sweep.py) through every adaptation algorithm and reports the number
+of decisions per second and the latency of each decision.
+
+    python dist/client/adaptation_benchmark.py -i SWEEP_LOGS/ --MIN_RATE 20000
+
+The download rates of the recorded segments (size / download time) are the network of the
+replay: the segment picked by the algorithm downloads at the rate of the recorded segment.
+A simplified player plays the buffer during the downloads. Only the decisions are timed.
+With --MIN_RATE the exit status is 1 if an algorithm makes fewer decisions per second,
+so that a performance regression fails the CI job that runs the benchmark.
+"""
+from __future__ import division
+import os
+import sys
+import json
+import timeit
+import logging
+from argparse import ArgumentParser
+sys.path.append("./dist/util/")
+import config_dash
+import manifest_store
+from telemetry import Histogram
+from configure_log_file import configure_log_file
+from adaptation import basic_dash, basic_dash2, weighted_dash, netflix_dash, fastmpc_dash
+from adaptation.adaptation import WeightedMean
+from adaptation.estimators import SegmentHistory, get_ladder
+
+DEFAULT_SEGMENT_DURATION = 4
+# Prefix of the JSON logs of the sessions
+LOG_PREFIX = "ASTREAM"
+
+# Globals for arg parser with the default values
+INPUT = None
+PLAYBACK = None
+REPEAT = 1
+SEGMENT_DURATION = DEFAULT_SEGMENT_DURATION
+MIN_RATE = None
+
+
+class ReplayBuffer(object):
+    """ Segments of the replayed buffer """
+    def __init__(self):
+        self.segments = 0
+
+    def qsize(self):
+        return self.segments
+
+
+class ReplayPlayer(object):
+    """ Player of a replayed session. Has the attributes of DashPlayer that the algorithms read """
+    def __init__(self, segment_duration):
+        self.segment_duration = segment_duration
+        self.initial_buffer = config_dash.INITIAL_BUFFERING_COUNT
+        self.alpha = config_dash.ALPHA_BUFFER_COUNT
+        self.beta = config_dash.BETA_BUFFER_COUNT
+        self.buffer = ReplayBuffer()
+        # Duration of the buffered video in seconds
+        self.buffer_length = 0
+
+    def play(self, seconds):
+        """ Play the buffer for the given number of seconds """
+        self.buffer_length = max(0, self.buffer_length - seconds)
+        self.buffer.segments = int(self.buffer_length // self.segment_duration)
+
+    def download(self, download_time):
+        """ Play during the download of a segment and add it to the buffer """
+        self.play(download_time)
+        self.buffer_length += self.segment_duration
+        self.buffer.segments = int(self.buffer_length // self.segment_duration)
+
+
+class Session(object):
+    """ Segment downloads of a recorded session and the segment sizes of its MPD """
+    def __init__(self, log_file, samples, bitrates, manifest=None, segment_duration=DEFAULT_SEGMENT_DURATION,
+                 bitrate_unit='Kbps'):
+        """
+        :param samples: List of the (size, download time) of the downloaded segments
+        :param manifest: manifest_store.ManifestStore of the MPD, if the MPD file is available
+        :param bitrate_unit: Unit of the bitrates if the MPD file is not available
+        """
+        self.log_file = log_file
+        self.samples = samples
+        if manifest is not None:
+            bitrate_unit = manifest.bitrate_unit
+        self.ladder = get_ladder(sorted(bitrates), bitrate_unit)
+        if manifest is not None and sorted(manifest.bitrates) == self.ladder.bitrates:
+            self.segment_duration = manifest.segment_duration
+            segment_count = len(manifest.video[manifest.bitrates[0]].segment_sizes)
+            self.segment_sizes = [manifest.get_segment_sizes(index % segment_count)
+                                  for index in range(len(samples) + 1)]
+            self.average_sizes = manifest.get_average_segment_sizes()
+        else:
+            # Constant bitrate segments
+            self.segment_duration = segment_duration
+            sizes = dict((bitrate, bitrate * segment_duration / 8) for bitrate in self.ladder.bitrates)
+            self.segment_sizes = [sizes] * (len(samples) + 1)
+            self.average_sizes = sizes
+
+
+def find_logs(paths):
+    """ :return: The JSON session logs among the paths and in the folders of the paths """
+    log_files = list()
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, files in sorted(os.walk(path)):
+                log_files.extend(os.path.join(folder, name) for name in sorted(files)
+                                 if name.startswith(LOG_PREFIX) and name.endswith(".json"))
+        else:
+            log_files.append(path)
+    return log_files
+
+
+def read_session(log_file, segment_duration=DEFAULT_SEGMENT_DURATION):
+    """ :return: The Session of the JSON log, or None if it has no downloads to replay """
+    with open(log_file) as log_handle:
+        json_log = json.load(log_handle)
+    samples = [(size, download_time) for _, _, size, download_time in json_log.get('segment_info', list())
+               if size and download_time > 0]
+    video_metadata = json_log.get('video_metadata', dict())
+    bitrates = video_metadata.get('available_bitrates')
+    if len(samples) < 2 or not bitrates:
+        return None
+    manifest = None
+    mpd_file = video_metadata.get('mpd_file')
+    if mpd_file and os.path.exists(mpd_file):
+        manifest = manifest_store.get_manifest(mpd_file)
+    return Session(log_file, samples, bitrates, manifest, segment_duration,
+                   video_metadata.get('bitrate_unit', 'Kbps'))
+
+
+class Replay(object):
+    """ State of the client loop (dash_client.start_playback_smart) for one algorithm and one session """
+    def __init__(self, session):
+        self.session = session
+        self.ladder = session.ladder
+        self.player = ReplayPlayer(session.segment_duration)
+        self.segment_history = SegmentHistory(config_dash.BASIC_DELTA_COUNT)
+        self.weighted_mean = WeightedMean(config_dash.SARA_SAMPLE_COUNT)
+        self.current_bitrate = self.ladder.min
+        self.average_dwn_time = 0
+        self.netflix_state = "INITIAL"
+        self.segment_size = self.segment_download_time = None
+
+    def basic_dash(self, index):
+        try:
+            self.current_bitrate, self.average_dwn_time = basic_dash.basic_dash(
+                index, self.ladder, self.average_dwn_time, self.segment_download_time, self.current_bitrate)
+        except IndexError:
+            pass
+        return 0
+
+    def basic_dash2(self, index):
+        self.current_bitrate, self.average_dwn_time = basic_dash2.basic_dash2(
+            index, self.ladder, self.average_dwn_time, self.segment_history, self.current_bitrate)
+        return max(0, self.player.buffer.qsize() - config_dash.BASIC_THRESHOLD)
+
+    def weighted_dash(self, index):
+        if index + 1 < len(self.session.samples):
+            try:
+                self.current_bitrate, delay = weighted_dash.weighted_dash(
+                    self.ladder, self.player, self.weighted_mean.weighted_mean_rate, self.current_bitrate,
+                    self.session.segment_sizes[index + 1])
+                return delay
+            except IndexError:
+                pass
+        return 0
+
+    def netflix_dash(self, index):
+        try:
+            self.current_bitrate, self.netflix_state = netflix_dash.netflix_dash(
+                self.ladder, self.player, self.segment_size / self.segment_download_time, self.current_bitrate,
+                self.session.average_sizes, self.netflix_state)
+        except IndexError:
+            pass
+        return max(0, self.player.buffer.qsize() - config_dash.NETFLIX_BUFFER_SIZE + 1)
+
+    def fastmpc_dash(self, index):
+        try:
+            self.current_bitrate = fastmpc_dash.fastmpc_dash(self.ladder, self.player, self.segment_history,
+                                                             self.current_bitrate)
+        except IndexError:
+            pass
+        return max(0, self.player.buffer.qsize() - config_dash.NETFLIX_BUFFER_SIZE + 1)
+
+    def run(self, decide, histogram, clock=timeit.default_timer):
+        """ Replay the session
+        :param decide: Unbound decision method of the algorithm (Eg: Replay.basic_dash2)
+        :param histogram: Histogram of the decision latencies
+        :return: List of the bitrates of the segments
+        """
+        decisions = list()
+        for index, (recorded_size, recorded_time) in enumerate(self.session.samples):
+            delay = 0
+            if index > 0:
+                start_time = clock()
+                delay = decide(self, index)
+                histogram.observe(clock() - start_time)
+            # Wait for the buffer to drain (delay in segments)
+            self.player.play(delay * self.session.segment_duration)
+            self.segment_size = self.session.segment_sizes[index][self.current_bitrate]
+            self.segment_download_time = self.segment_size * recorded_time / recorded_size
+            self.player.download(self.segment_download_time)
+            self.segment_history.update(self.segment_size, self.segment_download_time)
+            self.weighted_mean.update_weighted_mean(self.segment_size, self.segment_download_time)
+            decisions.append(self.current_bitrate)
+        return decisions
+
+
+# Name -> decision method of the algorithm
+ALGORITHMS = {'basic_dash': Replay.basic_dash,
+              'basic_dash2': Replay.basic_dash2,
+              'weighted_dash': Replay.weighted_dash,
+              'netflix_dash': Replay.netflix_dash,
+              'fastmpc_dash': Replay.fastmpc_dash}
+
+
+def run_benchmark(sessions, algorithms, repeat=1):
+    """ Module to replay the sessions through the algorithms
+    :return: dict of algorithm -> Histogram of the decision latencies
+    """
+    histograms = dict()
+    for algorithm in algorithms:
+        histograms[algorithm] = Histogram()
+        if algorithm == 'fastmpc_dash':
+            # Load (or generate) the lookup tables before the timing
+            for session in sessions:
+                fastmpc_dash.get_table(session.ladder, session.segment_duration).load()
+        for _ in range(repeat):
+            for session in sessions:
+                Replay(session).run(ALGORITHMS[algorithm], histograms[algorithm])
+    return histograms
+
+
+def print_results(histograms):
+    """ Module to print the decisions per second and the decision latencies (us) of each algorithm """
+    row_format = "{:<14} {:>10} {:>14} {:>9} {:>9} {:>9} {:>9}"
+    print(row_format.format('algorithm', 'decisions', 'decisions/sec', 'mean_us', 'p50_us', 'p99_us', 'max_us'))
+    for algorithm, histogram in sorted(histograms.items()):
+        if not histogram.count:
+            continue
+        summary = histogram.summary()
+        print(row_format.format(algorithm, histogram.count, "%.0f" % get_rate(histogram),
+                                *["%.1f" % (summary[key] * 1e6) for key in ('mean', 'p50', 'p99', 'max')]))
+
+
+def get_rate(histogram):
+    """ :return: Decisions per second of the algorithm """
+    return histogram.count / histogram.total if histogram.total else float('inf')
+
+
+def create_arguments(parser):
+    """ Adding arguments to the parser """
+    parser.add_argument('-i', '--INPUT', nargs='+', required=True,
+                        help="JSON session logs or folders with the logs (Eg: the output folder of dash_sweep.py)")
+    parser.add_argument('-p', '--PLAYBACK', nargs='+', default=sorted(ALGORITHMS),
+                        choices=sorted(ALGORITHMS),
+                        help="Adaptation algorithms. Default all of them")
+    parser.add_argument('-r', '--REPEAT', type=int, default=REPEAT,
+                        help="Number of replays of each session")
+    parser.add_argument('--SEGMENT_DURATION', type=float, default=SEGMENT_DURATION,
+                        help="Segment duration of the sessions whose MPD file is not found")
+    parser.add_argument('--MIN_RATE', type=float, default=MIN_RATE,
+                        help="Exit with status 1 if an algorithm makes fewer decisions per second")
+
+
+def main():
+    """ Main Program wrapper """
+    parser = ArgumentParser(description='Replay session logs through the adaptation algorithms')
+    create_arguments(parser)
+    args = parser.parse_args()
+    globals().update(vars(args))
+    config_dash.LOG_LEVEL = logging.WARNING
+    configure_log_file(log_file=None)
+    sessions = [session for session in (read_session(log_file, SEGMENT_DURATION) for log_file in find_logs(INPUT))
+                if session]
+    if not sessions:
+        print("ERROR: No session logs with segment downloads in {}".format(" ".join(INPUT)))
+        return 2
+    print("Replaying {} sessions, {} segments".format(len(sessions),
+                                                     sum(len(session.samples) for session in sessions)))
+    histograms = run_benchmark(sessions, PLAYBACK, REPEAT)
+    print_results(histograms)
+    if MIN_RATE:
+        slow = [algorithm for algorithm, histogram in sorted(histograms.items())
+                if histogram.count and get_rate(histogram) < MIN_RATE]
+        if slow:
+            print("Fewer than {:.0f} decisions per second: {}".format(MIN_RATE, " ".join(slow)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,74 @@
 from __future__ import division
-import Queue
 import threading
-import time
-import csv
-import os
+import logging
+from collections import deque
 import config_dash
-from stop_watch import StopWatch
+from configure_log_file import configure_telemetry
+from stop_watch import StopWatch, WallClock
 
 # Durations in seconds
 PLAYER_STATES = ['INITIALIZED', 'INITIAL_BUFFERING', 'PLAY',
                  'PAUSE', 'BUFFERING', 'STOP', 'END']
 EXIT_STATES = ['STOP', 'END']
+BUFFER_LOG_HEADER = "EpochTime,CurrentPlaybackTime,CurrentBufferSize,CurrentPlaybackState,Action,Bitrate".split(",")
 
 
-class DashPlayer:
+class SegmentBuffer(object):
+    """ Video buffer that holds the segments waiting for playback.
+        The segments and the duration of the buffered video are kept under a single lock.
+        'changed' is notified whenever a segment is added, so a player can wait on it.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.segments = deque()
+        # Duration (in seconds) of the buffered video, including the segment being played
+        self.length = 0
+
+    def qsize(self):
+        """ :return: Number of segments waiting for playback """
+        with self.lock:
+            return len(self.segments)
+
+    def put(self, segment):
+        """ Add a segment to the buffer
+        :return: the updated duration of the buffer
+        """
+        with self.lock:
+            self.segments.append(segment)
+            self.length += int(segment['playback_length'])
+            self.changed.notify_all()
+            return self.length
+
+    def get(self):
+        """ :return: The next segment to be played """
+        with self.lock:
+            return self.segments.popleft()
+
+    def played(self, segment):
+        """ Remove the duration of a segment that was played completely
+        :return: the updated duration of the buffer
+        """
+        with self.lock:
+            self.length -= int(segment['playback_length'])
+            return self.length
+
+
+class DashPlayer(object):
     """ DASH buffer class """
-    def __init__(self, video_length, segment_duration):
+    def __init__(self, video_length, segment_duration, clock=None):
         config_dash.LOG.info("Initializing the Buffer")
+        # Source of time for the player (WallClock or a simulated clock)
+        self.clock = clock or WallClock()
         self.player_thread = None
         self.playback_start_time = None
         self.playback_duration = video_length
         self.segment_duration = segment_duration
         # Timers to keep track of playback time and the actual time
-        self.playback_timer = StopWatch()
+        self.playback_timer = StopWatch(self.clock.time)
         self.actual_start_time = None
+        self.start_time = None
+        self.interruption_start = None
         # Playback State
         self.playback_state = "INITIALIZED"
         self.playback_state_lock = threading.Lock()
@@ -32,19 +77,22 @@ class DashPlayer:
             self.max_buffer_size = config_dash.MAX_BUFFER_SIZE
         else:
             self.max_buffer_size = video_length
-        # Duration of the current buffer
-        self.buffer_length = 0
-        self.buffer_length_lock = threading.Lock()
         # Buffer Constants
         self.initial_buffer = config_dash.INITIAL_BUFFERING_COUNT
         self.alpha = config_dash.ALPHA_BUFFER_COUNT
         self.beta = config_dash.BETA_BUFFER_COUNT
         self.segment_limit = None
+        # Set once the last segment has been written: the playback ends when the buffer is empty
+        self.last_segment_written = False
         # Current video buffer that holds the segment data
-        self.buffer = Queue.Queue()
-        self.buffer_lock = threading.Lock()
+        self.buffer = SegmentBuffer()
         self.current_segment = None
         self.buffer_log_file = config_dash.BUFFER_LOG_FILENAME
+        # The buffer logs are written by the telemetry sink of the session, whose records are
+        # timed by the clock of the player
+        self.telemetry = configure_telemetry(clock=self.clock.time)
+        if self.buffer_log_file:
+            self.telemetry.add_csv('buffer', self.buffer_log_file, BUFFER_LOG_HEADER)
         # Record Current QoE
         self.sum_qoe = 0
         self.last_bitrate = 0
@@ -55,42 +103,61 @@ class DashPlayer:
                                                                               self.max_buffer_size, self.initial_buffer,
                                                                               self.alpha, self.beta))
 
+    @property
+    def buffer_length(self):
+        """ Duration of the current buffer in seconds """
+        return self.buffer.length
+
     def set_state(self, state):
         """ Function to set the state of the player"""
         state = state.upper()
         if state in PLAYER_STATES:
             self.playback_state_lock.acquire()
-            config_dash.LOG.info("Changing state from {} to {} at {} Playback time ".format(self.playback_state, state,
-                                                                                            self.playback_timer.time()))
+            if config_dash.LOG.isEnabledFor(logging.INFO):
+                config_dash.LOG.info("Changing state from {} to {} at {} Playback time ".format(
+                    self.playback_state, state, self.playback_timer.time()))
+            self.telemetry.record('state', {'from': self.playback_state, 'to': state,
+                                            'playback_time': self.playback_timer.time()})
             self.playback_state = state
             self.playback_state_lock.release()
+            # Wake up the player thread
+            with self.buffer.changed:
+                self.buffer.changed.notify_all()
         else:
             config_dash.LOG.error("Unidentified state: {}".format(state))
 
+    def wait_for(self, condition, deadline=None):
+        """ Block the player until condition() is True.
+            The player is woken up by write(), set_state() and the deadline (in playback time)
+        """
+        wakeups = self.telemetry.histogram('player_wakeup')
+        with self.buffer.changed:
+            while not condition():
+                wait_start = self.clock.time()
+                if deadline is None:
+                    self.buffer.changed.wait()
+                else:
+                    self.buffer.changed.wait(max(0, deadline - self.playback_timer.precise_time()))
+                # Time the player slept before this wake up
+                wakeups.observe(self.clock.time() - wait_start)
+
     def initialize_player(self):
         """Method that update the current playback time"""
-        start_time = time.time()
-        initial_wait = 0
+        self.start_time = self.clock.time()
         paused = False
-        buffering = False
-        interruption_start = None
         config_dash.LOG.info("Initialized player with video length {}".format(self.playback_duration))
         while True:
             # Video stopped by the user
             if self.playback_state == "END":
                 config_dash.LOG.info("Finished playback of the video: {} seconds of video played for {} seconds".format(
-                    self.playback_duration, time.time() - start_time))
-                config_dash.JSON_HANDLE['playback_info']['end_time'] = time.time()
+                    self.playback_duration, self.clock.time() - self.start_time))
+                config_dash.JSON_HANDLE['playback_info']['end_time'] = self.clock.time()
                 self.playback_timer.pause()
                 return "STOPPED"
 
             if self.playback_state == "STOP":
                 # If video is stopped quit updating the playback time and exit player
-                config_dash.LOG.info("Player Stopped at time {}".format(
-                    time.time() - start_time))
-                config_dash.JSON_HANDLE['playback_info']['end_time'] = time.time()
-                self.playback_timer.pause()
-                self.log_entry("Stopped")
+                self.stopped()
                 return "STOPPED"
 
             # If paused by user
@@ -101,136 +168,202 @@ class DashPlayer:
                         self.playback_timer.time()))
                     self.playback_timer.pause()
                     paused = True
+                self.wait_for(lambda: self.playback_state != "PAUSE")
                 continue
 
-            # If the playback encounters buffering during the playback
+            # If the size of the buffer is greater than the RE_BUFFERING_DURATION then start playback
             if self.playback_state == "BUFFERING":
-                if not buffering:
-                    config_dash.LOG.info("Entering buffering stage after {} seconds of playback".format(
-                        self.playback_timer.time()))
-                    self.playback_timer.pause()
-                    buffering = True
-                    interruption_start = time.time()
-                    config_dash.JSON_HANDLE['playback_info']['interruptions']['count'] += 1
-                # If the size of the buffer is greater than the RE_BUFFERING_DURATION then start playback
-                else:
-                    # If the RE_BUFFERING_DURATION is greate than the remiang length of the video then do not wait
-                    remaining_playback_time = self.playback_duration - self.playback_timer.time()
-                    if ((self.buffer.qsize() >= config_dash.RE_BUFFERING_COUNT) or (
-                            config_dash.RE_BUFFERING_COUNT * self.segment_duration >= remaining_playback_time
-                            and self.buffer.qsize() > 0)):
-                        buffering = False
-                        if interruption_start:
-                            interruption_end = time.time()
-                            interruption = interruption_end - interruption_start
-
-                            config_dash.JSON_HANDLE['playback_info']['interruptions']['events'].append(
-                                (interruption_start, interruption_end))
-                            config_dash.JSON_HANDLE['playback_info']['interruptions']['total_duration'] += interruption
-                            config_dash.LOG.warning("Duration of interruption = {}".format(interruption))
-                            self.sum_qoe -= 3000 * interruption
-                            interruption_start = None
-                        self.set_state("PLAY")
-                        self.log_entry("Buffering-Play")
+                self.wait_for(lambda: self.playback_state != "BUFFERING" or self.can_resume() or
+                              self.last_segment_written)
+                if self.playback_state == "BUFFERING":
+                    if self.can_resume():
+                        self.resume_playback()
+                    else:
+                        # All the segments were played: no segment will end the buffering
+                        self.set_state("STOP")
+                continue
 
             if self.playback_state == "INITIAL_BUFFERING":
-                if self.buffer.qsize() < config_dash.INITIAL_BUFFERING_COUNT:
-                    initial_wait = time.time() - start_time
-                    continue
-                else:
-                    config_dash.LOG.info("Initial Waiting Time = {}".format(initial_wait))
-                    config_dash.JSON_HANDLE['playback_info']['initial_buffering_duration'] = initial_wait
-                    config_dash.JSON_HANDLE['playback_info']['start_time'] = time.time()
-                    self.set_state("PLAY")
-                    self.log_entry("InitialBuffering-Play")
+                self.wait_for(lambda: self.playback_state != "INITIAL_BUFFERING" or self.can_start() or
+                              self.last_segment_written)
+                if self.playback_state == "INITIAL_BUFFERING":
+                    if self.can_start():
+                        self.start_playback()
+                    else:
+                        self.set_state("STOP")
+                continue
 
             if self.playback_state == "PLAY":
-                    # Check of the buffer has any segments
-                    if self.playback_timer.time() == self.playback_duration:
-                        self.set_state("END")
-                        self.log_entry("Play-End")
-                    if self.buffer.qsize() == 0:
-                        config_dash.LOG.info("Buffer empty after {} seconds of playback".format(
-                            self.playback_timer.time()))
-                        self.playback_timer.pause()
-                        self.set_state("BUFFERING")
-                        self.log_entry("Play-Buffering")
-                        continue
-                    # Read one the segment from the buffer
-                    # Acquire Lock on the buffer and read a segment for it
-                    self.buffer_lock.acquire()
-                    play_segment = self.buffer.get()
-                    self.buffer_lock.release()
-                    config_dash.LOG.info("Reading the segment number {} from the buffer at playtime {}".format(
-                        play_segment['segment_number'], self.playback_timer.time()))
-                    # self.log_entry(action="StillPlaying", bitrate=play_segment["bitrate"])
-
-                    # Calculate time playback when the segment finishes
-                    future = self.playback_timer.time() + play_segment['playback_length']
-
-                    # Start the playback
-                    self.playback_timer.start()
-                    while self.playback_timer.time() < future:
-                        # If playback hasn't started yet, set the playback_start_time
-                        if not self.playback_start_time:
-                            self.playback_start_time = time.time()
-                            config_dash.LOG.info("Started playing with representation {} at {}".format(
-                                play_segment['bitrate'], self.playback_timer.time()))
-
-                        # Duration for which the video was played in seconds (integer)
-                        if self.playback_timer.time() >= self.playback_duration:
-                            config_dash.LOG.info("Completed the video playback: {} seconds".format(
-                                self.playback_duration))
-                            self.playback_timer.pause()
-                            self.set_state("END")
-                            self.log_entry("TheEnd")
-                            return
-                    else:
-                        self.buffer_length_lock.acquire()
-                        self.buffer_length -= int(play_segment['playback_length'])
-                        config_dash.LOG.debug("Decrementing buffer_length by {}. dash_buffer = {}".format(
-                            play_segment['playback_length'], self.buffer_length))
-                        self.buffer_length_lock.release()
-                    if self.segment_limit:
-                        if int(play_segment['segment_number']) >= self.segment_limit:
-                            self.set_state("STOP")
-                            config_dash.LOG.info("Stopped playback after segment {} at playtime {}".format(
-                                play_segment['segment_number'], self.playback_duration))
+                next_segment = self.play_next()
+                if not next_segment:
+                    continue
+                play_segment, deadline = next_segment
+                # Sleep till the end of the segment
+                self.wait_for(lambda: self.playback_state in EXIT_STATES or
+                              self.playback_timer.precise_time() >= deadline, deadline)
+                if self.playback_state in EXIT_STATES:
+                    continue
+                if self.segment_played(play_segment):
+                    return
+                continue
+
+            # Wait for the player to be started
+            self.wait_for(lambda: self.playback_state in PLAYER_STATES[1:])
+
+    def start_playback(self):
+        """ INITIAL_BUFFERING -> PLAY """
+        initial_wait = self.clock.time() - self.start_time
+        config_dash.LOG.info("Initial Waiting Time = {}".format(initial_wait))
+        config_dash.JSON_HANDLE['playback_info']['initial_buffering_duration'] = initial_wait
+        config_dash.JSON_HANDLE['playback_info']['start_time'] = self.clock.time()
+        self.set_state("PLAY")
+        self.log_entry("InitialBuffering-Play")
+
+    def can_start(self):
+        """ :return: True if the player in INITIAL_BUFFERING has enough segments to start the playback """
+        # The last segments are played even if there are fewer than INITIAL_BUFFERING_COUNT
+        return (self.buffer.qsize() >= config_dash.INITIAL_BUFFERING_COUNT or
+                (self.last_segment_written and self.buffer.qsize() > 0))
+
+    def can_resume(self):
+        """ :return: True if the player in BUFFERING has enough segments to resume the playback """
+        # If the RE_BUFFERING_DURATION is greate than the remiang length of the video then do not wait
+        remaining_playback_time = self.playback_duration - self.playback_timer.time()
+        return ((self.buffer.qsize() >= config_dash.RE_BUFFERING_COUNT) or (
+            (config_dash.RE_BUFFERING_COUNT * self.segment_duration >= remaining_playback_time or
+             self.last_segment_written) and self.buffer.qsize() > 0))
+
+    def resume_playback(self):
+        """ BUFFERING -> PLAY. Records the interruption """
+        if self.interruption_start is not None:
+            interruption_end = self.clock.time()
+            interruption = interruption_end - self.interruption_start
+
+            config_dash.JSON_HANDLE['playback_info']['interruptions']['events'].append(
+                (self.interruption_start, interruption_end))
+            config_dash.JSON_HANDLE['playback_info']['interruptions']['total_duration'] += interruption
+            self.telemetry.observe('rebuffer', interruption)
+            config_dash.LOG.warning("Duration of interruption = {}".format(interruption))
+            self.sum_qoe -= 3000 * interruption
+            self.interruption_start = None
+        self.set_state("PLAY")
+        self.log_entry("Buffering-Play")
+
+    def start_buffering(self):
+        """ PLAY -> BUFFERING when the buffer is empty """
+        config_dash.LOG.info("Buffer empty after {} seconds of playback".format(
+            self.playback_timer.time()))
+        self.playback_timer.pause()
+        self.set_state("BUFFERING")
+        self.log_entry("Play-Buffering")
+        config_dash.LOG.info("Entering buffering stage after {} seconds of playback".format(
+            self.playback_timer.time()))
+        self.interruption_start = self.clock.time()
+        config_dash.JSON_HANDLE['playback_info']['interruptions']['count'] += 1
+
+    def play_next(self):
+        """ Read one the segment from the buffer and start playing it
+        :return: (segment, playback time at which the segment ends) or None if there is no segment to play
+        """
+        # Check of the buffer has any segments
+        if self.playback_timer.precise_time() >= self.playback_duration or \
+                (self.last_segment_written and self.buffer.qsize() == 0):
+            self.set_state("END")
+            self.log_entry("Play-End")
+            return None
+        if self.buffer.qsize() == 0:
+            self.start_buffering()
+            return None
+        play_segment = self.buffer.get()
+        if config_dash.LOG.isEnabledFor(logging.INFO):
+            config_dash.LOG.info("Reading the segment number {} from the buffer at playtime {}".format(
+                play_segment['segment_number'], self.playback_timer.time()))
+        # self.log_entry(action="StillPlaying", bitrate=play_segment["bitrate"])
+
+        # Calculate time playback when the segment finishes
+        future = self.playback_timer.time() + play_segment['playback_length']
+
+        # Start the playback
+        self.playback_timer.start()
+        # If playback hasn't started yet, set the playback_start_time
+        if not self.playback_start_time:
+            self.playback_start_time = self.clock.time()
+            config_dash.LOG.info("Started playing with representation {} at {}".format(
+                play_segment['bitrate'], self.playback_timer.time()))
+        # The playback stops at the end of the video
+        return play_segment, min(future, self.playback_duration)
+
+    def segment_played(self, play_segment):
+        """ Called at the end of the playback of a segment
+        :return: True if the video playback is completed
+        """
+        # The last segment ends at playback_duration, which need not be a whole number of seconds
+        if self.playback_timer.precise_time() >= self.playback_duration or \
+                (self.last_segment_written and self.buffer.qsize() == 0):
+            config_dash.LOG.info("Completed the video playback: {} seconds".format(
+                self.playback_duration))
+            self.playback_timer.pause()
+            self.set_state("END")
+            self.log_entry("TheEnd")
+            return True
+        buffer_length = self.buffer.played(play_segment)
+        config_dash.LOG.debug("Decrementing buffer_length by {}. dash_buffer = {}".format(
+            play_segment['playback_length'], buffer_length))
+        if self.segment_limit:
+            if int(play_segment['segment_number']) >= self.segment_limit:
+                self.set_state("STOP")
+                config_dash.LOG.info("Stopped playback after segment {} at playtime {}".format(
+                    play_segment['segment_number'], self.playback_duration))
+        return False
+
+    def stopped(self):
+        """ Exit the player in the STOP state """
+        config_dash.LOG.info("Player Stopped at time {}".format(
+            self.clock.time() - self.start_time))
+        config_dash.JSON_HANDLE['playback_info']['end_time'] = self.clock.time()
+        self.playback_timer.pause()
+        self.log_entry("Stopped")
 
     def write(self, segment):
         """ write segment to the buffer.
             Segment is dict with keys ['data', 'bitrate', 'playback_length', 'URI', 'size']
         """
-        # Acquire Lock on the buffer and add a segment to it
         if not self.actual_start_time:
-            self.actual_start_time = time.time()
+            self.actual_start_time = self.clock.time()
             config_dash.JSON_HANDLE['playback_info']['start_time'] = self.actual_start_time
-        config_dash.LOG.debug("Writing segment %d at time %.2f" % 
-                (segment['segment_number'], time.time() - self.actual_start_time))
+        config_dash.LOG.debug("Writing segment %d at time %.2f" %
+                (segment['segment_number'], self.clock.time() - self.actual_start_time))
         self.num_segments += 1
         self.sum_qoe += segment['bitrate']
         self.sum_qoe -= abs(segment['bitrate'] - self.last_bitrate)
         self.last_bitrate = segment['bitrate']
-        self.buffer_lock.acquire()
-        self.buffer.put(segment)
-        self.buffer_lock.release()
-        self.buffer_length_lock.acquire()
-        self.buffer_length += int(segment['playback_length'])
+        # Adding the segment wakes up the player
+        buffer_length = self.buffer.put(segment)
         config_dash.LOG.debug("Incrementing buffer_length by {}. dash_buffer = {}".format(
-            segment['playback_length'], self.buffer_length))
-        self.buffer_length_lock.release()
+            segment['playback_length'], buffer_length))
         self.log_entry(action="Writing", bitrate=segment['bitrate'])
 
+    def end_of_stream(self):
+        """ Called once the last segment has been written. The player ends after playing it,
+            or stops if it is waiting for segments with an empty buffer
+        """
+        with self.buffer.changed:
+            self.last_segment_written = True
+            self.buffer.changed.notify_all()
+
     def start(self):
         """ Start playback"""
         self.set_state("INITIAL_BUFFERING")
-        self.log_entry("Starting")
         config_dash.LOG.info("Starting the Player")
         self.player_thread = threading.Thread(target=self.initialize_player)
         self.player_thread.daemon = True
         self.player_thread.start()
         self.log_entry(action="Starting")
 
+    def finished(self):
+        """ :return: True once the player has reached one of the EXIT_STATES """
+        return self.playback_state in EXIT_STATES
+
     def stop(self):
         """Method to stop the playback"""
         self.set_state("STOP")
@@ -241,25 +374,16 @@ class DashPlayer:
         """Method to log the current state"""
 
         if self.buffer_log_file:
-            header_row = None
             if self.actual_start_time:
-                log_time = time.time() - self.actual_start_time
+                log_time = self.clock.time() - self.actual_start_time
                 log_time = round(log_time, 2)
             else:
                 log_time = 0
-            if not os.path.exists(self.buffer_log_file):
-                header_row = "EpochTime,CurrentPlaybackTime,CurrentBufferSize,CurrentPlaybackState,Action,Bitrate".split(",")
-                stats = (log_time, str(self.playback_timer.time()), self.buffer.qsize(),
-                         self.playback_state, action,bitrate)
-            else:
-                stats = (log_time, str(self.playback_timer.time()), self.buffer.qsize(),
-                         self.playback_state, action,bitrate)
-            str_stats = [str(i) for i in stats]
-            with open(self.buffer_log_file, "ab") as log_file_handle:
-                result_writer = csv.writer(log_file_handle, delimiter=",")
-                if header_row:
-                    result_writer.writerow(header_row)
-                result_writer.writerow(str_stats)
+            # Row of the buffer CSV, written in the background by the telemetry sink
+            self.telemetry.record('buffer', (log_time, self.playback_timer.time(), self.buffer.qsize(),
+                                             self.playback_state, action, bitrate))
+            if not config_dash.LOG.isEnabledFor(logging.INFO):
+                return
             avg_qoe = 0
             if self.num_segments > 0:
                 avg_qoe = self.sum_qoe / float(self.num_segments)
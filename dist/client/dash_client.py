@@ -21,6 +21,8 @@ import sys
 import errno
 import timeit
 import httplib
+import socket
+import json
 from string import ascii_letters, digits
 from argparse import ArgumentParser
 from multiprocessing import Process, Queue
@@ -28,10 +30,15 @@ from collections import defaultdict
 sys.path.append("./dist/util/")
 import config_dash
 import read_mpd
-from configure_log_file import configure_log_file, write_json
+from configure_log_file import configure_log_file, close_telemetry, write_json
 from adaptation import basic_dash, basic_dash2, weighted_dash, netflix_dash, fastmpc_dash
 from adaptation.adaptation import WeightedMean
+from adaptation.estimators import SegmentHistory, get_ladder
 import dash_buffer
+import read_trace
+from stop_watch import WallClock
+from dash_simulator import VirtualClock, SimulatedPlayer, TraceDownloader
+from segment_fetcher import SegmentFetcher
 import time
 import sys
 import logging
@@ -44,7 +51,11 @@ except NameError:
 
 # Constants
 DEFAULT_PLAYBACK = 'BASIC'
-DOWNLOAD_CHUNK = 10240
+# Playback parameter -> playback_type of start_playback_smart
+PLAYBACK_TYPES = {'basic': 'BASIC',
+                  'sara': 'SMART',
+                  'netflix': 'NETFLIX',
+                  'fastmpc': 'FastMPC'}
 
 # Globals for arg parser with the default values
 # Not sure if this is the correct way ....
@@ -53,6 +64,13 @@ LIST = False
 PLAYBACK = DEFAULT_PLAYBACK
 DOWNLOAD = False
 SEGMENT_LIMIT = None
+TRACE = None
+LINK_DELAY = 0
+PIPELINE = False
+# Sent to the server in the config_dash.SESSION_HEADER of each request
+SESSION_ID = None
+# SegmentFetcher of the session. Created with the first segment download and closed by close_fetcher
+FETCHER = None
 
 class DashPlayback:
     """
@@ -65,11 +83,24 @@ class DashPlayback:
         self.playback_duration = None
         self.audio = dict()
         self.video = dict()
+        self.manifest = None
+
+def get_session_headers():
+    """ Module to get the headers with the session ID of the client """
+    if SESSION_ID:
+        return {config_dash.SESSION_HEADER: SESSION_ID}
+    return dict()
+
+
+def get_request(url):
+    """ Module to create the request for the URL with the session ID of the client """
+    return urllib2.Request(url, headers=get_session_headers())
+
 
 def get_mpd(url):
     """ Module to download the MPD from the URL and save it to file"""
     try:
-        connection = urllib2.urlopen(url, timeout=10)
+        connection = urllib2.urlopen(get_request(url), timeout=10)
     except urllib2.HTTPError, error:
         config_dash.LOG.error("Unable to download MPD file HTTP Error: %s" % error.code)
         return None
@@ -116,26 +147,35 @@ def id_generator(id_size=6):
     return 'TEMP_' + ''.join(random.choice(ascii_letters+digits) for _ in range(id_size))
 
 
-def download_segment(segment_url, dash_folder):
-    """ Module to download the segment """
-    config_dash.LOG.debug("download begins: {}".format(segment_url))
-    t1 = timeit.default_timer()
+def download_segment(segment_url, dash_folder, next_url=None):
+    """ Module to download the segment over the persistent connections of the session
+    :param next_url: Segment that is requested (pipelined) on the same connection before reading this one
+    """
+    global FETCHER
+    if not FETCHER:
+        FETCHER = SegmentFetcher(get_session_headers())
     try:
-        connection = urllib2.urlopen(segment_url)
-    except urllib2.HTTPError, error:
-        config_dash.LOG.error("Unable to download DASH Segment {} HTTP Error:{} ".format(segment_url, str(error.code)))
-        return None
-    t2 = timeit.default_timer()
-    segment_size = 0
-    while True:
-        segment_data = connection.read(DOWNLOAD_CHUNK)
-        segment_size += len(segment_data)
-        if len(segment_data) < DOWNLOAD_CHUNK:
-            break
-    t3 = timeit.default_timer()
-    config_dash.LOG.debug("download ends, download_time: %.2fs" % (t3-t1))
-    connection.close()
-    return segment_size, ""
+        return FETCHER.download_segment(segment_url, dash_folder, next_url)
+    except socket.error, error:
+        raise IOError("Unable to download DASH Segment {}: {}".format(segment_url, error))
+
+
+def close_fetcher():
+    """ Module to close the connections of the session, so the next playback opens new ones """
+    global FETCHER
+    if FETCHER:
+        config_dash.LOG.info("Pipelined responses discarded: {}".format(FETCHER.discarded_responses))
+        FETCHER.close()
+        FETCHER = None
+
+
+def wait_segments(clock, delay, segment_duration):
+    """ Module to wait while delay segments are played, before downloading the next one """
+    delay_start = clock.time()
+    config_dash.LOG.info("SLEEPING for {}seconds ".format(delay * segment_duration))
+    while clock.time() - delay_start < (delay * segment_duration):
+        clock.sleep(1)
+    config_dash.LOG.debug("SLEPT for {}seconds ".format(clock.time() - delay_start))
 
 
 def get_media_all(domain, media_info, file_identifier, done_queue):
@@ -173,7 +213,8 @@ def print_representations(dp_object):
         print(bandwidth)
 
 
-def start_playback_smart(dp_object, domain, playback_type=None, download=False, video_segment_duration=None):
+def start_playback_smart(dp_object, domain, playback_type=None, download=False, video_segment_duration=None,
+                         clock=None, dash_player=None, fetch_segment=download_segment):
     """ Module that downloads the MPD-FIle and download
         all the representations of the Module to download
         the MPEG-DASH media.
@@ -187,11 +228,17 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
                                 3. 'NETFLIX' - Buffer based adaptation used by Netflix
         :param download: Set to True if the segments are to be stored locally (Boolean). Default False
         :param video_segment_duration: Playback duratoin of each segment
+        :param clock: Source of time for the session (WallClock or VirtualClock). Default WallClock
+        :param dash_player: The player to write the segments to. Default dash_buffer.DashPlayer
+        :param fetch_segment: Function with the signature of download_segment used to get the segments
         :return:
     """
+    if not clock:
+        clock = WallClock()
     # Initialize the DASH buffer
-    dash_player = dash_buffer.DashPlayer(dp_object.playback_duration, video_segment_duration)
-    dash_player.start()
+    if not dash_player:
+        dash_player = dash_buffer.DashPlayer(dp_object.playback_duration, video_segment_duration, clock)
+    telemetry = dash_player.telemetry
     # A folder to save the segments in
     file_identifier = id_generator()
     config_dash.LOG.info("The segments are stored in %s" % file_identifier)
@@ -200,7 +247,9 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
     for bitrate in dp_object.video:
         # Getting the URL list for each bitrate
         dp_object.video[bitrate] = read_mpd.get_url_list(dp_object.video[bitrate], video_segment_duration,
-                                                         dp_object.video[bitrate].timescale * video_segment_duration, bitrate)
+                                                         read_mpd.get_media_duration(dp_object.video[bitrate],
+                                                                                     video_segment_duration),
+                                                         bitrate)
         if "$Bandwidth$" in dp_object.video[bitrate].initialization:
             dp_object.video[bitrate].initialization = dp_object.video[bitrate].initialization.replace(
                 "$Bandwidth$", str(bitrate))
@@ -210,11 +259,14 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
             dp_list[segment_count][bitrate] = segment_url
     bitrates = dp_object.video.keys()
     bitrates.sort()
+    ladder = get_ladder(bitrates, dp_object.manifest.bitrate_unit)
+    # The segments are numbered from the startNumber of the MPD (0 for the config files)
+    start_number = dp_object.video[bitrates[0]].start
     average_dwn_time = 0
     segment_files = []
     # For basic adaptation
-    previous_segment_times = []
-    recent_download_sizes = []
+    # Sizes and download times of the last segments
+    segment_history = SegmentHistory(config_dash.BASIC_DELTA_COUNT)
     weighted_mean_object = None
     current_bitrate = bitrates[0]
     previous_bitrate = None
@@ -223,30 +275,50 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
     segment_duration = 0
     segment_size = segment_download_time = None
     # Netflix Variables
-    average_segment_sizes = netflix_rate_map = None
+    average_segment_sizes = None
     netflix_state = "INITIAL"
+    if playback_type.upper() == "FASTMPC":
+        # Load (or generate) the lookup table before the playback starts. The adaptation_decision times
+        # are then only the lookups
+        fastmpc_dash.get_table(ladder, dash_player.segment_duration).load()
+    dash_player.start()
     # Start playback of all the segments
     # for segment_number, segment in enumerate(dp_list, dp_object.video[current_bitrate].start):
+    # Including the last segment, which is shorter if the playback duration is not a multiple of the
+    # segment duration. The segments of dp_list are repeated if there are fewer (Eg: config files)
+    segment_count = read_mpd.get_segment_count(dp_object.playback_duration, video_segment_duration)
+    # With pipelining the bitrate of the next segment is decided before the current one is read, so
+    # that its request can be sent ahead of the read. The first segment is always at the lowest bitrate
+    pipeline = PIPELINE and fetch_segment == download_segment
+    next_bitrate = bitrates[0]
     timer = 0
-    while timer < int(dp_object.playback_duration / video_segment_duration):
-        segment_number = timer % len(dp_list)
-        print("\n{}: Processing the segment: {} timer: {}".format(playback_type.upper(), segment_number, timer))
-        write_json()
+    while timer < segment_count:
+        download_number = start_number + timer % len(dp_list)
+        print("\n{}: Processing the segment: {} timer: {}".format(playback_type.upper(), download_number, timer))
         if not previous_bitrate:
             previous_bitrate = current_bitrate
         if SEGMENT_LIMIT:
             if not dash_player.segment_limit:
                 dash_player.segment_limit = int(SEGMENT_LIMIT)
-            if segment_number > int(SEGMENT_LIMIT):
+            if download_number > int(SEGMENT_LIMIT):
                 config_dash.LOG.info("Segment limit reached")
                 break
-        if segment_number == dp_object.video[bitrate].start:
+        # Segment whose bitrate is decided in this iteration
+        segment_number = download_number
+        if pipeline:
+            segment_number = start_number + (timer + 1) % len(dp_list)
+            if timer + 1 >= segment_count or (SEGMENT_LIMIT and segment_number > int(SEGMENT_LIMIT)):
+                segment_number = None
+        decision_start = timeit.default_timer()
+        if segment_number is None:
+            # Last segment: there is no next one to decide
+            pass
+        elif segment_number == dp_object.video[bitrate].start:
             current_bitrate = bitrates[0]
         else:
             if playback_type.upper() == "BASIC":
-                current_bitrate, average_dwn_time = basic_dash2.basic_dash2(segment_number, bitrates, average_dwn_time,
-                                                                            recent_download_sizes,
-                                                                            previous_segment_times, current_bitrate)
+                current_bitrate, average_dwn_time = basic_dash2.basic_dash2(segment_number, ladder, average_dwn_time,
+                                                                            segment_history, current_bitrate)
 
                 if dash_player.buffer.qsize() > config_dash.BASIC_THRESHOLD:
                     delay = dash_player.buffer.qsize() - config_dash.BASIC_THRESHOLD
@@ -259,11 +331,11 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
                 # Checking the segment number is in acceptable range
                 if segment_number < len(dp_list) - 1 + dp_object.video[bitrate].start:
                     try:
-                        current_bitrate, delay = weighted_dash.weighted_dash(bitrates, dash_player,
+                        current_bitrate, delay = weighted_dash.weighted_dash(ladder, dash_player,
                                                                              weighted_mean_object.weighted_mean_rate,
                                                                              current_bitrate,
                                                                              get_segment_sizes(dp_object,
-                                                                                               segment_number+1))
+                                                                                               segment_number + 1 - start_number))
                     except IndexError, e:
                         config_dash.LOG.error(e)
             elif playback_type.upper() == "NETFLIX":
@@ -276,9 +348,9 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
                             segment_download_rate = segment_size / segment_download_time
                         else:
                             segment_download_rate = 0
-                        current_bitrate, netflix_rate_map, netflix_state = netflix_dash.netflix_dash(
-                            bitrates, dash_player, segment_download_rate, current_bitrate, average_segment_sizes,
-                            netflix_rate_map, netflix_state)
+                        current_bitrate, netflix_state = netflix_dash.netflix_dash(
+                            ladder, dash_player, segment_download_rate, current_bitrate, average_segment_sizes,
+                            netflix_state)
                     except IndexError, e:
                         config_dash.LOG.error(e)
                 else:
@@ -291,10 +363,8 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
                     config_dash.LOG.info("NETFLIX: delay = {} seconds".format(delay))
             elif playback_type.upper() == "FASTMPC":
                 try:
-                    current_bitrate = fastmpc_dash.fastmpc_dash(
-                        bitrates, dash_player,
-                        recent_download_sizes, previous_segment_times,
-                        previous_bitrate)
+                    current_bitrate = fastmpc_dash.fastmpc_dash(ladder, dash_player, segment_history,
+                                                                previous_bitrate)
                 except IndexError, e:
                     config_dash.LOG.error(e)
                 if dash_player.buffer.qsize() >= config_dash.NETFLIX_BUFFER_SIZE:
@@ -303,77 +373,126 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
 
             else:
                 config_dash.LOG.error("Unknown playback type:{}. Continuing with basic playback".format(playback_type))
-                current_bitrate, average_dwn_time = basic_dash.basic_dash(segment_number, bitrates, average_dwn_time,
+                current_bitrate, average_dwn_time = basic_dash.basic_dash(segment_number, ladder, average_dwn_time,
                                                                           segment_download_time, current_bitrate)
+        if segment_number is not None:
+            telemetry.observe('adaptation_decision', timeit.default_timer() - decision_start)
         # current_bitrate is the rate of the next chunk
-        segment_path = dp_list[segment_number][current_bitrate]
+        segment_bitrate = current_bitrate
+        next_url = None
+        if pipeline:
+            segment_bitrate, next_bitrate = next_bitrate, current_bitrate
+            # The request of the next segment is not sent while the player waits for the buffer to drain:
+            # its response would arrive during the wait and look faster than the link
+            if segment_number is not None and not delay:
+                next_url = urlparse.urljoin(domain, dp_list[segment_number][next_bitrate])
+        segment_path = dp_list[download_number][segment_bitrate]
 
         segment_url = urlparse.urljoin(domain, segment_path)
         #config_dash.LOG.info("{}: Segment URL = {}".format(playback_type.upper(), segment_url))
-        if delay:
-            delay_start = time.time()
-            config_dash.LOG.info("SLEEPING for {}seconds ".format(delay*segment_duration))
-            while time.time() - delay_start < (delay * segment_duration):
-                time.sleep(1)
+        if delay and not pipeline:
+            wait_segments(clock, delay, segment_duration)
             delay = 0
-            config_dash.LOG.debug("SLEPT for {}seconds ".format(time.time() - delay_start))
-        start_time = timeit.default_timer()
+        start_time = clock.time()
         try:
-            segment_size, segment_filename = download_segment(segment_url, file_identifier)
+            segment_size, segment_filename = fetch_segment(segment_url, file_identifier, next_url)
             config_dash.LOG.debug("{}: Downloaded segment {}".format(playback_type.upper(), segment_url))
         except IOError, e:
             config_dash.LOG.error("Unable to save segment %s" % e)
+            close_telemetry()
+            write_json()
             return None
-        segment_download_time = timeit.default_timer() - start_time
-        previous_segment_times.append(segment_download_time)
-        recent_download_sizes.append(segment_size)
+        segment_download_time = clock.time() - start_time
+        telemetry.observe('segment_fetch', segment_download_time)
+        segment_history.update(segment_size, segment_download_time)
         # Updating the JSON information
         segment_name = os.path.split(segment_url)[1]
         if "segment_info" not in config_dash.JSON_HANDLE:
             config_dash.JSON_HANDLE["segment_info"] = list()
-        config_dash.JSON_HANDLE["segment_info"].append((segment_name, current_bitrate, segment_size,
+        config_dash.JSON_HANDLE["segment_info"].append((segment_name, segment_bitrate, segment_size,
                                                         segment_download_time))
-        config_dash.LOG.info("%s: segment_size: %dKB segment_id: %d download_time: %.2fs download_rate: %dKbps"
-            % ( playback_type.upper(),
-            segment_size >> 10,
-            segment_number,
-            segment_download_time,
-            int(8 * segment_size / segment_download_time) >> 10 ) )
+        telemetry.record('segment', {'segment_number': download_number,
+                                     'segment_name': segment_name,
+                                     'bitrate': segment_bitrate,
+                                     'size': segment_size,
+                                     'download_time': segment_download_time,
+                                     'buffer_size': dash_player.buffer.qsize()})
+        if config_dash.LOG.isEnabledFor(logging.INFO):
+            config_dash.LOG.info("%s: segment_size: %dKB segment_id: %d download_time: %.2fs download_rate: %dKbps"
+                % ( playback_type.upper(),
+                segment_size >> 10,
+                download_number,
+                segment_download_time,
+                int(8 * segment_size / segment_download_time) >> 10 ) )
         if playback_type.upper() == "SMART" and weighted_mean_object:
             weighted_mean_object.update_weighted_mean(segment_size, segment_download_time)
 
         segment_info = {'playback_length': video_segment_duration,
                         'size': segment_size,
-                        'bitrate': current_bitrate,
+                        'bitrate': segment_bitrate,
                         'data': segment_filename,
                         'URI': segment_url,
-                        'segment_number': segment_number}
+                        'segment_number': download_number}
         segment_duration = segment_info['playback_length']
         dash_player.write(segment_info)
         segment_files.append(segment_filename)
         if previous_bitrate:
-            if previous_bitrate < current_bitrate:
+            if previous_bitrate < segment_bitrate:
                 config_dash.JSON_HANDLE['playback_info']['up_shifts'] += 1
-            elif previous_bitrate > current_bitrate:
+            elif previous_bitrate > segment_bitrate:
                 config_dash.JSON_HANDLE['playback_info']['down_shifts'] += 1
-            previous_bitrate = current_bitrate
+            previous_bitrate = segment_bitrate
+        if delay and pipeline:
+            wait_segments(clock, delay, segment_duration)
+            delay = 0
         timer += 1
+    dash_player.end_of_stream()
 
     # waiting for the player to finish playing
-    while dash_player.playback_state not in dash_buffer.EXIT_STATES:
-        time.sleep(1)
+    while not dash_player.finished():
+        clock.sleep(1)
+    if dash_player.player_thread:
+        # The player logs its last state after it is finished
+        dash_player.player_thread.join()
+    config_dash.JSON_HANDLE['playback_info']['sum_qoe'] = dash_player.sum_qoe
+    close_telemetry()
+    config_dash.LOG.info("Telemetry: {}".format(json.dumps(telemetry.summary(), sort_keys=True)))
+    # Summary of the session. The segments are streamed to the telemetry log while playing
     write_json()
     if not download:
         clean_files(file_identifier)
 
 
+def start_playback_simulated(dp_object, trace_file, playback_type, video_segment_duration, link_delay=0):
+    """ Module that runs start_playback_smart on a virtual clock. Instead of downloading
+        from the server, the segment sizes are read from the MPD/config file and the
+        download times are given by a mahimahi trace. A session completes in
+        a fraction of its playback duration.
+        Example: start_playback_simulated(dp_object, "trace/ATT-LTE-driving.down", "SMART", video_segment_duration)
+
+        :param dp_object:       The DASH-playback object
+        :param trace_file:      The mahimahi downlink trace (packet-delivery opportunities in ms)
+        :param playback_type:   The type of playback (Same as start_playback_smart)
+        :param video_segment_duration: Playback duration of each segment
+        :param link_delay:      One way propagation delay of the link in ms (as in mm-delay)
+        :return:
+    """
+    clock = VirtualClock()
+    trace = read_trace.MahimahiTrace(trace_file)
+    dash_player = SimulatedPlayer(dp_object.playback_duration, video_segment_duration, clock)
+    downloader = TraceDownloader(dp_object, trace, clock, link_delay / 1000)
+    config_dash.JSON_HANDLE['playback_info']['trace'] = trace_file
+    return start_playback_smart(dp_object, "", playback_type, False, video_segment_duration,
+                                clock=clock, dash_player=dash_player, fetch_segment=downloader.download_segment)
+
+
 def get_segment_sizes(dp_object, segment_number):
     """ Module to get the segment sizes for the segment_number
     :param dp_object:
     :param segment_number:
     :return:
     """
-    segment_sizes = dict([(bitrate, dp_object.video[bitrate].segment_sizes[segment_number]) for bitrate in dp_object.video])
+    segment_sizes = dp_object.manifest.get_segment_sizes(segment_number)
     config_dash.LOG.debug("The segment sizes of {} are {}".format(segment_number, segment_sizes))
     return segment_sizes
 
@@ -384,14 +503,7 @@ def get_average_segment_sizes(dp_object):
     :param dp_object:
     :return: A dictionary of aveage segment sizes for each bitrate
     """
-    average_segment_sizes = dict()
-    for bitrate in dp_object.video:
-        segment_sizes = dp_object.video[bitrate].segment_sizes
-        segment_sizes = [float(i) for i in segment_sizes]
-        try:
-            average_segment_sizes[bitrate] = sum(segment_sizes)/len(segment_sizes)
-        except ZeroDivisionError:
-            average_segment_sizes[bitrate] = 0
+    average_segment_sizes = dp_object.manifest.get_average_segment_sizes()
     config_dash.LOG.info("The avearge segment size for is {}".format(average_segment_sizes.items()))
     return average_segment_sizes
 
@@ -462,6 +574,16 @@ def start_playback_all(dp_object, domain):
                 break
 
 
+def start_playback(dp_object, domain, playback_type, video_segment_duration):
+    """ Module to start the playback in real time, or over the mahimahi TRACE if one is given """
+    if TRACE:
+        return start_playback_simulated(dp_object, TRACE, playback_type, video_segment_duration, LINK_DELAY)
+    try:
+        return start_playback_smart(dp_object, domain, playback_type, DOWNLOAD, video_segment_duration)
+    finally:
+        close_fetcher()
+
+
 def create_arguments(parser):
     """ Adding arguments to the parser """
     parser.add_argument('-m', '--MPD',
@@ -477,10 +599,21 @@ def create_arguments(parser):
     parser.add_argument('-d', '--DOWNLOAD', action='store_true',
                         default=False,
                         help="Keep the video files after playback")
+    parser.add_argument('-t', '--TRACE',
+                        default=TRACE,
+                        help="Simulate the playback over a mahimahi trace on a virtual clock. "
+                             "The MPD is then a local file")
+    parser.add_argument('--LINK_DELAY', type=float,
+                        default=LINK_DELAY,
+                        help="One way delay of the simulated link in ms. Used with --TRACE")
+    parser.add_argument('--PIPELINE', action='store_true', default=PIPELINE,
+                        help="Decide the bitrate of the next segment before the current one is read "
+                             "and request it while the current one downloads")
 
 
 def main():
     """ Main Program wrapper """
+    global SESSION_ID
     # configure the log file
     # Create arguments
     parser = ArgumentParser(description='Process Client parameters')
@@ -492,10 +625,16 @@ def main():
     if not MPD:
         print("ERROR: Please provide the URL to the MPD file. Try Again..")
         return None
-    config_dash.LOG.info('Downloading MPD file %s' % MPD)
-    # Retrieve the MPD files for the video
-    mpd_file = get_mpd(MPD)
-    domain = get_domain_name(MPD)
+    if TRACE:
+        # Simulated playback reads the local MPD file
+        mpd_file = MPD
+        domain = ""
+    else:
+        SESSION_ID = id_generator()
+        config_dash.LOG.info('Downloading MPD file %s' % MPD)
+        # Retrieve the MPD files for the video
+        mpd_file = get_mpd(MPD)
+        domain = get_domain_name(MPD)
     dp_object = DashPlayback()
 
     # Reading the MPD file created
@@ -511,21 +650,24 @@ def main():
         return None
     print(type(PLAYBACK))
     if "all" in PLAYBACK.lower():
+        if TRACE:
+            config_dash.LOG.error("Parallel playback of all the representations can not be simulated")
+            return None
         if mpd_file:
             config_dash.LOG.critical("Start ALL Parallel PLayback")
             start_playback_all(dp_object, domain)
     elif "basic" in PLAYBACK.lower():
         config_dash.LOG.critical("Started Basic-DASH Playback")
-        start_playback_smart(dp_object, domain, "BASIC", DOWNLOAD, video_segment_duration)
+        start_playback(dp_object, domain, "BASIC", video_segment_duration)
     elif "sara" in PLAYBACK.lower():
         config_dash.LOG.critical("Started SARA-DASH Playback")
-        start_playback_smart(dp_object, domain, "SMART", DOWNLOAD, video_segment_duration)
+        start_playback(dp_object, domain, "SMART", video_segment_duration)
     elif "netflix" in PLAYBACK.lower():
         config_dash.LOG.critical("Started Netflix-DASH Playback")
-        start_playback_smart(dp_object, domain, "NETFLIX", DOWNLOAD, video_segment_duration)
+        start_playback(dp_object, domain, "NETFLIX", video_segment_duration)
     elif "fastmpc" in PLAYBACK.lower():
         config_dash.LOG.critical("Started FastMPC-DASH Playback")
-        start_playback_smart(dp_object, domain, "FastMPC", DOWNLOAD, video_segment_duration)
+        start_playback(dp_object, domain, "FastMPC", video_segment_duration)
     else:
         config_dash.LOG.error("Unknown Playback parameter {}".format(PLAYBACK))
         return None
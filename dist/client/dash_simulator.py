@@ -0,0 +1,163 @@
+"""
+Discrete-event simulation of a DASH session.
+
+The session runs on a VirtualClock instead of the wall clock:
+    - SimulatedPlayer replays the DashPlayer state machine as clock events
+      (segment-end deadlines) instead of a spinning player thread.
+    - TraceDownloader replaces the HTTP download with the segment sizes from
+      the MPD/config file and the delivery times of a mahimahi trace.
+The adaptation algorithms and the JSON/CSV logs are the same as for the real
+playback (see dash_client.start_playback_simulated).
+"""
+from __future__ import division
+import heapq
+import itertools
+import config_dash
+import dash_buffer
+
+# Seconds added to the segment-end events
+PLAYBACK_EPSILON = 1e-6
+
+
+class VirtualClock:
+    """ Simulated clock with an event queue.
+        Time only advances through sleep()/run_until(), which run the
+        scheduled events in order of their time.
+    """
+    def __init__(self, start_time=0.0):
+        self.now = start_time
+        self.events = list()
+        # Tie breaker to keep the events at the same time in FIFO order
+        self.counter = itertools.count()
+
+    def time(self):
+        """ :return: current simulated time in seconds """
+        return self.now
+
+    def schedule(self, delay, callback, *args):
+        """ Run callback(*args) after delay seconds of simulated time """
+        heapq.heappush(self.events, (self.now + delay, next(self.counter), callback, args))
+
+    def pending(self):
+        """ :return: True if there are events left to run """
+        return len(self.events) > 0
+
+    def run_until(self, deadline):
+        """ Run all the events scheduled up to the deadline and move the clock to the deadline """
+        while self.events and self.events[0][0] <= deadline:
+            event_time, _, callback, args = heapq.heappop(self.events)
+            self.now = max(self.now, event_time)
+            callback(*args)
+        self.now = max(self.now, deadline)
+
+    def sleep(self, seconds):
+        """ Same as WallClock.sleep() but returns immediately """
+        self.run_until(self.now + seconds)
+
+
+class SimulatedPlayer(dash_buffer.DashPlayer):
+    """ DashPlayer that is driven by the events of a VirtualClock instead of the player thread.
+        The state changes, QoE accounting and logs are those of DashPlayer.
+    """
+    def start(self):
+        """ Start playback"""
+        self.set_state("INITIAL_BUFFERING")
+        config_dash.LOG.info("Starting the Player")
+        self.start_time = self.clock.time()
+        config_dash.LOG.info("Initialized player with video length {}".format(self.playback_duration))
+        self.log_entry(action="Starting")
+
+    def write(self, segment):
+        """ write segment to the buffer and resume the playback if it was waiting for it """
+        dash_buffer.DashPlayer.write(self, segment)
+        self.resume()
+
+    def end_of_stream(self):
+        """ Called once the last segment has been written. The last segments are played
+            even if there are fewer than the buffering counts
+        """
+        dash_buffer.DashPlayer.end_of_stream(self)
+        self.resume()
+
+    def resume(self):
+        """ Start or resume the playback if it was waiting for the segments in the buffer """
+        if self.playback_state == "INITIAL_BUFFERING":
+            if self.can_start():
+                self.start_playback()
+                self.play_next_segment()
+        elif self.playback_state == "BUFFERING":
+            if self.can_resume():
+                self.resume_playback()
+                self.play_next_segment()
+
+    def play_next_segment(self):
+        """ Read one segment from the buffer and schedule the end of its playback """
+        next_segment = self.play_next()
+        if not next_segment:
+            return
+        play_segment, deadline = next_segment
+        # PLAYBACK_EPSILON makes sure the stop watch reaches the deadline despite rounding errors
+        self.clock.schedule(max(0, deadline - self.playback_timer.precise_time()) + PLAYBACK_EPSILON,
+                            self.segment_end, play_segment)
+
+    def segment_end(self, play_segment):
+        """ Clock event at the end of the playback of a segment """
+        if self.playback_state != "PLAY":
+            return
+        if self.segment_played(play_segment):
+            return
+        if self.playback_state == "STOP":
+            self.stopped()
+        else:
+            self.play_next_segment()
+
+    def finished(self):
+        """ :return: True once the player has reached one of the EXIT_STATES.
+            Stops the player when it waits for segments that will never be downloaded
+        """
+        if not self.clock.pending() and self.buffer.qsize() == 0 and \
+                self.playback_state not in dash_buffer.EXIT_STATES:
+            self.set_state("STOP")
+            self.stopped()
+        return dash_buffer.DashPlayer.finished(self)
+
+
+class TraceDownloader:
+    """ Replaces the HTTP download of the segments.
+        The segment size is read from the MPD/config file and the download time
+        is given by the delivery opportunities of a mahimahi trace.
+    """
+    def __init__(self, dp_object, trace, clock, link_delay=0):
+        """
+        :param dp_object: The DASH-playback object
+        :param trace: read_trace.MahimahiTrace of the downlink
+        :param clock: VirtualClock of the session
+        :param link_delay: One way propagation delay in seconds (as in mm-delay)
+        """
+        self.dp_object = dp_object
+        self.trace = trace
+        self.clock = clock
+        self.link_delay = link_delay
+        self.segment_sizes = None
+
+    def get_segment_size(self, segment_url):
+        """ Size of the segment as served by the dash_server """
+        if self.segment_sizes is None:
+            self.segment_sizes = dict()
+            for media in self.dp_object.video.values():
+                for segment_id, url in enumerate(media.url_list, media.start):
+                    # Same indexing as VirtualVideo.get_video in the server
+                    self.segment_sizes[url] = int(media.segment_sizes[segment_id - 1])
+        return self.segment_sizes[segment_url]
+
+    def download_segment(self, segment_url, dash_folder, next_url=None):
+        """ Same as dash_client.download_segment, but advances the clock by the download time """
+        config_dash.LOG.debug("download begins: {}".format(segment_url))
+        segment_size = self.get_segment_size(segment_url)
+        request_time = self.clock.time()
+        # The request reaches the server after the link delay and the last byte
+        # takes the link delay to reach the client
+        finish_time = self.trace.delivery_time(request_time + self.link_delay, segment_size) + self.link_delay
+        self.clock.run_until(finish_time)
+        config_dash.LOG.debug("download ends, download_time: %.2fs" % (finish_time - request_time))
+        return segment_size, ""
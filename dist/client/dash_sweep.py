@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""
+Batch runner for simulated DASH sessions.
+
+Runs every combination of playback types x mahimahi traces x MPD/config files
+with dash_client.start_playback_simulated and merges the results of the sessions
+into one summary table.
+
+    python dist/client/dash_sweep.py -p basic sara netflix fastmpc \
+        -t trace/*.down -m dist/sample_mpd/mot17-10.config -o SWEEP_LOGS/
+
+Each session runs in its own worker process (the state in config_dash is global)
+and logs into its own folder in the output folder. The folder of a session is
+named after all its parameters (full paths of the trace and MPD file, link delay
+and segment limit). Sessions that already have a result file are skipped, so an
+interrupted sweep can be resumed by running the same command again. The summary table is rebuilt from the result files of all the
+sessions in the output folder, so sweeps with other traces or MPD files can be
+added to the same folder.
+"""
+from __future__ import division
+import os
+import re
+import sys
+import csv
+import json
+import hashlib
+import logging
+import traceback
+import itertools
+from argparse import ArgumentParser
+from multiprocessing import Pool, cpu_count
+sys.path.append("./dist/util/")
+import config_dash
+import read_mpd
+from configure_log_file import configure_log_file, configure_session
+import dash_client
+from adaptation.mpc_table import get_lookup_table
+
+DEFAULT_OUTPUT = "SWEEP_LOGS/"
+# Written once the session is completed
+RESULT_FILENAME = "result.json"
+SUMMARY_FILENAME = "summary.csv"
+SUMMARY_COLUMNS = ['session', 'playback', 'trace', 'mpd', 'link_delay', 'segment_limit', 'initial_buffering',
+                   'interruptions', 'interruption_duration', 'up_shifts', 'down_shifts', 'sum_qoe', 'segments']
+
+# Globals for arg parser with the default values
+PLAYBACK = sorted(dash_client.PLAYBACK_TYPES)
+TRACE = None
+MPD = None
+OUTPUT = DEFAULT_OUTPUT
+PROCESSES = None
+LINK_DELAY = 0
+SEGMENT_LIMIT = None
+
+
+def get_session_parameters(playback, trace_file, mpd_file, link_delay=0, segment_limit=None):
+    """ Module to get the parameters that identify a session """
+    return {'playback': playback,
+            'trace': os.path.abspath(trace_file),
+            'mpd': os.path.abspath(mpd_file),
+            'link_delay': float(link_delay or 0),
+            'segment_limit': int(segment_limit) if segment_limit else None}
+
+
+def get_session_id(playback, trace_file, mpd_file, link_delay=0, segment_limit=None):
+    """ Module to get a file name for the session.
+        The names of the trace and MPD file are followed by a hash of all the parameters of the session,
+        so that sessions with another link delay, segment limit or folder do not share their results
+    """
+    parameters = get_session_parameters(playback, trace_file, mpd_file, link_delay, segment_limit)
+    key = hashlib.md5(json.dumps(parameters, sort_keys=True)).hexdigest()[:8]
+    name = "_".join((playback, os.path.basename(trace_file), os.path.basename(mpd_file), key))
+    return re.sub(r'[^\w.-]', '_', name)
+
+
+def get_session_result(session_id, parameters, json_handle):
+    """ Module to get the summary row of a session from its parameters and JSON_HANDLE """
+    playback_info = json_handle['playback_info']
+    result = {'session': session_id,
+              'initial_buffering': playback_info['initial_buffering_duration'],
+              'interruptions': playback_info['interruptions']['count'],
+              'interruption_duration': playback_info['interruptions']['total_duration'],
+              'up_shifts': playback_info['up_shifts'],
+              'down_shifts': playback_info['down_shifts'],
+              'sum_qoe': playback_info.get('sum_qoe'),
+              'segments': len(json_handle.get('segment_info', list()))}
+    result.update(parameters)
+    return result
+
+
+def read_session_result(session_folder, parameters=None):
+    """ :param parameters: Parameters of the session (get_session_parameters). A result of other parameters is ignored
+    :return: The result of a completed session or None
+    """
+    result_file = os.path.join(session_folder, RESULT_FILENAME)
+    if not os.path.exists(result_file):
+        return None
+    with open(result_file) as result_handle:
+        result = json.load(result_handle)
+    if parameters and any(result.get(name) != value for name, value in parameters.items()):
+        return None
+    return result
+
+
+def run_session(session):
+    """ Module to run one simulated session in a worker process
+    :param session: (session_id, session parameters, output_folder)
+    :return: The summary row of the session or None if it failed
+    """
+    session_id, parameters, output_folder = session
+    playback, trace_file, mpd_file = parameters['playback'], parameters['trace'], parameters['mpd']
+    session_folder = os.path.join(output_folder, session_id)
+    configure_session(session_folder)
+    # The player prints the progress of every segment
+    sys.stdout = open(os.devnull, 'w')
+    # Drop the console handler of the sweep inherited from the parent process
+    logging.getLogger(config_dash.LOG_NAME).handlers = list()
+    config_dash.LOG_LEVEL = logging.INFO
+    configure_log_file(playback_type=playback, log_file=config_dash.LOG_FILENAME)
+    config_dash.JSON_HANDLE['playback_type'] = playback
+    try:
+        dp_object = dash_client.DashPlayback()
+        dp_object, video_segment_duration = read_mpd.read_mpd(mpd_file, dp_object)
+        dash_client.SEGMENT_LIMIT = parameters['segment_limit']
+        dash_client.start_playback_simulated(dp_object, trace_file, dash_client.PLAYBACK_TYPES[playback],
+                                             video_segment_duration, parameters['link_delay'])
+    except Exception:
+        config_dash.LOG.error("Session {} failed: {}".format(session_id, traceback.format_exc()))
+        sys.stderr.write("Session {} failed. See the log in {}\n".format(session_id, session_folder))
+        return None
+    result = get_session_result(session_id, parameters, config_dash.JSON_HANDLE)
+    # Write the result only once it is complete, so a killed session is rerun
+    result_file = os.path.join(session_folder, RESULT_FILENAME)
+    with open(result_file + ".tmp", 'w') as result_handle:
+        json.dump(result, result_handle)
+    os.rename(result_file + ".tmp", result_file)
+    return result
+
+
+def read_results(output_folder):
+    """ :return: The results of all the completed sessions in the output folder,
+        including those of the previous sweeps into the same folder
+    """
+    results = list()
+    for session_id in sorted(os.listdir(output_folder)):
+        session_folder = os.path.join(output_folder, session_id)
+        if os.path.isdir(session_folder):
+            result = read_session_result(session_folder)
+            if result:
+                results.append(result)
+    return results
+
+
+def write_summary(results, summary_file):
+    """ Module to write the results of all the sessions as a CSV table """
+    with open(summary_file + ".tmp", 'wb') as summary_handle:
+        result_writer = csv.DictWriter(summary_handle, SUMMARY_COLUMNS)
+        result_writer.writerow(dict(zip(SUMMARY_COLUMNS, SUMMARY_COLUMNS)))
+        for result in sorted(results, key=lambda row: row['session']):
+            result_writer.writerow(result)
+    os.rename(summary_file + ".tmp", summary_file)
+
+
+def print_summary(results):
+    """ Module to print the summary table """
+    row_format = "{:<48} {:>8} {:>10} {:>6} {:>9} {:>6} {:>6} {:>12}"
+    print(row_format.format('session', 'delay', 'init_buf', 'int', 'int_dur', 'up', 'down', 'sum_qoe'))
+    for result in sorted(results, key=lambda row: row['session']):
+        print(row_format.format(result['session'][:48], result.get('link_delay', ''),
+                                "%.2f" % (result['initial_buffering'] or 0),
+                                result['interruptions'], "%.2f" % result['interruption_duration'],
+                                result['up_shifts'], result['down_shifts'], "%.2f" % (result['sum_qoe'] or 0)))
+
+
+def prepare_fastmpc_tables(mpd_files):
+    """ Module to generate the missing FastMPC lookup tables of the MPD files before the sessions start,
+        so that the workers do not generate the same table in parallel
+    """
+    print("Preparing the FastMPC lookup tables")
+    for mpd_file in mpd_files:
+        dp_object, video_segment_duration = read_mpd.read_mpd(mpd_file, dash_client.DashPlayback())
+        get_lookup_table(sorted(dp_object.video), video_segment_duration, dp_object.manifest.bitrate_unit)
+
+
+def run_sweep(playback_types, trace_files, mpd_files, output_folder, processes=None, link_delay=0,
+              segment_limit=None):
+    """ Module to run all the combinations of playback types, traces and MPD files
+    :param processes: Number of worker processes. Default: number of cores
+    :return: List of the summary rows of the completed sessions
+    """
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    results = list()
+    sessions = list()
+    for playback, trace_file, mpd_file in itertools.product(playback_types, trace_files, mpd_files):
+        session_id = get_session_id(playback, trace_file, mpd_file, link_delay, segment_limit)
+        parameters = get_session_parameters(playback, trace_file, mpd_file, link_delay, segment_limit)
+        result = read_session_result(os.path.join(output_folder, session_id), parameters)
+        if result:
+            results.append(result)
+        else:
+            sessions.append((session_id, parameters, output_folder))
+    print("Skipping {} completed sessions. Running {} sessions".format(len(results), len(sessions)))
+    if 'fastmpc' in set(session[1]['playback'] for session in sessions):
+        prepare_fastmpc_tables(mpd_files)
+    if sessions:
+        # A new process for each session so that no state is shared between sessions
+        pool = Pool(processes or cpu_count(), maxtasksperchild=1)
+        try:
+            for count, result in enumerate(pool.imap_unordered(run_session, sessions), 1):
+                if result:
+                    results.append(result)
+                print("Completed {}/{} sessions".format(count, len(sessions)))
+        finally:
+            pool.close()
+            pool.join()
+    # The summary has the sessions of every sweep into the output folder, not only this one
+    write_summary(read_results(output_folder), os.path.join(output_folder, SUMMARY_FILENAME))
+    return results
+
+
+def create_arguments(parser):
+    """ Adding arguments to the parser """
+    parser.add_argument('-p', '--PLAYBACK', nargs='+', default=PLAYBACK,
+                        choices=sorted(dash_client.PLAYBACK_TYPES),
+                        help="Playback types. Default all of them")
+    parser.add_argument('-t', '--TRACE', nargs='+', required=True,
+                        help="Mahimahi traces of the downlink")
+    parser.add_argument('-m', '--MPD', nargs='+', required=True,
+                        help="Local MPD/config files")
+    parser.add_argument('-o', '--OUTPUT', default=OUTPUT,
+                        help="Folder for the session logs and the summary. Default %s" % DEFAULT_OUTPUT)
+    parser.add_argument('-j', '--PROCESSES', type=int, default=PROCESSES,
+                        help="Number of parallel sessions. Default number of cores")
+    parser.add_argument('--LINK_DELAY', type=float, default=LINK_DELAY,
+                        help="One way delay of the simulated link in ms")
+    parser.add_argument('-n', '--SEGMENT_LIMIT', default=SEGMENT_LIMIT,
+                        help="The Segment number limit")
+
+
+def main():
+    """ Main Program wrapper """
+    parser = ArgumentParser(description='Run simulated sessions for all the playback types, traces and MPD files')
+    create_arguments(parser)
+    args = parser.parse_args()
+    globals().update(vars(args))
+    config_dash.LOG_LEVEL = logging.WARNING
+    configure_log_file(log_file=None)
+    results = run_sweep(PLAYBACK, TRACE, MPD, OUTPUT, PROCESSES, LINK_DELAY, SEGMENT_LIMIT)
+    print_summary(results)
+    print("Summary written to {}".format(os.path.join(OUTPUT, SUMMARY_FILENAME)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
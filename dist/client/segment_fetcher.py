@@ -0,0 +1,243 @@
+"""
+Segment fetcher for the DASH client.
+
+Downloads the segments over persistent HTTP/1.1 connections:
+    - ConnectionPool keeps the idle connections of each server, so a session
+      pays the TCP connection setup once instead of once per segment.
+    - The response bodies are read with recv_into() into one reusable buffer
+      until Content-Length bytes are read (a short read does not end the segment).
+    - The request for the next segment can be sent (pipelined) while the body
+      of the current one is being read. The client only pipelines a segment once
+      its bitrate is decided; a connection whose pipelined response is not the
+      next segment is closed instead of being read.
+    - The (timestamp, bytes) of every read of the body are kept in
+      SegmentFetcher.samples.
+"""
+from __future__ import division
+import socket
+import timeit
+import urlparse
+from collections import deque, defaultdict
+import config_dash
+
+# Size of the reusable receive buffer
+DOWNLOAD_CHUNK = 65536
+# Idle connections kept for each server
+MAX_IDLE_CONNECTIONS = 2
+MAX_HEADER_SIZE = 65536
+DEFAULT_TIMEOUT = 10
+
+
+class ConnectionClosed(IOError):
+    """ The server closed the connection before the end of the response """
+    pass
+
+
+class PersistentConnection(object):
+    """ HTTP/1.1 connection to one server with the requests in flight on it """
+    def __init__(self, host, port, timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Paths of the requests that were sent and whose responses are not read yet
+        self.in_flight = deque()
+        # Bytes read past the end of the last response (start of the next one)
+        self.pending = bytearray()
+        self.reusable = True
+        # Number of responses read on the connection
+        self.responses = 0
+
+    def send_request(self, path, headers):
+        """ Send a GET request for the path without waiting for the response """
+        request = ["GET {} HTTP/1.1".format(path), "Host: {}:{}".format(self.host, self.port)]
+        request.extend("{}: {}".format(name, value) for name, value in headers.items())
+        self.sock.sendall("\r\n".join(request) + "\r\n\r\n")
+        self.in_flight.append(path)
+
+    def read_headers(self, view):
+        """ Read the status line and the headers of the next response
+        :return: (status, headers, body bytes read with the headers)
+        """
+        data = self.pending
+        self.pending = bytearray()
+        header_end = data.find("\r\n\r\n")
+        while header_end < 0:
+            if len(data) > MAX_HEADER_SIZE:
+                raise IOError("Response headers from {} too long".format(self.host))
+            count = self.sock.recv_into(view)
+            if not count:
+                raise ConnectionClosed("Connection to {} closed by the server".format(self.host))
+            data += view[:count]
+            header_end = data.find("\r\n\r\n")
+        lines = str(data[:header_end]).split("\r\n")
+        try:
+            version, status = lines[0].split(None, 2)[:2]
+            status = int(status)
+        except ValueError:
+            raise IOError("Bad status line from {}: {}".format(self.host, lines[0]))
+        headers = dict()
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if version != "HTTP/1.1" or headers.get('connection', '').lower() == 'close':
+            self.reusable = False
+        return status, headers, data[header_end + 4:]
+
+    def read_response(self, view, samples=None, clock=timeit.default_timer):
+        """ Read the next response. The body is read into view and not kept
+        :param samples: List to append the (timestamp, bytes) of every read of the body to
+        :return: (status, body size)
+        """
+        self.in_flight.popleft()
+        status, headers, body = self.read_headers(view)
+        self.responses += 1
+        if 'content-length' in headers:
+            remaining = int(headers['content-length'])
+        else:
+            # Body ends when the server closes the connection
+            remaining = None
+            self.reusable = False
+        if remaining is not None and len(body) > remaining:
+            # Start of the next pipelined response
+            self.pending = body[remaining:]
+            body = body[:remaining]
+        size = len(body)
+        if remaining is not None:
+            remaining -= size
+        if body and samples is not None:
+            samples.append((clock(), size))
+        while remaining is None or remaining > 0:
+            count = self.sock.recv_into(view, len(view) if remaining is None else min(len(view), remaining))
+            if not count:
+                if remaining is None:
+                    break
+                raise ConnectionClosed("Connection to {} closed after {} bytes of the body".format(self.host, size))
+            size += count
+            if remaining is not None:
+                remaining -= count
+            if samples is not None:
+                samples.append((clock(), count))
+        return status, size
+
+    def close(self):
+        self.reusable = False
+        self.sock.close()
+
+
+def get_path(parsed_url):
+    """ :return: The path of the request line for the urlparse result """
+    return parsed_url.path + ("?" + parsed_url.query if parsed_url.query else "")
+
+
+class ConnectionPool(object):
+    """ Idle persistent connections for each (host, port) """
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_idle=MAX_IDLE_CONNECTIONS):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle = defaultdict(list)
+
+    def get(self, host, port):
+        """ :return: An idle connection to the server or a new one """
+        if self.idle[(host, port)]:
+            return self.idle[(host, port)].pop()
+        config_dash.LOG.debug("New connection to {}:{}".format(host, port))
+        return PersistentConnection(host, port, self.timeout)
+
+    def release(self, connection):
+        """ Return the connection to the pool once all its responses are read """
+        idle = self.idle[(connection.host, connection.port)]
+        if connection.reusable and not connection.in_flight and len(idle) < self.max_idle:
+            idle.append(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        for idle in self.idle.values():
+            for connection in idle:
+                connection.close()
+        self.idle.clear()
+
+
+class SegmentFetcher(object):
+    """ Downloads the segments of a session over persistent (and optionally pipelined) connections """
+    def __init__(self, headers=None, chunk_size=DOWNLOAD_CHUNK, timeout=DEFAULT_TIMEOUT, clock=timeit.default_timer):
+        """
+        :param headers: Headers sent with every request (Eg: the session ID)
+        :param chunk_size: Size of the receive buffer
+        :param clock: Source of the timestamps of the samples
+        """
+        self.headers = headers or dict()
+        self.pool = ConnectionPool(timeout)
+        self.buffer = bytearray(chunk_size)
+        self.view = memoryview(self.buffer)
+        self.clock = clock
+        # Connection with pipelined requests, kept out of the pool until they are read
+        self.pipelined = None
+        # (timestamp, bytes) of each read of the body of the last segment
+        self.samples = list()
+        # Pipelined responses that were not used (their connection was closed)
+        self.discarded_responses = 0
+
+    def get_connection(self, host, port, path):
+        """ :return: The connection with the pipelined request for path, else a pooled one """
+        if self.pipelined:
+            connection, self.pipelined = self.pipelined, None
+            if (connection.host, connection.port) == (host, port) and connection.in_flight[0] == path:
+                return connection
+            for stale_path in connection.in_flight:
+                config_dash.LOG.info("Discarding the pipelined response of {}".format(stale_path))
+            self.discarded_responses += len(connection.in_flight)
+            connection.close()
+        return self.pool.get(host, port)
+
+    def fetch(self, url, next_url=None, retry=True):
+        """ Download url. The body is not kept
+        :param next_url: URL requested on the same connection before reading the response of url
+        :return: (status, body size)
+        """
+        parsed_url = urlparse.urlparse(url)
+        path = get_path(parsed_url)
+        port = parsed_url.port or 80
+        connection = self.get_connection(parsed_url.hostname, port, path)
+        reused = connection.responses > 0
+        self.samples = list()
+        try:
+            if not connection.in_flight:
+                connection.send_request(path, self.headers)
+            if next_url:
+                next_parsed_url = urlparse.urlparse(next_url)
+                if (next_parsed_url.hostname, next_parsed_url.port or 80) == (parsed_url.hostname, port):
+                    connection.send_request(get_path(next_parsed_url), self.headers)
+            status, size = connection.read_response(self.view, self.samples, self.clock)
+        except (socket.error, ConnectionClosed), error:
+            connection.close()
+            if retry and reused and not self.samples:
+                # The server closed the idle connection. Try again on a new one
+                config_dash.LOG.debug("Retrying {} on a new connection: {}".format(url, error))
+                return self.fetch(url, next_url, retry=False)
+            raise
+        if connection.in_flight and connection.reusable:
+            self.pipelined = connection
+        else:
+            self.pool.release(connection)
+        return status, size
+
+    def download_segment(self, segment_url, dash_folder, next_url=None):
+        """ Same as dash_client.download_segment
+        :return: (segment size, segment file name) or None if the server returned an error
+        """
+        config_dash.LOG.debug("download begins: {}".format(segment_url))
+        start_time = timeit.default_timer()
+        status, segment_size = self.fetch(segment_url, next_url)
+        if status != 200:
+            config_dash.LOG.error("Unable to download DASH Segment {} HTTP Error:{} ".format(segment_url, status))
+            return None
+        config_dash.LOG.debug("download ends, download_time: %.2fs" % (timeit.default_timer() - start_time))
+        return segment_size, ""
+
+    def close(self):
+        if self.pipelined:
+            self.pipelined.close()
+            self.pipelined = None
+        self.pool.close()
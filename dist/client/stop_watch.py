@@ -1,11 +1,26 @@
 import time
 
 
+class WallClock():
+    """ Clock backed by the system time.
+        Has the same interface as dash_simulator.VirtualClock so that the playback
+        loop can run either in real time or on a simulated clock.
+    """
+    def time(self):
+        """ :return: current time in seconds """
+        return time.time()
+
+    def sleep(self, seconds):
+        """ Block for the given number of seconds """
+        time.sleep(seconds)
+
+
 class StopWatch():
     """ Implements a stop watch function
         Modified from http://code.activestate.com/recipes/124894-stopwatch-in-tkinter/
     """
-    def __init__(self):
+    def __init__(self, clock=time.time):
+        self.clock = clock
         self.start_time = 0.0
         self.elapsed_time = 0.0
         self.running = 0
@@ -13,24 +28,30 @@ class StopWatch():
     def start(self):
         """ Start the stopwatch, ignore if running. """
         if not self.running:
-            self.start_time = time.time() - self.elapsed_time
+            self.start_time = self.clock() - self.elapsed_time
             self.running = 1
-    
+
     def pause(self):
         """ Stop the stopwatch, ignore if already paused."""
         if self.running:
-            self.elapsed_time = time.time() - self.start_time
+            self.elapsed_time = self.clock() - self.start_time
             self.running = 0
-    
+
     def reset(self):
         """ Reset the stopwatch. """
-        self.start_time = time.time()
+        self.start_time = self.clock()
         self.elapsed_time = 0.0
 
+    def precise_time(self):
+        """
+        :return: elapsed time in seconds (float)
+        """
+        if self.running:
+            self.elapsed_time = self.clock() - self.start_time
+        return self.elapsed_time
+
     def time(self):
         """
         :return: elapsed time
         """
-        if self.running:
-            self.elapsed_time = time.time() - self.start_time
-        return int(self.elapsed_time)
\ No newline at end of file
+        return int(self.precise_time())
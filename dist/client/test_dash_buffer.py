@@ -0,0 +1,252 @@
+""" Tests of dash_buffer.py. Run from the root of the repository with:
+    python -m unittest discover -s dist/client -p 'test_dash_buffer.py'
+
+The player thread runs on a ManualClock: the playback time only advances when a test
+moves the clock, so the state transitions happen at known playback times.
+"""
+from __future__ import division
+import os
+import sys
+import csv
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import unittest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "util"))
+import json
+import config_dash
+from configure_log_file import close_telemetry
+import dash_buffer
+
+SEGMENT_DURATION = 4
+# Seconds (wall clock) a test waits for the player thread before failing
+TIMEOUT = 5
+# The warnings of the interruptions are expected
+logging.getLogger(config_dash.LOG_NAME).addHandler(logging.NullHandler())
+
+
+class ManualClock(object):
+    """ Clock that only moves when the test advances it """
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ObservedPlayer(dash_buffer.DashPlayer):
+    """ DashPlayer that tells the test when its thread blocks """
+    blocked = False
+
+    def wait_for(self, condition, deadline=None):
+        with self.buffer.changed:
+            # The lock is held until the player waits, so a test that holds the lock and
+            # sees blocked knows that the player thread is inside wait()
+            self.blocked = True
+            self.buffer.changed.notify_all()
+            try:
+                dash_buffer.DashPlayer.wait_for(self, condition, deadline)
+            finally:
+                self.blocked = False
+
+
+def get_segment(segment_number, bitrate=1000):
+    return {'playback_length': SEGMENT_DURATION,
+            'size': 1024,
+            'bitrate': bitrate,
+            'data': "",
+            'URI': "segment{}".format(segment_number),
+            'segment_number': segment_number}
+
+
+class SegmentBufferTest(unittest.TestCase):
+    def test_length(self):
+        segment_buffer = dash_buffer.SegmentBuffer()
+        self.assertEqual(segment_buffer.put(get_segment(1)), SEGMENT_DURATION)
+        self.assertEqual(segment_buffer.put(get_segment(2)), 2 * SEGMENT_DURATION)
+        segment = segment_buffer.get()
+        self.assertEqual(segment['segment_number'], 1)
+        self.assertEqual(segment_buffer.qsize(), 1)
+        # The segment being played is part of the buffer until it is played
+        self.assertEqual(segment_buffer.length, 2 * SEGMENT_DURATION)
+        self.assertEqual(segment_buffer.played(segment), SEGMENT_DURATION)
+
+    def test_put_wakes_reader(self):
+        """ A reader waiting without a timeout is woken up by put() """
+        segment_buffer = dash_buffer.SegmentBuffer()
+        segments = list()
+
+        def read():
+            with segment_buffer.changed:
+                while not segment_buffer.qsize():
+                    segment_buffer.changed.wait()
+                segments.append(segment_buffer.get())
+        reader = threading.Thread(target=read)
+        reader.daemon = True
+        reader.start()
+        segment_buffer.put(get_segment(1))
+        reader.join(TIMEOUT)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual([segment['segment_number'] for segment in segments], [1])
+
+
+class DashPlayerTest(unittest.TestCase):
+    def setUp(self):
+        config_dash.LOG = logging.getLogger(config_dash.LOG_NAME)
+        self.folder = tempfile.mkdtemp()
+        self.saved_config = (config_dash.BUFFER_LOG_FILENAME, config_dash.TELEMETRY, config_dash.TELEMETRY_LOG,
+                             config_dash.JSON_HANDLE, config_dash.INITIAL_BUFFERING_COUNT)
+        config_dash.BUFFER_LOG_FILENAME = os.path.join(self.folder, "buffer.csv")
+        # The player starts the sink of the session
+        config_dash.TELEMETRY = None
+        config_dash.TELEMETRY_LOG = os.path.join(self.folder, "telemetry.jsonl")
+        config_dash.JSON_HANDLE = config_dash.new_json_handle()
+        self.clock = ManualClock()
+        self.player = None
+
+    def tearDown(self):
+        if self.player and self.player.player_thread.is_alive():
+            self.player.stop()
+            self.player.player_thread.join(TIMEOUT)
+        close_telemetry()
+        (config_dash.BUFFER_LOG_FILENAME, config_dash.TELEMETRY, config_dash.TELEMETRY_LOG,
+         config_dash.JSON_HANDLE, config_dash.INITIAL_BUFFERING_COUNT) = self.saved_config
+        shutil.rmtree(self.folder)
+
+    def start_player(self, segment_count):
+        self.player = ObservedPlayer(segment_count * SEGMENT_DURATION, SEGMENT_DURATION, self.clock)
+        self.player.start()
+        self.wait_player("INITIAL_BUFFERING")
+
+    def wait_player(self, state, condition=lambda: True):
+        """ Wait (on the condition of the buffer) until the player thread blocks in the state """
+        deadline = time.time() + TIMEOUT
+        with self.player.buffer.changed:
+            while not (self.player.blocked and self.player.playback_state == state and condition()):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.fail("Player in {} instead of {}".format(self.player.playback_state, state))
+                self.player.buffer.changed.wait(remaining)
+
+    def wait_exit(self):
+        """ Wait for the end of the player thread
+        :return: The final state of the player
+        """
+        self.player.player_thread.join(TIMEOUT)
+        self.assertFalse(self.player.player_thread.is_alive())
+        return self.player.playback_state
+
+    def advance(self, seconds):
+        """ Move the clock and wake up the player (as its wait deadline would) """
+        with self.player.buffer.changed:
+            self.clock.now += seconds
+            self.player.buffer.changed.notify_all()
+
+    def read_actions(self):
+        """ :return: The number of "Writing" rows of the buffer CSV and the actions of the other rows.
+            A write wakes up the player before it is logged, so the order of the "Writing" rows varies
+        """
+        close_telemetry()
+        with open(config_dash.BUFFER_LOG_FILENAME) as csv_handle:
+            actions = [row[4] for row in list(csv.reader(csv_handle))[1:]]
+        return actions.count("Writing"), [action for action in actions if action != "Writing"]
+
+    def read_states(self):
+        """ :return: (time, from, to) of the state records of the telemetry log """
+        with open(config_dash.TELEMETRY_LOG) as json_handle:
+            records = [json.loads(line) for line in json_handle]
+        return [(record['time'], record['from'], record['to']) for record in records if record['type'] == 'state']
+
+    def test_transitions(self):
+        """ INITIAL_BUFFERING -> PLAY -> BUFFERING -> PLAY -> END """
+        self.start_player(3)
+        self.player.write(get_segment(1))
+        self.wait_player("PLAY")
+        self.assertEqual(config_dash.JSON_HANDLE['playback_info']['initial_buffering_duration'], 0)
+        # The buffer is empty at the end of the first segment
+        self.advance(SEGMENT_DURATION)
+        self.wait_player("BUFFERING")
+        self.assertEqual(self.player.playback_timer.precise_time(), SEGMENT_DURATION)
+        self.advance(2)
+        self.player.write(get_segment(2, 2000))
+        self.wait_player("PLAY")
+        interruptions = config_dash.JSON_HANDLE['playback_info']['interruptions']
+        self.assertEqual((interruptions['count'], interruptions['events']), (1, [(4.0, 6.0)]))
+        self.player.write(get_segment(3, 2000))
+        self.advance(SEGMENT_DURATION)
+        self.wait_player("PLAY", lambda: self.player.buffer.qsize() == 0)
+        self.player.end_of_stream()
+        self.advance(SEGMENT_DURATION)
+        self.assertEqual(self.wait_exit(), "END")
+        self.assertEqual(self.player.playback_timer.precise_time(), 3 * SEGMENT_DURATION)
+        # Bitrates - switches - 3000 per second of interruption
+        self.assertEqual(self.player.sum_qoe, 1000 + 2000 * 2 - 1000 - 1000 - 3000 * 2)
+        self.assertEqual(self.read_actions(), (3, ["Starting", "InitialBuffering-Play", "Play-Buffering",
+                                                   "Buffering-Play", "TheEnd"]))
+
+    def test_end_of_stream_buffering(self):
+        """ The player waiting for segments with an empty buffer stops at the end of the stream """
+        self.start_player(3)
+        self.player.write(get_segment(1))
+        self.wait_player("PLAY")
+        self.advance(SEGMENT_DURATION)
+        self.wait_player("BUFFERING")
+        self.player.end_of_stream()
+        self.assertEqual(self.wait_exit(), "STOP")
+        self.assertEqual(self.read_actions(), (1, ["Starting", "InitialBuffering-Play", "Play-Buffering", "Stopped"]))
+        self.assertEqual(config_dash.JSON_HANDLE['playback_info']['end_time'], SEGMENT_DURATION)
+
+    def test_end_of_stream_initial_buffering(self):
+        """ The last segments are played even if there are fewer than INITIAL_BUFFERING_COUNT """
+        config_dash.INITIAL_BUFFERING_COUNT = 2
+        self.start_player(3)
+        self.player.write(get_segment(1))
+        self.wait_player("INITIAL_BUFFERING")
+        self.player.end_of_stream()
+        self.wait_player("PLAY")
+        self.advance(SEGMENT_DURATION)
+        self.assertEqual(self.wait_exit(), "END")
+
+    def test_session_sink(self):
+        """ Each player writes to a new sink, timed by its clock """
+        self.start_player(3)
+        first_sink = self.player.telemetry
+        self.assertTrue(config_dash.TELEMETRY is first_sink)
+        self.player.write(get_segment(1))
+        self.wait_player("PLAY")
+        self.advance(SEGMENT_DURATION)
+        self.wait_player("BUFFERING")
+        self.player.stop()
+        self.wait_exit()
+        # A closed sink is not reused by the next player
+        close_telemetry()
+        self.assertEqual(self.read_states(), [(0, "INITIALIZED", "INITIAL_BUFFERING"), (0, "INITIAL_BUFFERING", "PLAY"),
+                                              (SEGMENT_DURATION, "PLAY", "BUFFERING"),
+                                              (SEGMENT_DURATION, "BUFFERING", "STOP")])
+        self.start_player(3)
+        self.assertFalse(self.player.telemetry is first_sink)
+        self.assertFalse(self.player.telemetry.closed)
+
+    def test_stop(self):
+        self.start_player(3)
+        self.player.write(get_segment(1))
+        self.player.write(get_segment(2))
+        self.wait_player("PLAY")
+        self.player.stop()
+        self.assertEqual(self.wait_exit(), "STOP")
+        self.assertEqual(self.player.buffer.qsize(), 1)
+
+    def test_write_wakes_player(self):
+        """ The player sleeps without a timeout until a segment is written """
+        self.start_player(3)
+        wakeups = config_dash.TELEMETRY.histogram('player_wakeup')
+        time.sleep(0.1)
+        self.assertEqual(wakeups.count, 0)
+        self.player.write(get_segment(1))
+        self.wait_player("PLAY")
+        self.assertEqual(wakeups.count, 1)
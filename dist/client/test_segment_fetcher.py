@@ -0,0 +1,250 @@
+""" Tests of segment_fetcher.py. Run from the root of the repository with:
+    python -m unittest discover -s dist/client -p 'test_segment_fetcher.py'
+
+The fetcher talks to a scripted server: each accepted connection reads the requests
+and answers them with the responses given by the test.
+"""
+from __future__ import division
+import os
+import sys
+import time
+import socket
+import logging
+import threading
+import unittest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "util"))
+import config_dash
+import segment_fetcher
+
+# The discarded pipelined responses are logged
+logging.getLogger(config_dash.LOG_NAME).addHandler(logging.NullHandler())
+
+
+def get_response(body, headers=None, status="200 OK"):
+    """ :return: An HTTP/1.1 response with the body and its Content-Length """
+    header_lines = ["HTTP/1.1 {}".format(status), "Content-Length: {}".format(len(body))]
+    header_lines.extend("{}: {}".format(name, value) for name, value in (headers or dict()).items())
+    return "\r\n".join(header_lines) + "\r\n\r\n" + body
+
+
+class ScriptedServer(object):
+    """ Server whose connections run handler(server, sock) in their own thread """
+    def __init__(self, handler):
+        self.handler = handler
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(5)
+        self.port = self.listener.getsockname()[1]
+        self.connections = 0
+        # Paths of the requests in the order they are read
+        self.requests = list()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def url(self, path):
+        return "http://127.0.0.1:{}{}".format(self.port, path)
+
+    def run(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except socket.error:
+                return
+            self.connections += 1
+            thread = threading.Thread(target=self.serve, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def serve(self, sock):
+        try:
+            self.handler(self, sock)
+        except socket.error:
+            pass
+        finally:
+            sock.close()
+
+    def read_request(self, sock, data):
+        """ Read the next request
+        :param data: bytearray with the bytes read past the previous request
+        :return: The path of the request or None if the client closed the connection
+        """
+        while "\r\n\r\n" not in data:
+            chunk = sock.recv(4096)
+            if not chunk:
+                return None
+            data += chunk
+        end = data.find("\r\n\r\n")
+        path = str(data[:end]).split()[1]
+        del data[:end + 4]
+        self.requests.append(path)
+        return path
+
+    def close(self):
+        self.listener.close()
+
+
+def serve_paths(bodies, headers=None):
+    """ :return: A handler that answers each request with the body of its path, until the client closes """
+    def handler(server, sock):
+        data = bytearray()
+        while True:
+            path = server.read_request(sock, data)
+            if path is None:
+                return
+            if path in bodies:
+                sock.sendall(get_response(bodies[path], headers))
+            else:
+                sock.sendall(get_response("", status="404 Not Found"))
+    return handler
+
+
+class SegmentFetcherTest(unittest.TestCase):
+    def setUp(self):
+        config_dash.LOG = logging.getLogger(config_dash.LOG_NAME)
+        self.server = None
+        self.fetcher = segment_fetcher.SegmentFetcher({config_dash.SESSION_HEADER: "test"}, chunk_size=1024,
+                                                      timeout=5)
+
+    def tearDown(self):
+        self.fetcher.close()
+        if self.server:
+            self.server.close()
+
+    def start_server(self, handler):
+        self.server = ScriptedServer(handler)
+        return self.server
+
+    def test_response(self):
+        """ Status and size of the body, which is larger than the receive buffer """
+        server = self.start_server(serve_paths({"/a.m4s": "a" * 5000}))
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s")), (200, 5000))
+        self.assertEqual(sum(size for _, size in self.fetcher.samples), 5000)
+        self.assertEqual(self.fetcher.fetch(server.url("/missing.m4s")), (404, 0))
+        self.assertEqual(self.fetcher.download_segment(server.url("/missing.m4s"), ""), None)
+        self.assertEqual(self.fetcher.download_segment(server.url("/a.m4s"), ""), (5000, ""))
+
+    def test_headers(self):
+        """ The status line and the headers are parsed even if they arrive in pieces """
+        def handler(server, sock):
+            server.read_request(sock, bytearray())
+            response = get_response("body", {"X-Other": "value"})
+            for offset in range(0, len(response), 7):
+                sock.sendall(response[offset:offset + 7])
+                time.sleep(0.001)
+            sock.recv(1)
+        server = self.start_server(handler)
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s?session=test")), (200, 4))
+        self.assertEqual(server.requests, ["/a.m4s?session=test"])
+
+    def test_keep_alive(self):
+        """ The segments are downloaded on one connection """
+        server = self.start_server(serve_paths({"/a.m4s": "a" * 3000, "/b.m4s": "b" * 2000}))
+        for path, size in (("/a.m4s", 3000), ("/b.m4s", 2000), ("/a.m4s", 3000)):
+            self.assertEqual(self.fetcher.fetch(server.url(path)), (200, size))
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(server.requests, ["/a.m4s", "/b.m4s", "/a.m4s"])
+
+    def test_connection_close(self):
+        """ A response with Connection: close is not followed by another request on its connection """
+        server = self.start_server(serve_paths({"/a.m4s": "a" * 100}, {"Connection": "close"}))
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s")), (200, 100))
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s")), (200, 100))
+        self.assertEqual(server.connections, 2)
+
+    def test_body_until_close(self):
+        """ Without Content-Length the body ends when the server closes the connection """
+        def handler(server, sock):
+            server.read_request(sock, bytearray())
+            sock.sendall("HTTP/1.0 200 OK\r\n\r\n" + "x" * 2500)
+        server = self.start_server(handler)
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s")), (200, 2500))
+        self.assertFalse(self.fetcher.pool.idle[('127.0.0.1', server.port)])
+
+    def test_pipelining(self):
+        """ The request of the next segment is sent before the current one is read """
+        server = self.start_server(serve_paths({"/a.m4s": "a" * 3000, "/b.m4s": "b" * 2000}))
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s"), server.url("/b.m4s")), (200, 3000))
+        self.assertEqual(list(self.fetcher.pipelined.in_flight), ["/b.m4s"])
+        # The pipelined response is read without a new request
+        self.assertEqual(self.fetcher.fetch(server.url("/b.m4s")), (200, 2000))
+        self.assertEqual(server.requests, ["/a.m4s", "/b.m4s"])
+        self.assertEqual((server.connections, self.fetcher.discarded_responses), (1, 0))
+
+    def test_pipelined_responses_together(self):
+        """ The start of the pipelined response read with the end of the current one is kept """
+        def handler(server, sock):
+            data = bytearray()
+            server.read_request(sock, data)
+            server.read_request(sock, data)
+            sock.sendall(get_response("a" * 10) + get_response("b" * 20))
+            sock.recv(1)
+        server = self.start_server(handler)
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s"), server.url("/b.m4s")), (200, 10))
+        self.assertEqual(self.fetcher.fetch(server.url("/b.m4s")), (200, 20))
+
+    def test_stale_pipelined_response(self):
+        """ A pipelined response that is not the next segment is not read: its connection is closed """
+        server = self.start_server(serve_paths({"/a.m4s": "a" * 3000, "/b.m4s": "b" * 200000,
+                                                "/c.m4s": "c" * 1000}))
+        self.fetcher.fetch(server.url("/a.m4s"), server.url("/b.m4s"))
+        start_time = time.time()
+        self.assertEqual(self.fetcher.fetch(server.url("/c.m4s")), (200, 1000))
+        self.assertEqual(sum(size for _, size in self.fetcher.samples), 1000)
+        self.assertTrue(all(timestamp >= start_time for timestamp, _ in self.fetcher.samples))
+        self.assertEqual((server.connections, self.fetcher.discarded_responses), (2, 1))
+
+    def test_retry_closed_connection(self):
+        """ A request on an idle connection closed by the server is sent again on a new one """
+        def handler(server, sock):
+            data = bytearray()
+            server.read_request(sock, data)
+            sock.sendall(get_response("a" * 100))
+            if server.connections == 1:
+                # Close the idle connection
+                return
+            while server.read_request(sock, data):
+                sock.sendall(get_response("a" * 100))
+        server = self.start_server(handler)
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s")), (200, 100))
+        time.sleep(0.05)
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s")), (200, 100))
+        self.assertEqual(server.connections, 2)
+
+    def test_no_retry_after_body(self):
+        """ A connection dropped in the middle of the body is an error """
+        def handler(server, sock):
+            server.read_request(sock, bytearray())
+            sock.sendall(get_response("a" * 1000)[:-500])
+        server = self.start_server(handler)
+        self.assertRaises(segment_fetcher.ConnectionClosed, self.fetcher.fetch, server.url("/a.m4s"))
+        self.assertEqual(server.connections, 1)
+
+    def test_short_reads(self):
+        """ The body is read until Content-Length, whatever the size of the reads """
+        def handler(server, sock):
+            data = bytearray()
+            while server.read_request(sock, data):
+                response = get_response("x" * 3000)
+                for offset in range(0, len(response), 500):
+                    sock.sendall(response[offset:offset + 500])
+                    time.sleep(0.002)
+        server = self.start_server(handler)
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s")), (200, 3000))
+        self.assertTrue(len(self.fetcher.samples) > 1)
+        self.assertEqual(sum(size for _, size in self.fetcher.samples), 3000)
+        timestamps = [timestamp for timestamp, _ in self.fetcher.samples]
+        self.assertEqual(timestamps, sorted(timestamps))
+        # The next response on the connection is read from its first byte
+        self.assertEqual(self.fetcher.fetch(server.url("/a.m4s")), (200, 3000))
+
+    def test_close(self):
+        server = self.start_server(serve_paths({"/a.m4s": "a", "/b.m4s": "b"}))
+        self.fetcher.fetch(server.url("/a.m4s"), server.url("/b.m4s"))
+        self.fetcher.close()
+        self.assertTrue(self.fetcher.pipelined is None)
+        self.assertEqual(self.fetcher.pool.idle, dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -31,10 +31,15 @@ To DO:
     -- Automate the MPD and DASH file LIST generation
 """
 import time
+import mmap
 import BaseHTTPServer
+import SocketServer
+import threading
+import urlparse
 import sys
 import os
 from virtual_video import VirtualVideo
+from link_emulator import TimerWheel, EmulatedLink, get_trace, DEFAULT_QUEUE_PACKETS
 from argparse import ArgumentParser
 from collections import defaultdict
 import logging
@@ -48,10 +53,24 @@ DEFAULT_PORT = 8006
 DEFAULT_SLOW_RATE = 0.001
 
 BLOCK_SIZE = 1024
+# Size of the shared payload used for the virtual segments and of the blocks
+# in which the files are sent
+PAYLOAD_SIZE = 1024 * 1024
+# Preallocated dummy data, sent in memoryview slices by virtual_write
+PAYLOAD = memoryview(bytearray("a" * PAYLOAD_SIZE))
 
 # Values set by the option parser
 PORT = DEFAULT_PORT
 HOSTNAME = DEFAULT_HOSTNAME
+CONCURRENT = False
+# Trace of the emulated link. No link emulation if None
+TRACE = None
+# One way delay of the emulated link in ms
+LINK_DELAY = 0
+# Droptail queue of the emulated link in packets
+QUEUE = DEFAULT_QUEUE_PACKETS
+# Folder of the traces that can be requested by the clients
+TRACE_FOLDER = "trace/"
 HTTP_VERSION = "HTTP/1.1"
 # 10 kbps when size is in bytes
 SLOW_RATE = DEFAULT_SLOW_RATE
@@ -59,7 +78,11 @@ SLOW_RATE = DEFAULT_SLOW_RATE
 HTML_PAGES = ['index.html', 'list.html', 'media/my_image.png']
 MPD_FILES = ["dist/sample_mpd/mot17-10-base.config",
              "dist/sample_mpd/mot17-10.config",
-             "dist/sample_mpd/BigBuckBunny.mpd"]
+             "dist/sample_mpd/BigBuckBunny.mpd",
+             "dist/sample_mpd/BigBuckBunny_4s.mpd",
+             "dist/sample_mpd/OfForestAndMen_4s.mpd",
+             "dist/sample_mpd/TheSwissAccount_4s.mpd",
+             "dist/sample_mpd/Valkaama_4s.mpd"]
 HTML_404 = "404.html"
 
 # dict that holds the current active sessions
@@ -67,7 +90,15 @@ HTML_404 = "404.html"
 #       'session_list' = List of active session ID's = {connection_id, port}
 #       'delay' : iterator to check if we need to delay or not
 # connection_id -> VirtualVideo
+# connection_id = (client IP, session ID sent by the client). Clients behind the same
+# NAT or mahimahi shell share the IP and are told apart by the session ID
+# (config_dash.SESSION_HEADER header or 'session' query parameter).
 ACTIVE_DICT = defaultdict(dict)
+ACTIVE_DICT_LOCK = threading.Lock()
+# connection_id -> EmulatedLink of the session
+ACTIVE_LINKS = dict()
+# Wakes up the paced writes of all the links. Started with the first link
+TIMER_WHEEL = None
 
 # DELAY Parameters
 # Number of the segement to insert delay
@@ -86,6 +117,29 @@ def delay_decision():
 
 class MyHTTPRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
     """HTTPHandler to serve the DASH video"""
+    # Persistent connections. Every response has a Content-Length
+    protocol_version = HTTP_VERSION
+
+    def get_connection_id(self):
+        """ Identify the session of the request by the client IP and the session ID """
+        session_id = self.headers.get(config_dash.SESSION_HEADER)
+        if not session_id:
+            query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+            session_id = query.get('session', [None])[0]
+        return self.client_address[0], session_id
+
+    def get_trace_file(self):
+        """ The trace requested by the client (config_dash.TRACE_HEADER header or 'trace' query
+            parameter) or the trace of the server
+        """
+        trace_name = self.headers.get(config_dash.TRACE_HEADER)
+        if not trace_name:
+            query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+            trace_name = query.get('trace', [None])[0]
+        if trace_name:
+            # Only the traces in the TRACE_FOLDER
+            return os.path.join(TRACE_FOLDER, os.path.basename(trace_name))
+        return TRACE
 
     def do_GET(self):
         """Function to handle the get message"""
@@ -93,87 +147,121 @@ class MyHTTPRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
         request = self.path.split('?')[0]
         if request.startswith('/'):
             request = request[1:]
-        # connection_id = client IP, dirname of file
-        connection_id = self.client_address[0]
-        shutdown = False
+        connection_id = self.get_connection_id()
+        with ACTIVE_DICT_LOCK:
+            self.link = ACTIVE_LINKS.get(connection_id)
         #check if the request is for the a directory
         if request in HTML_PAGES:
             print("Request HTML %s" % request)
-            duration = normal_write(self.wfile, request)
+            duration, _ = normal_write(self, request)
         elif request in MPD_FILES:
             print("Request for MPD %s" % request)
             print("Setup Connection: {}".format(connection_id))
-            duration = normal_write(self.wfile, request)  #, **kwargs)
             # assuming that the new session always
             # starts with the download of the MPD file
-            # Making sure that older sessions are not
+            # Replacing the older session of the client
             # in the ACTIVE_DICT
-            if connection_id in ACTIVE_DICT:
-                del (ACTIVE_DICT[connection_id])
-            ACTIVE_DICT[connection_id] = VirtualVideo(request)
+            # The session is registered before the MPD is sent: a client can request
+            # the first segment on another connection as soon as it has read the MPD
+            self.link = create_link(self.get_trace_file())
+            virtual_video = VirtualVideo(request)
+            with ACTIVE_DICT_LOCK:
+                ACTIVE_LINKS[connection_id] = self.link
+                ACTIVE_DICT[connection_id] = virtual_video
+            duration, _ = normal_write(self, request)  #, **kwargs)
         elif request.split('.')[-1] in ['m4s', 'mp4']:
             print("\n")
             config_dash.LOG.info("Request for DASH Media %s" % request)
-            if connection_id not in ACTIVE_DICT:
+            with ACTIVE_DICT_LOCK:
+                virtual_video = ACTIVE_DICT.get(connection_id)
+            if not virtual_video:
                 print("Error: connection_id: {}".format(connection_id))
-                shutdown = True
-                pass
-            else:
-                segment_size = ACTIVE_DICT[connection_id].get_video(request)
-                duration, file_size = virtual_write(self.wfile, segment_size)
-                config_dash.LOG.info("Stream time: %.2fs segment_size: %d stream_rate: %dKbps" \
-                    % ( duration, file_size, int(file_size / duration * 8) >> 10))
+                self.send_error(404)
+                return
+            segment_size = virtual_video.get_video(request)
+            if segment_size is None:
+                # Not a segment of the MPD of the session (Eg: the client switched to another MPD)
+                self.send_error(404)
+                return
+            duration, file_size = virtual_write(self, segment_size)
+            config_dash.LOG.info("Stream time: %.2fs segment_size: %d stream_rate: %dKbps" \
+                % ( duration, file_size, int(file_size / max(duration, 1e-6) * 8) >> 10))
         else:
             self.send_error(404)
             return
-        #self.send_response( 200 )
-        #self.send_header('ContentType', 'text/plain;charset=utf-8')
-        #self.send_header('Content-Length', str(os.path.getsize(request)))
-        #self.send_header('Pragma', 'no-cache' )
-        #self.end_headers()
-        if shutdown:
-            self.server.shutdown()
-
-def virtual_write(output, size):
-    """Function to write arbitrary bytes to output stream"""
+
+
+def create_link(trace_file):
+    """ Module to create the emulated link of a new session. None without a trace """
+    global TIMER_WHEEL
+    if not trace_file:
+        return None
+    with ACTIVE_DICT_LOCK:
+        if not TIMER_WHEEL:
+            TIMER_WHEEL = TimerWheel()
+    config_dash.LOG.info("Emulating link with trace: {} delay: {}ms queue: {} packets".format(
+        trace_file, LINK_DELAY, QUEUE))
+    return EmulatedLink(get_trace(trace_file), TIMER_WHEEL, LINK_DELAY, QUEUE)
+
+
+def send_headers(handler, content_length, content_type='application/octet-stream', code=200):
+    """Function to send the response line and headers of a response"""
+    handler.send_response(code)
+    handler.send_header('Content-Type', content_type)
+    handler.send_header('Content-Length', str(content_length))
+    handler.end_headers()
+
+
+def virtual_write(handler, size):
+    """Function to write arbitrary bytes to output stream.
+    The bytes are slices of the preallocated PAYLOAD, sent without copying
+    """
+    send_headers(handler, size, 'video/mp4')
     start_time = time.time()
+    if handler.link:
+        data_len = handler.link.send(handler.connection, size, PAYLOAD)
+        return time.time() - start_time, data_len
     data_len = 0
-    dummy_data = "".join(["a" for i in range(BLOCK_SIZE)])
-    while True:
-        if size < BLOCK_SIZE:
-            data = dummy_data[:size]
-        else:
-            data = dummy_data
-        output.write(data)
-        data_len += len(data)
-        size -= len(data)
-        if size <= 0:
-            break
+    while data_len < size:
+        block = min(size - data_len, PAYLOAD_SIZE)
+        handler.connection.sendall(PAYLOAD[:block])
+        data_len += block
     now = time.time()
-    output.flush()
     return now-start_time, data_len
 
-def normal_write(output, request):
+
+def send_file(handler, request_file):
+    """Function to send a file on the connection of the handler.
+    The file is memory-mapped and sent in PAYLOAD_SIZE blocks that are buffer() views of the mapping,
+    so the blocks are not copied into strings (os.sendfile does not exist in Python 2.7)
+    """
+    file_size = os.fstat(request_file.fileno()).st_size
+    if handler.link:
+        return handler.link.send(handler.connection, file_size, memoryview(request_file.read()))
+    if not file_size:
+        # Empty files cannot be mapped
+        return 0
+    file_map = mmap.mmap(request_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        for offset in range(0, file_size, PAYLOAD_SIZE):
+            handler.connection.sendall(buffer(file_map, offset, PAYLOAD_SIZE))
+    finally:
+        file_map.close()
+    return file_size
+
+
+def normal_write(handler, request):
     """Function to write the video onto output stream"""
-    data = None
+    start_time = time.time()
     try:
         with open(request, 'rb') as request_file:
-            start_time = time.time()
-            data_len = 0
-            while True:
-                data = request_file.read(BLOCK_SIZE)
-                output.write(data)
-                data_len += len(data)
-                if len(data) < BLOCK_SIZE:
-                    break
-            now = time.time()
-            output.flush()
+            send_headers(handler, os.fstat(request_file.fileno()).st_size, 'text/plain')
+            data_len = send_file(handler, request_file)
     except IOError:
-        with open(HTML_404, 'r') as request_file:
-            start_time = time.time()
-            output.write(request_file.read())
-            now = time.time()
-            output.flush()
+        with open(HTML_404, 'rb') as request_file:
+            send_headers(handler, os.fstat(request_file.fileno()).st_size, 'text/html', 404)
+            data_len = send_file(handler, request_file)
+    now = time.time()
     return now - start_time, data_len
 
 
@@ -186,58 +274,22 @@ def dir_write(output, data):
     return now - start_time
 
 
-def slow_write(output, request, rate=None):
-    """Function to write the video onto output stream with interruptions in
-    the stream
-    """
-    print("Slow write of %s" % request)
-    with open(request, 'r') as request_file:
-        start_time = time.time()
-        data = request_file.read(BLOCK_SIZE)
-        output.write(data)
-        last_send = time.time()
-        current_stream = len(data)
-        while data != '':
-            print("In loop")
-            if rate:
-                if curr_send_rate(BLOCK_SIZE, last_send - time.time()) > rate:
-                    continue
-                else:
-                    break
-            output.write(data)
-            last_send = time.time()
-            current_stream += len(data)
-            data = request_file.read(BLOCK_SIZE)
-        now = time.time()
-        output.flush()
-    print('Served %d bytes of file: %s in %f seconds' % (
-        current_stream, request, now - start_time) )
-    return now - start_time
-
-
-def curr_send_rate(data_size, time_to_send_data):
-    """ Method to calculate the current rate at which the data
-        is being sent. Data_size in byes
-        The return value is in kbps
-    """
-    rate = None
-    while True:
-        try:
-            rate = data_size * 8 / time_to_send_data / 1000
-            break
-        except ZeroDivisionError:
-            continue
-    return rate
+class ThreadedHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ HTTP server that handles each connection in a new thread """
+    daemon_threads = True
+    # Backlog for hundreds of clients connecting at once
+    request_queue_size = 1024
 
 
 def start_server():
     """ Module to start the server"""
-    http_server = BaseHTTPServer.HTTPServer((HOSTNAME, PORT),
-                                            MyHTTPRequestHandler)
+    if CONCURRENT:
+        http_server = ThreadedHTTPServer((HOSTNAME, PORT), MyHTTPRequestHandler)
+    else:
+        http_server = BaseHTTPServer.HTTPServer((HOSTNAME, PORT),
+                                                MyHTTPRequestHandler)
     print( " ".join(("Listening on ", HOSTNAME, " at Port ",
                     str(PORT), " - press ctrl-c to stop")) )
-    # Use this Version of HTTP Protocol
-    http_server.protocol_version = HTTP_VERSION
     http_server.serve_forever()
 
 
@@ -250,6 +302,16 @@ def create_arguments(parser):
     parser.add_argument('-d', '--SLOW_RATE', type=float, help=(
         "Delay value for the server in msec. Default = %f" % DEFAULT_SLOW_RATE),
                         default=DEFAULT_SLOW_RATE)
+    parser.add_argument('-c', '--CONCURRENT', action='store_true', default=CONCURRENT,
+                        help="Serve each connection in its own thread")
+    parser.add_argument('-t', '--TRACE', default=TRACE,
+                        help="Mahimahi trace of the emulated downlink of each session. The clients can ask for "
+                             "another trace of the %s folder with the %s header" % (TRACE_FOLDER,
+                                                                                   config_dash.TRACE_HEADER))
+    parser.add_argument('--LINK_DELAY', type=float, default=LINK_DELAY,
+                        help="One way delay of the emulated link in ms. Default = %d" % LINK_DELAY)
+    parser.add_argument('--QUEUE', type=int, default=QUEUE,
+                        help="Droptail queue of the emulated link in packets. Default = %d" % QUEUE)
 
 
 def update_config(args):
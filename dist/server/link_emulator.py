@@ -0,0 +1,192 @@
+"""
+In-process link emulation for the DASH server (replaces mm-delay/mm-link).
+
+Each session gets its own EmulatedLink that replays a mahimahi packet-delivery
+trace (see read_trace.py) with a one way delay and a droptail queue.
+The bytes of a response are written to the socket at the time they would be
+delivered by the link. The waiting threads are woken up by a TimerWheel with
+millisecond resolution, shared by all the links.
+
+The packets of a response enter the queue of the link after the one way delay
+and wait there for the delivery opportunities left by the packets before them
+(queueing delay). The queue holds at most queue_packets packets: the server sends
+what fits and the rest reaches the queue one round trip after the packet at the head
+of the queue is delivered, as the acknowledgments of a TCP sender would clock it.
+A queue smaller than the bandwidth-delay product leaves the link idle between the
+rounds and limits the throughput to about queue_packets per round trip.
+"""
+from __future__ import division
+import sys
+import time
+import threading
+sys.path.append("./dist/util/")
+import read_trace
+from read_trace import PACKET_SIZE
+
+# Same defaults as scripts/make_stream.sh
+DEFAULT_DELAY = 30
+DEFAULT_QUEUE_PACKETS = 250
+
+# Trace file -> MahimahiTrace, shared by all the links on the trace
+TRACE_CACHE = dict()
+TRACE_CACHE_LOCK = threading.Lock()
+
+
+def get_trace(trace_file):
+    """ Read the trace file once and return the cached trace for the later links """
+    with TRACE_CACHE_LOCK:
+        if trace_file not in TRACE_CACHE:
+            TRACE_CACHE[trace_file] = read_trace.MahimahiTrace(trace_file)
+        return TRACE_CACHE[trace_file]
+
+
+class TimerWheel(object):
+    """ Hashed timer wheel with one slot per tick (1 ms by default).
+        A single thread advances the wheel and wakes up the threads waiting on the
+        expired slots. The ticks are computed from the time since the start of the
+        wheel, so a late wake up of the wheel thread does not add up over time.
+    """
+    def __init__(self, resolution=0.001, slots=1024):
+        self.resolution = resolution
+        self.slots = slots
+        self.wheel = [list() for _ in range(slots)]
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.has_timers = threading.Condition(self.lock)
+        self.start_time = time.time()
+        # Last tick that was processed
+        self.current_tick = 0
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def get_tick(self, timestamp):
+        """ :return: The tick at which a timer for the timestamp expires """
+        return int(-(-(timestamp - self.start_time) // self.resolution))
+
+    def wait_until(self, deadline):
+        """ Block the calling thread until the deadline (time.time() seconds) """
+        tick = self.get_tick(deadline)
+        expired = threading.Event()
+        with self.lock:
+            if tick <= self.current_tick:
+                return
+            if not self.pending:
+                # The wheel was idle: skip the ticks without timers
+                now_tick = int((time.time() - self.start_time) // self.resolution)
+                self.current_tick = max(self.current_tick, min(tick, now_tick) - 1)
+            self.wheel[tick % self.slots].append((tick, expired))
+            self.pending += 1
+            self.has_timers.notify()
+        expired.wait()
+
+    def run(self):
+        """ Advance the wheel one tick at a time """
+        while True:
+            with self.lock:
+                while not self.pending:
+                    self.has_timers.wait()
+                now_tick = int((time.time() - self.start_time) // self.resolution)
+                while self.current_tick < now_tick:
+                    self.current_tick += 1
+                    slot = self.wheel[self.current_tick % self.slots]
+                    if not slot:
+                        continue
+                    # Timers more than one turn of the wheel away stay in the slot
+                    waiting = [timer for timer in slot if timer[0] > self.current_tick]
+                    for tick, expired in slot:
+                        if tick <= self.current_tick:
+                            expired.set()
+                    self.pending -= len(slot) - len(waiting)
+                    slot[:] = waiting
+            next_tick = self.start_time + (self.current_tick + 1) * self.resolution
+            time.sleep(max(0, next_tick - time.time()))
+
+
+class EmulatedLink(object):
+    """ Emulated downlink of one session.
+        The delivery opportunities of the trace are counted from the creation of the link
+        and are used by the packets in the order they enter the queue. An opportunity that
+        is not used when it comes is lost, as in mm-link.
+    """
+    def __init__(self, trace, scheduler, delay=DEFAULT_DELAY, queue_packets=DEFAULT_QUEUE_PACKETS):
+        """
+        :param trace: read_trace.MahimahiTrace of the downlink
+        :param scheduler: TimerWheel used to wait for the delivery times
+        :param delay: One way delay in ms (as in mm-delay)
+        :param queue_packets: Size of the droptail queue in packets (as in mm-link --downlink-queue-args)
+        """
+        if queue_packets < 1:
+            raise ValueError("The queue of the link must hold at least one packet")
+        self.trace = trace
+        self.scheduler = scheduler
+        self.delay = delay / 1000
+        self.queue_packets = queue_packets
+        self.start_time = time.time()
+        # Index of the next unused delivery opportunity. The packets in the queue have
+        # the opportunities from the current time to next_opportunity
+        self.next_opportunity = 0
+        # Packets that found the queue full, counted again at each round trip they wait
+        self.dropped_packets = 0
+        self.lock = threading.Lock()
+
+    def get_trace_time(self, timestamp):
+        """ :return: Time on the trace (in ms) of a time.time() timestamp """
+        return (timestamp - self.start_time) * 1000
+
+    def get_delivery_time(self, opportunity):
+        """ :return: time.time() at which the packet sent at the opportunity reaches the client """
+        return self.start_time + self.trace.opportunity_time(opportunity) / 1000 + self.delay
+
+    def enqueue(self, packets, trace_time):
+        """ Reserve the delivery opportunities of packets that reach the droptail queue at
+            trace_time (ms). The packets that find the queue full are sent again one round
+            trip after the delivery of the packet at the head of the queue
+        :return: List of (index of the first opportunity, number of packets) of the packets, in order
+        """
+        runs = list()
+        with self.lock:
+            now = self.trace.first_opportunity(trace_time)
+            while True:
+                admitted = min(packets, self.queue_packets - max(0, self.next_opportunity - now))
+                if admitted > 0:
+                    first = max(self.next_opportunity, now)
+                    if runs and sum(runs[-1]) == first:
+                        runs[-1] = (runs[-1][0], runs[-1][1] + admitted)
+                    else:
+                        runs.append((first, admitted))
+                    self.next_opportunity = first + admitted
+                    packets -= admitted
+                if not packets:
+                    return runs
+                self.dropped_packets += packets
+                now = max(now + 1, self.trace.first_opportunity(
+                    self.trace.opportunity_time(now) + 2 * self.delay * 1000))
+
+    def send(self, connection, size, data):
+        """ Send size bytes of data on the connection at the rate of the link
+        :param data: memoryview with the bytes to be sent. It is repeated if shorter than size
+        :return: Number of bytes sent
+        """
+        # The response enters the queue when the request reaches the server, after the one way delay
+        runs = self.enqueue(-(-size // PACKET_SIZE), self.get_trace_time(time.time() + self.delay))
+        sent = 0
+        for first, packets in runs:
+            run_end = min(size, sent + packets * PACKET_SIZE)
+            opportunity = first
+            while sent < run_end:
+                now = time.time()
+                # Number of packets of the run that are delivered by now
+                delivered = min(first + packets, self.trace.opportunities_until(
+                    self.get_trace_time(now - self.delay))) - opportunity
+                if delivered <= 0:
+                    self.scheduler.wait_until(self.get_delivery_time(opportunity))
+                    continue
+                block_end = min(run_end, sent + delivered * PACKET_SIZE)
+                while sent < block_end:
+                    offset = sent % len(data)
+                    block = min(block_end - sent, len(data) - offset)
+                    connection.sendall(data[offset:offset + block])
+                    sent += block
+                opportunity += delivered
+        return sent
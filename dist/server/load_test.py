@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Load benchmark for the DASH emulation server.
+
+Runs N concurrent clients. Each client opens a persistent HTTP/1.1 connection,
+requests the MPD file to set up its session on the server and then requests
+the segments of the highest bitrate one after the other.
+Reports the aggregate throughput and the per-request latency.
+With --TRACE the server emulates the given traces (of its trace/ folder) on the
+links of the clients, one trace per client in turn.
+
+To run:
+    python dist/server/dash_server.py -c &
+    python dist/server/load_test.py -n 100 -r 20
+"""
+from __future__ import division
+import sys
+import time
+import httplib
+import logging
+import threading
+from argparse import ArgumentParser
+sys.path.append("./dist/util/")
+import config_dash
+import read_mpd
+from configure_log_file import configure_log_file
+from virtual_video import DashPlayback
+
+# Values set by the option parser
+HOSTNAME = '127.0.0.1'
+PORT = 8006
+MPD = "dist/sample_mpd/mot17-10.config"
+CLIENTS = 10
+REQUESTS = 20
+TRACE = None
+
+
+def get_segment_urls(mpd_file):
+    """ Module to get the URLs of the segments of the highest bitrate """
+    dp_object, video_segment_duration = read_mpd.read_mpd(mpd_file, DashPlayback())
+    bitrate = max(dp_object.video)
+    media = read_mpd.get_url_list(dp_object.video[bitrate], video_segment_duration,
+                                  read_mpd.get_media_duration(dp_object.video[bitrate], video_segment_duration),
+                                  bitrate)
+    return ["/" + url for url in media.url_list]
+
+
+def run_client(client_id, segment_urls, requests, results, trace_name=None):
+    """ Module that runs one client and appends (bytes, latency) of each segment request to results """
+    connection = httplib.HTTPConnection(HOSTNAME, PORT)
+    headers = {config_dash.SESSION_HEADER: "load_test_%d" % client_id}
+    if trace_name:
+        headers[config_dash.TRACE_HEADER] = trace_name
+    samples = list()
+    try:
+        connection.request('GET', "/" + MPD, headers=headers)
+        connection.getresponse().read()
+        for count in range(requests):
+            start_time = time.time()
+            connection.request('GET', segment_urls[count % len(segment_urls)], headers=headers)
+            data = connection.getresponse().read()
+            samples.append((len(data), time.time() - start_time))
+    except (IOError, httplib.HTTPException), error:
+        print("Client {} failed: {}".format(client_id, error))
+    finally:
+        connection.close()
+    results.extend(samples)
+
+
+def get_percentile(sorted_values, percentile):
+    """ :return: percentile of a sorted list """
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))
+    return sorted_values[index]
+
+
+def run_load_test(clients, requests, traces=None):
+    """ Module to run the clients concurrently and print the results
+    :param traces: Names of the traces emulated by the server, one per client in turn
+    """
+    segment_urls = get_segment_urls(MPD)
+    results = list()
+    threads = [threading.Thread(target=run_client, args=(client_id, segment_urls, requests, results,
+                                                         traces[client_id % len(traces)] if traces else None))
+               for client_id in range(clients)]
+    start_time = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - start_time
+    if not results:
+        print("No request completed")
+        return None
+    total_bytes = sum(size for size, _ in results)
+    latencies = sorted(latency for _, latency in results)
+    print("Clients: {} Requests: {} Bytes: {} Duration: {:.2f}s".format(clients, len(results), total_bytes,
+                                                                       duration))
+    print("Aggregate throughput: {:.3f} Gbps".format(total_bytes * 8 / duration / 1e9))
+    print("Latency (ms): mean {:.1f} p50 {:.1f} p90 {:.1f} p99 {:.1f} max {:.1f}".format(
+        1000 * sum(latencies) / len(latencies), 1000 * get_percentile(latencies, 50),
+        1000 * get_percentile(latencies, 90), 1000 * get_percentile(latencies, 99), 1000 * latencies[-1]))
+    return total_bytes, duration, latencies
+
+
+def create_arguments(parser):
+    """ Adding arguments to the parser"""
+    parser.add_argument('-s', '--HOSTNAME', default=HOSTNAME, help="Hostname of the server. Default = %s" % HOSTNAME)
+    parser.add_argument('-p', '--PORT', type=int, default=PORT, help="Port of the server. Default = %d" % PORT)
+    parser.add_argument('-m', '--MPD', default=MPD, help="MPD file served by the server. Default = %s" % MPD)
+    parser.add_argument('-n', '--CLIENTS', type=int, default=CLIENTS,
+                        help="Number of concurrent clients. Default = %d" % CLIENTS)
+    parser.add_argument('-r', '--REQUESTS', type=int, default=REQUESTS,
+                        help="Number of segment requests per client. Default = %d" % REQUESTS)
+    parser.add_argument('-t', '--TRACE', nargs='+', default=TRACE,
+                        help="Traces of the server's trace folder emulated on the client links")
+
+
+def main():
+    """Program wrapper"""
+    parser = ArgumentParser(description='Load benchmark for the DASH server')
+    create_arguments(parser)
+    args = parser.parse_args()
+    globals().update(vars(args))
+    configure_log_file(log_file=None)
+    run_load_test(CLIENTS, REQUESTS, TRACE)
+
+
+if __name__ == "__main__":
+    config_dash.LOG_LEVEL = logging.WARNING
+    sys.exit(main())
@@ -0,0 +1,125 @@
+""" Tests of dash_server.py. Run from the root of the repository with:
+    python -m unittest discover -s dist/server -p 'test_*.py'
+"""
+from __future__ import division
+import os
+import sys
+import shutil
+import httplib
+import logging
+import tempfile
+import threading
+import unittest
+from StringIO import StringIO
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "util"))
+import config_dash
+import dash_server
+
+ROOT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+MPD = "dist/sample_mpd/BigBuckBunny_4s.mpd"
+# First segment of the lowest bitrate of the MPD: 168 Kbits
+SEGMENT = "/media/BigBuckBunny/4sec/bunny_45226bps/BigBuckBunny_4s1.m4s"
+SEGMENT_SIZE = 168 * 128
+# The errors of the unknown sessions and segments are expected
+logging.getLogger(config_dash.LOG_NAME).addHandler(logging.NullHandler())
+
+
+class QuietHandler(dash_server.MyHTTPRequestHandler):
+    """ Request handler that does not log every request on stderr """
+    def log_message(self, *args):
+        pass
+
+
+class DashServerTest(unittest.TestCase):
+    def setUp(self):
+        config_dash.LOG = logging.getLogger(config_dash.LOG_NAME)
+        self.saved_cache_folder = config_dash.MANIFEST_CACHE_FOLDER
+        config_dash.MANIFEST_CACHE_FOLDER = tempfile.mkdtemp()
+        # The MPD files of the server are relative to the root of the repository
+        self.saved_folder = os.getcwd()
+        os.chdir(ROOT_FOLDER)
+        # The handler prints every request
+        self.saved_stdout = sys.stdout
+        sys.stdout = StringIO()
+        self.server = dash_server.ThreadedHTTPServer(('127.0.0.1', 0), QuietHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.connections = list()
+
+    def tearDown(self):
+        for connection in self.connections:
+            connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        dash_server.ACTIVE_DICT.clear()
+        dash_server.ACTIVE_LINKS.clear()
+        sys.stdout = self.saved_stdout
+        os.chdir(self.saved_folder)
+        shutil.rmtree(config_dash.MANIFEST_CACHE_FOLDER)
+        config_dash.MANIFEST_CACHE_FOLDER = self.saved_cache_folder
+
+    def connect(self):
+        connection = httplib.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=10)
+        self.connections.append(connection)
+        return connection
+
+    def get(self, connection, path, session_id=None):
+        """ :return: (status, body) of the response """
+        headers = {config_dash.SESSION_HEADER: session_id} if session_id else dict()
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def test_session_key(self):
+        """ The clients behind the same IP are told apart by their session ID """
+        status, body = self.get(self.connect(), "/" + MPD, "first")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body), os.path.getsize(MPD))
+        self.assertTrue(('127.0.0.1', "first") in dash_server.ACTIVE_DICT)
+        status, body = self.get(self.connect(), SEGMENT, "first")
+        self.assertEqual((status, len(body)), (200, SEGMENT_SIZE))
+        # Same IP, other session
+        self.assertEqual(self.get(self.connect(), SEGMENT, "second")[0], 404)
+        self.assertEqual(self.get(self.connect(), SEGMENT)[0], 404)
+        # The session ID can also be a query parameter
+        self.assertEqual(self.get(self.connect(), SEGMENT + "?session=first")[0], 200)
+
+    def test_session_registered_before_mpd(self):
+        """ The segments can be requested as soon as the MPD is read """
+        registered = list()
+        send_file = dash_server.send_file
+
+        def check_send_file(handler, request_file):
+            registered.append(handler.get_connection_id() in dash_server.ACTIVE_DICT)
+            return send_file(handler, request_file)
+        dash_server.send_file = check_send_file
+        try:
+            self.assertEqual(self.get(self.connect(), "/" + MPD, "first")[0], 200)
+        finally:
+            dash_server.send_file = send_file
+        self.assertEqual(registered, [True])
+
+    def test_keep_alive(self):
+        connection = self.connect()
+        self.assertEqual(self.get(connection, "/" + MPD, "first")[0], 200)
+        sock = connection.sock
+        self.assertTrue(sock is not None)
+        for _ in range(3):
+            status, body = self.get(connection, SEGMENT, "first")
+            self.assertEqual((status, len(body)), (200, SEGMENT_SIZE))
+        self.assertTrue(connection.sock is sock)
+
+    def test_unknown_segment(self):
+        connection = self.connect()
+        self.assertEqual(self.get(connection, "/" + MPD, "first")[0], 200)
+        # Unknown bitrate, segment number past the end of the MPD, unparsable URL
+        for path in (SEGMENT.replace("45226", "12345"), SEGMENT.replace("4s1.m4s", "4s1000.m4s"),
+                     "/media/segment.m4s"):
+            self.assertEqual(self.get(connection, path, "first")[0], 404, path)
+        self.assertEqual(self.get(connection, "/unknown.html", "first")[0], 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
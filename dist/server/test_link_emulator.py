@@ -0,0 +1,182 @@
+""" Tests of link_emulator.py. Run from the root of the repository with:
+    python -m unittest discover -s dist/server -p 'test_*.py'
+
+The links replay a synthetic trace with one delivery opportunity per ms (12 Mbps).
+The timing tests check that nothing is delivered early; the upper bounds leave room
+for a loaded machine.
+"""
+from __future__ import division
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+import threading
+import unittest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "util"))
+import config_dash
+import read_trace
+import link_emulator
+from read_trace import PACKET_SIZE
+
+# Seconds a delivery may be late
+SLACK = 0.05
+
+
+class RecordingConnection(object):
+    """ Socket that records the time and the total number of bytes of each sendall """
+    def __init__(self):
+        self.sent = 0
+        self.records = list()
+
+    def sendall(self, data):
+        self.sent += len(data)
+        self.records.append((time.time(), self.sent))
+
+    def time_of(self, size):
+        """ :return: Time at which the first size bytes were sent """
+        for timestamp, sent in self.records:
+            if sent >= size:
+                return timestamp
+
+
+class LinkTest(unittest.TestCase):
+    def setUp(self):
+        config_dash.LOG = logging.getLogger(config_dash.LOG_NAME)
+        self.folder = tempfile.mkdtemp()
+        trace_file = os.path.join(self.folder, "12Mbps.trace")
+        with open(trace_file, "w") as trace_handle:
+            trace_handle.write("1\n")
+        self.trace = read_trace.MahimahiTrace(trace_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def get_link(self, delay=0, queue_packets=link_emulator.DEFAULT_QUEUE_PACKETS, scheduler=None):
+        return link_emulator.EmulatedLink(self.trace, scheduler, delay, queue_packets)
+
+    def test_enqueue_queueing_delay(self):
+        """ The packets wait for the opportunities of the packets already in the queue """
+        link = self.get_link(queue_packets=10)
+        self.assertEqual(link.enqueue(5, 20), [(20, 5)])
+        # 3 packets are still queued at 22 ms: 7 of the 8 fit, the last one waits for the
+        # head of the queue to be delivered
+        self.assertEqual(link.enqueue(8, 22), [(25, 8)])
+        self.assertEqual(link.dropped_packets, 1)
+        # Idle link
+        self.assertEqual(link.enqueue(3, 100), [(100, 3)])
+
+    def test_enqueue_limit(self):
+        """ A queue smaller than the bandwidth-delay product sends queue_packets per round trip """
+        link = self.get_link(delay=20, queue_packets=10)
+        # The head of the queue (opportunity 20) is delivered at 21 ms, the next packets
+        # reach the queue 40 ms later
+        self.assertEqual(link.enqueue(40, 20), [(20, 10), (61, 10), (102, 10), (143, 10)])
+        self.assertEqual(link.dropped_packets, 30 + 20 + 10)
+        # A large queue holds the whole response
+        self.assertEqual(self.get_link(delay=20).enqueue(40, 20), [(20, 40)])
+
+    def test_queue_size(self):
+        self.assertRaises(ValueError, self.get_link, queue_packets=0)
+
+    def test_send_rate(self):
+        """ 150 packets take 150 ms and are never sent ahead of the trace """
+        link = self.get_link(scheduler=link_emulator.TimerWheel())
+        connection = RecordingConnection()
+        size = 150 * PACKET_SIZE
+        self.assertEqual(link.send(connection, size, memoryview(b"x" * 4096)), size)
+        self.assertEqual(connection.sent, size)
+        for timestamp, sent in connection.records:
+            packets = -(-sent // PACKET_SIZE)
+            # Opportunity i is at i + 1 ms of the trace
+            self.assertTrue(timestamp >= link.start_time + packets / 1000 - 0.001)
+        elapsed = connection.records[-1][0] - link.start_time
+        self.assertTrue(0.15 - 0.001 <= elapsed <= 0.15 + SLACK, elapsed)
+
+    def test_send_delay(self):
+        """ The response is delivered one round trip after the request is sent """
+        link = self.get_link(delay=50, scheduler=link_emulator.TimerWheel())
+        connection = RecordingConnection()
+        link.send(connection, 10 * PACKET_SIZE, memoryview(b"x" * PACKET_SIZE))
+        first = connection.records[0][0] - link.start_time
+        self.assertTrue(first >= 0.1, first)
+        self.assertTrue(connection.records[-1][0] - link.start_time <= 0.11 + SLACK)
+
+    def test_send_queue_limit(self):
+        """ 40 packets take 4 round trips through a queue of 10 packets """
+        data = memoryview(b"x" * PACKET_SIZE)
+        size = 40 * PACKET_SIZE
+        durations = list()
+        for queue_packets in (10, 250):
+            link = self.get_link(delay=20, queue_packets=queue_packets, scheduler=link_emulator.TimerWheel())
+            connection = RecordingConnection()
+            link.send(connection, size, data)
+            durations.append(connection.time_of(size) - link.start_time)
+        # Last packet at opportunity 20 + 40 + 40 + 40 + 9 (see test_enqueue_limit), delivered 20 ms later
+        self.assertTrue(0.17 <= durations[0] <= 0.17 + SLACK, durations)
+        self.assertTrue(0.08 <= durations[1] <= 0.08 + SLACK, durations)
+
+    def test_concurrent_sends(self):
+        """ Two responses on the same link share its opportunities """
+        link = self.get_link(scheduler=link_emulator.TimerWheel())
+        connections = [RecordingConnection(), RecordingConnection()]
+        size = 50 * PACKET_SIZE
+        threads = [threading.Thread(target=link.send, args=(connection, size, memoryview(b"x" * PACKET_SIZE)))
+                   for connection in connections]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        ends = sorted(connection.time_of(size) - link.start_time for connection in connections)
+        self.assertTrue(ends[0] >= 0.05 - 0.001, ends)
+        self.assertTrue(ends[1] >= 0.1 - 0.001, ends)
+        self.assertTrue(ends[1] <= 0.1 + SLACK, ends)
+
+
+class TimerWheelTest(unittest.TestCase):
+    def test_not_early(self):
+        wheel = link_emulator.TimerWheel()
+        for delay in (0.002, 0.01, 0.03):
+            deadline = time.time() + delay
+            wheel.wait_until(deadline)
+            now = time.time()
+            self.assertTrue(now >= deadline - 0.001, now - deadline)
+            self.assertTrue(now <= deadline + SLACK, now - deadline)
+
+    def test_past_deadline(self):
+        wheel = link_emulator.TimerWheel()
+        start = time.time()
+        wheel.wait_until(start - 1)
+        self.assertTrue(time.time() - start < SLACK)
+
+    def test_many_waiters(self):
+        """ Each thread is woken up at its own deadline """
+        wheel = link_emulator.TimerWheel()
+        start = time.time()
+        deadlines = [start + 0.005 * count for count in range(1, 21)]
+        woken = dict()
+
+        def wait(deadline):
+            wheel.wait_until(deadline)
+            woken[deadline] = time.time()
+        threads = [threading.Thread(target=wait, args=(deadline,)) for deadline in reversed(deadlines)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(sorted(woken), deadlines)
+        for deadline in deadlines:
+            self.assertTrue(deadline - 0.001 <= woken[deadline] <= deadline + SLACK)
+        self.assertEqual(wheel.pending, 0)
+
+    def test_several_turns(self):
+        """ A timer more than one turn of the wheel away waits for its own turn """
+        wheel = link_emulator.TimerWheel(slots=8)
+        deadline = time.time() + 0.03
+        wheel.wait_until(deadline)
+        self.assertTrue(deadline - 0.001 <= time.time() <= deadline + SLACK)
+
+
+if __name__ == "__main__":
+    unittest.main()
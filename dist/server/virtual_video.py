@@ -1,8 +1,8 @@
 import sys
 sys.path.append("./dist/util/")
-import read_mpd
 import config_dash
-import numpy as np
+import manifest_store
+
 
 class DashPlayback:
     """
@@ -15,23 +15,36 @@ class DashPlayback:
         self.playback_duration = None
         self.audio = dict()
         self.video = dict()
+        self.manifest = None
+
+
+def get_manifest(mpd_file):
+    """ Module to get the manifest_store.ManifestStore of the MPD file, shared by all the sessions of the MPD """
+    manifest = manifest_store.get_manifest(mpd_file)
+    for bw, representation in manifest.video.items():
+        ave_chunk_size = representation.average_size
+        config_dash.LOG.info("bw: %d chunk_size: %d bitrate: %d" % (bw, ave_chunk_size, ave_chunk_size/4))
+    return manifest
+
 
 class VirtualVideo():
     def __init__(self, mpd_file):
         self.mpd_file = mpd_file
         self.file_list = []
-        self.dp_object = DashPlayback()
-        self.dp_object, _ = read_mpd.read_mpd(self.mpd_file, self.dp_object)
-        for bw, media_obj in self.dp_object.video.items():
-            ave_chunk_size = np.mean(media_obj.segment_sizes)
-            config_dash.LOG.info("bw: %d chunk_size: %d bitrate: %d" % (bw, ave_chunk_size, ave_chunk_size/4))
-    
+        self.manifest = get_manifest(self.mpd_file)
+
     def get_video(self, video_url):
+        """ :return: The size of the segment of the URL, or None if its bitrate or segment is not in the MPD """
         self.file_list.append(video_url)
-        media_object = self.dp_object.video
+        media_object = self.manifest.video
         fields = video_url.split("/")
-        bandwidth = int( fields[-2].split("_")[-1][:-3] )
-        segment_id = int( fields[-1].split("_")[-1].split(".")[0][2:] )
-        config_dash.LOG.info("bitrate: {} segment_id: {} size: {}KB".format(
-            bandwidth, segment_id, media_object[bandwidth].segment_sizes[segment_id-1] >> 10))
-        return int(media_object[bandwidth].segment_sizes[segment_id-1])
\ No newline at end of file
+        try:
+            bandwidth = int( fields[-2].split("_")[-1][:-3] )
+            segment_id = int( fields[-1].split("_")[-1].split(".")[0][2:] )
+            segment_size = int(media_object[bandwidth].segment_sizes[segment_id-1])
+        except (IndexError, KeyError, ValueError):
+            config_dash.LOG.error("No segment of {} for the URL {}".format(self.mpd_file, video_url))
+            return None
+        config_dash.LOG.info("bitrate: {} segment_id: {} size: {}KB".format(bandwidth, segment_id,
+                                                                            segment_size >> 10))
+        return segment_size
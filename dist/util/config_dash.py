@@ -42,14 +42,24 @@ LOG_FILE_HANDLE = None
 LOG = None
 # JSON Filename
 JSON_LOG = os.path.join(LOG_FOLDER, strftime('ASTREAM_%Y-%m-%d.%H_%M_%S.json'))
-JSON_HANDLE = dict()
-JSON_HANDLE['playback_info'] = {'start_time': None,
-                                'end_time': None,
-                                'initial_buffering_duration': None,
-                                'interruptions': {'count': 0, 'events': list(), 'total_duration': 0},
-                                'up_shifts': 0,
-                                'down_shifts': 0
-                                }
+# JSON-lines file of the telemetry records (telemetry.py)
+TELEMETRY_LOG = os.path.join(LOG_FOLDER, strftime('ASTREAM_TELEMETRY_%Y-%m-%d.%H_%M_%S.jsonl'))
+# Sink of the current session. To be set by configure_log_file.configure_telemetry
+TELEMETRY = None
+
+
+def new_json_handle():
+    """ Returns the JSON_HANDLE of a new session """
+    json_handle = dict()
+    json_handle['playback_info'] = {'start_time': None,
+                                    'end_time': None,
+                                    'initial_buffering_duration': None,
+                                    'interruptions': {'count': 0, 'events': list(), 'total_duration': 0},
+                                    'up_shifts': 0,
+                                    'down_shifts': 0
+                                    }
+    return json_handle
+JSON_HANDLE = new_json_handle()
 # Constants for the BASIC-2 adaptation scheme
 BASIC_THRESHOLD = 10
 BASIC_UPPER_THRESHOLD = 1.2
@@ -91,5 +101,32 @@ index_rtt_avg = None
 index_rtt_max = None
 RTT = False
 
-# For FastMpc
-LOOKUP_FNAME = "/home/networklab/yc28/mpc_table.log"
\ No newline at end of file
+# Binary indexes of the parsed MPD/config files (manifest_store.py)
+MANIFEST_CACHE_FOLDER = "MANIFEST_CACHE/"
+# Bits per second of the unit of the bitrates of the manifests. The bandwidth of
+# the MPD files is in bps, the bitrates of the config files are in Kbps
+BITRATE_UNITS = {'bps': 1, 'Kbps': 1000}
+
+# For FastMpc (adaptation/mpc_table.py)
+# Lookup table (.npy or text table). If None, the table for the bitrates of the
+# MPD is generated in MPC_TABLE_FOLDER on the first use
+LOOKUP_FNAME = None
+MPC_TABLE_FOLDER = "MPC_TABLES/"
+# Number of segments in the MPC horizon. Shorter for the large sets of bitrates,
+# so that there are at most MPC_MAX_SEQUENCES bitrate sequences to score
+MPC_HORIZON = 5
+MPC_MAX_SEQUENCES = 10000
+# QoE weights of DashPlayer.sum_qoe: bitrate - switches - 3000 * rebuffering seconds
+MPC_REBUFFER_PENALTY = 3000
+MPC_SMOOTH_PENALTY = 1
+# Bandwidth bins from 0 to MPC_MAX_BW_FACTOR * highest bitrate
+MPC_BW_BINS = 201
+MPC_MAX_BW_FACTOR = 2
+# Buffer bins from 0 to NETFLIX_BUFFER_SIZE segments
+MPC_BUFFER_BINS = 121
+
+# HTTP header with the session ID of the client. The server tells apart the
+# sessions of the clients that share an IP address with it.
+SESSION_HEADER = 'X-Session-Id'
+# HTTP header with the name of the trace the server emulates for the session
+TRACE_HEADER = 'X-Trace'
@@ -1,9 +1,12 @@
 import logging
 import config_dash
 import sys
+import os
 from time import strftime
 import io
 import json
+import timeit
+import telemetry
 
 def configure_log_file(playback_type="", log_file=config_dash.LOG_FILENAME):
     """ Module to configure the log file and the log parameters.
@@ -27,12 +30,53 @@ def configure_log_file(playback_type="", log_file=config_dash.LOG_FILENAME):
         print("Started logging in the log file:{}".format(log_file))
 
 
-def write_json(json_data=config_dash.JSON_HANDLE, json_file=config_dash.JSON_LOG):
+def configure_session(log_folder):
+    """ Module to isolate the state of a session from the other sessions of the same host.
+    The log, buffer, JSON and telemetry files of the session are created in log_folder,
+    the JSON_HANDLE is reset and the telemetry sink of the previous session is closed.
     """
-    :param json_data: dict
-    :param json_file: json file
+    if not os.path.exists(log_folder):
+        os.makedirs(log_folder)
+    config_dash.LOG_FOLDER = log_folder
+    config_dash.LOG_FILENAME = os.path.join(log_folder, 'DASH_RUNTIME_LOG')
+    config_dash.BUFFER_LOG_FILENAME = os.path.join(log_folder, 'DASH_BUFFER_LOG.csv')
+    config_dash.JSON_LOG = os.path.join(log_folder, 'ASTREAM.json')
+    config_dash.TELEMETRY_LOG = os.path.join(log_folder, 'ASTREAM_TELEMETRY.jsonl')
+    config_dash.JSON_HANDLE = config_dash.new_json_handle()
+    close_telemetry()
+
+
+def configure_telemetry(json_file=None, clock=None):
+    """ Module to start the telemetry sink of a session (config_dash.TELEMETRY) after closing the current one.
+    :param json_file: JSON-lines file of the records. Default config_dash.TELEMETRY_LOG
+    :param clock: Function that returns the time of the session, used for the time of the records.
+        Default the wall clock
+    :return: The telemetry sink
+    """
+    close_telemetry()
+    if json_file is None:
+        json_file = config_dash.TELEMETRY_LOG
+    config_dash.TELEMETRY = telemetry.get_sink(json_file, clock=clock or timeit.default_timer)
+    return config_dash.TELEMETRY
+
+
+def close_telemetry():
+    """ Module to close the telemetry sink of the session (config_dash.TELEMETRY) """
+    if config_dash.TELEMETRY:
+        config_dash.TELEMETRY.close()
+        config_dash.TELEMETRY = None
+
+
+def write_json(json_data=None, json_file=None):
+    """
+    :param json_data: dict. Default config_dash.JSON_HANDLE
+    :param json_file: json file. Default config_dash.JSON_LOG
     :return: None
         Using utf-8 to reduce size of the file
     """
+    if json_data is None:
+        json_data = config_dash.JSON_HANDLE
+    if json_file is None:
+        json_file = config_dash.JSON_LOG
     with io.open(json_file, 'w', encoding='utf-8') as json_file_handle:
         json_file_handle.write(unicode(json.dumps(json_data, ensure_ascii=False)))
\ No newline at end of file
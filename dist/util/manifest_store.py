@@ -0,0 +1,294 @@
+""" Columnar store of the segment sizes of the MPD and config files
+
+    The segments of each representation (bitrate) are kept as NumPy columns
+    (size, and frame/layer/ssim for the config files) with the averages and the
+    prefix sums of the sizes computed once. A parsed manifest is saved as a
+    binary index (.npz) in config_dash.MANIFEST_CACHE_FOLDER, keyed by the hash of
+    the manifest file, so the next sessions load it without parsing the file.
+
+    Supported formats:
+        - MPD (XML) files with SegmentTemplate and SegmentSize elements (dist/sample_mpd/*.mpd)
+        - Config files with "bitrate frame_id layer_id size ssim" lines (dist/sample_mpd/*.config)
+"""
+from __future__ import division
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+import config_dash
+import read_mpd
+
+# Try to import the C implementation of ElementTree which is faster
+# In case of ImportError import the pure Python implementation
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+# Changed when the format of the binary index changes
+CACHE_VERSION = 3
+# Dictionary to convert size to bytes
+SIZE_DICT = {'bits':   0.125,
+             'Kbits':  128,
+             'Mbits':  1024*128,
+             'bytes':  1,
+             'KB':  1024,
+             'MB': 1024*1024,
+             }
+# Hardcoded values of the config files
+CONFIG_METADATA = {'playback_duration': "PT0H5M00S",
+                   'min_buffer_time': "PT1.50000S",
+                   'segment_duration': 4,
+                   'base_url': "media/BigBuckBunny/4sec/bunny_$Bandwidth$bps/BigBuckBunny_4s$Number$%d.m4s",
+                   'initialization': "media/BigBuckBunny/4sec/bunny_$Bandwidth$bps/BigBuckBunny_4s_init.mp4",
+                   'start': 0}
+
+# Manifest file -> (file hash, ManifestStore) of the manifests loaded by the process
+MANIFEST_CACHE = dict()
+MANIFEST_CACHE_LOCK = threading.Lock()
+
+
+class Representation(object):
+    """ Segments of one bitrate as NumPy columns """
+    def __init__(self, bandwidth, columns, media_type='video', base_url=None, initialization=None, start=None,
+                 timescale=None):
+        """
+        :param columns: dict of column name -> array. 'size' is the size of the segments in bytes
+        """
+        self.bandwidth = bandwidth
+        self.columns = dict((name, np.asarray(values)) for name, values in columns.items())
+        self.media_type = media_type
+        self.base_url = base_url
+        self.initialization = initialization
+        self.start = start
+        self.timescale = timescale
+        self.segment_sizes = self.columns['size']
+        self.segment_sizes.setflags(write=False)
+        # prefix_sums[n] is the total size of the first n segments
+        self.prefix_sums = np.concatenate(([0], np.cumsum(self.segment_sizes, dtype=np.int64)))
+        self.total_size = int(self.prefix_sums[-1])
+        if len(self.segment_sizes):
+            self.average_size = self.total_size / len(self.segment_sizes)
+        else:
+            self.average_size = 0
+        self.layers = dict()
+        if 'layer_id' in self.columns:
+            for layer_id in np.unique(self.columns['layer_id']):
+                self.layers[int(layer_id)] = self.segment_sizes[self.columns['layer_id'] == layer_id]
+
+    def get_size(self, first, last):
+        """ :return: Total size of the segments first to last - 1 """
+        return int(self.prefix_sums[last] - self.prefix_sums[first])
+
+    def get_metadata(self):
+        return {'bandwidth': self.bandwidth,
+                'media_type': self.media_type,
+                'base_url': self.base_url,
+                'initialization': self.initialization,
+                'start': self.start,
+                'timescale': self.timescale,
+                'columns': sorted(self.columns),
+                'segments': len(self.segment_sizes)}
+
+
+class ManifestStore(object):
+    """ Representations of a manifest and its playback information """
+    def __init__(self, representations, playback_duration=None, min_buffer_time=None, segment_duration=None,
+                 bitrate_unit='bps'):
+        """
+        :param bitrate_unit: Unit of the bandwidths of the representations (see config_dash.BITRATE_UNITS)
+        """
+        self.representations = representations
+        self.playback_duration = playback_duration
+        self.min_buffer_time = min_buffer_time
+        self.segment_duration = segment_duration
+        self.bitrate_unit = bitrate_unit
+        self.video = dict((representation.bandwidth, representation) for representation in representations
+                          if representation.media_type == 'video')
+        self.audio = dict((representation.bandwidth, representation) for representation in representations
+                          if representation.media_type == 'audio')
+        # Segment sizes of all the bitrates (rows) for each segment (columns), if all have the same length
+        self.bitrates = self.video.keys()
+        segment_counts = set(len(self.video[bitrate].segment_sizes) for bitrate in self.bitrates)
+        self.size_matrix = None
+        if len(segment_counts) == 1:
+            self.size_matrix = np.vstack([self.video[bitrate].segment_sizes for bitrate in self.bitrates])
+
+    def get_segment_sizes(self, segment_number):
+        """ :return: dict of bitrate -> size of the segment (bytes) """
+        if self.size_matrix is not None:
+            return dict(zip(self.bitrates, self.size_matrix[:, segment_number].tolist()))
+        return dict((bitrate, int(self.video[bitrate].segment_sizes[segment_number])) for bitrate in self.bitrates)
+
+    def get_average_segment_sizes(self):
+        """ :return: dict of bitrate -> average segment size (bytes) """
+        return dict((bitrate, self.video[bitrate].average_size) for bitrate in self.bitrates)
+
+    def get_metadata(self):
+        return {'version': CACHE_VERSION,
+                'playback_duration': self.playback_duration,
+                'min_buffer_time': self.min_buffer_time,
+                'segment_duration': self.segment_duration,
+                'bitrate_unit': self.bitrate_unit,
+                'representations': [representation.get_metadata() for representation in self.representations]}
+
+
+def parse_config(config_file):
+    """ Module to read the "bitrate frame_id layer_id size ssim" lines of a config file """
+    data = np.loadtxt(config_file, ndmin=2)
+    representations = list()
+    # Same order as the legacy dict of the bitrates
+    for bitrate in dict.fromkeys(int(bitrate) for bitrate in data[:, 0]):
+        rows = data[data[:, 0] == bitrate]
+        columns = {'frame_id': rows[:, 1].astype(np.int32),
+                   'layer_id': rows[:, 2].astype(np.int32),
+                   'size': rows[:, 3].astype(np.int64),
+                   'ssim': rows[:, 4]}
+        representations.append(Representation(bitrate, columns, base_url=CONFIG_METADATA['base_url'],
+                                              initialization=CONFIG_METADATA['initialization'],
+                                              start=CONFIG_METADATA['start'], timescale=len(rows)))
+    return ManifestStore(representations, read_mpd.get_playback_time(CONFIG_METADATA['playback_duration']),
+                         read_mpd.get_playback_time(CONFIG_METADATA['min_buffer_time']),
+                         CONFIG_METADATA['segment_duration'], bitrate_unit='Kbps')
+
+
+def parse_mpd(mpd_file):
+    """ Module to read an MPD file with iterparse. The elements are cleared once read """
+    playback_duration = min_buffer_time = segment_duration = None
+    representations = list()
+    media_type = None
+    # SegmentTemplate of the AdaptationSet, used by the Representations without their own
+    adaptation_template = None
+    template = None
+    bandwidth = None
+    sizes = list()
+    for event, element in ET.iterparse(mpd_file, events=('start', 'end')):
+        tag = read_mpd.get_tag_name(element.tag)
+        if event == 'start':
+            if tag == 'MPD':
+                if 'mediaPresentationDuration' in element.attrib:
+                    playback_duration = read_mpd.get_playback_time(element.attrib['mediaPresentationDuration'])
+                if 'minBufferTime' in element.attrib:
+                    min_buffer_time = read_mpd.get_playback_time(element.attrib['minBufferTime'])
+            elif tag == 'AdaptationSet':
+                media_type = element.attrib.get('mimeType', '').split('/')[0] or None
+                adaptation_template = None
+            elif tag == 'Representation':
+                bandwidth = int(element.attrib['bandwidth'])
+                template = adaptation_template
+                sizes = list()
+                if not media_type:
+                    media_type = element.attrib.get('mimeType', '').split('/')[0] or None
+            continue
+        if tag == 'SegmentTemplate':
+            if bandwidth is None:
+                adaptation_template = dict(element.attrib)
+            else:
+                template = dict(element.attrib)
+        elif tag == 'SegmentSize':
+            try:
+                sizes.append(int(float(element.attrib['size']) * SIZE_DICT[element.attrib['scale']]))
+            except KeyError, e:
+                config_dash.LOG.error("Error in reading Segment sizes :{}".format(e))
+        elif tag == 'Representation':
+            if media_type in ('audio', 'video') and template:
+                if media_type == 'video' and 'duration' in template:
+                    segment_duration = float(template['duration']) / float(template['timescale'])
+                representations.append(Representation(
+                    bandwidth, {'size': np.array(sizes, dtype=np.int64)}, media_type, template['media'],
+                    template.get('initialization'), int(template.get('startNumber', 1)),
+                    float(template['timescale'])))
+            bandwidth = None
+        elif tag == 'AdaptationSet':
+            media_type = None
+        # The parsed elements are not needed anymore
+        if tag != 'MPD':
+            element.clear()
+    if segment_duration is None:
+        raise ValueError("No video SegmentTemplate with a duration in {}".format(mpd_file))
+    return ManifestStore(representations, playback_duration, min_buffer_time, int(segment_duration))
+
+
+def get_file_hash(manifest_file):
+    with open(manifest_file, 'rb') as manifest_handle:
+        return hashlib.md5(manifest_handle.read()).hexdigest()
+
+
+def get_cache_file(manifest_file, file_hash):
+    """ :return: The binary index of the manifest in config_dash.MANIFEST_CACHE_FOLDER """
+    return os.path.join(config_dash.MANIFEST_CACHE_FOLDER, "{}_{}.npz".format(os.path.basename(manifest_file),
+                                                                             file_hash[:16]))
+
+
+def save_manifest(manifest, cache_file):
+    """ Write the manifest as a binary index: one array for each column with the segments
+        of all the representations, one after the other
+    """
+    arrays = {'metadata': np.array(json.dumps(manifest.get_metadata()))}
+    for name in set(name for representation in manifest.representations for name in representation.columns):
+        arrays[name] = np.concatenate([representation.columns[name] for representation in manifest.representations
+                                       if name in representation.columns])
+    folder = os.path.dirname(cache_file)
+    try:
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        # np.savez adds .npz to the names without it
+        with open(cache_file + ".tmp", 'wb') as cache_handle:
+            np.savez(cache_handle, **arrays)
+        os.rename(cache_file + ".tmp", cache_file)
+    except (IOError, OSError), e:
+        config_dash.LOG.warning("Unable to write the manifest index {}: {}".format(cache_file, e))
+
+
+def load_manifest(cache_file):
+    """ :return: The ManifestStore of a binary index """
+    with np.load(cache_file) as arrays:
+        metadata = json.loads(str(arrays['metadata']))
+        if metadata['version'] != CACHE_VERSION:
+            raise ValueError("Manifest index version {}".format(metadata['version']))
+        columns = dict((name, arrays[name]) for name in arrays.files if name != 'metadata')
+    # Position of the first segment of the next representation in each column
+    offsets = dict.fromkeys(columns, 0)
+    representations = list()
+    for info in metadata['representations']:
+        representation_columns = dict()
+        for name in info['columns']:
+            representation_columns[name] = columns[name][offsets[name]:offsets[name] + info['segments']]
+            offsets[name] += info['segments']
+        representations.append(Representation(info['bandwidth'], representation_columns, info['media_type'],
+                                              info['base_url'], info['initialization'], info['start'],
+                                              info['timescale']))
+    return ManifestStore(representations, metadata['playback_duration'], metadata['min_buffer_time'],
+                         metadata['segment_duration'], metadata['bitrate_unit'])
+
+
+def read_manifest(manifest_file, file_hash):
+    """ :return: The ManifestStore from the binary index of the manifest, or parsed from the file """
+    cache_file = get_cache_file(manifest_file, file_hash)
+    if os.path.exists(cache_file):
+        try:
+            return load_manifest(cache_file)
+        except (IOError, ValueError, KeyError), e:
+            config_dash.LOG.warning("Ignoring the manifest index {}: {}".format(cache_file, e))
+    with open(manifest_file, 'rb') as manifest_handle:
+        is_xml = manifest_handle.read(1024).lstrip().startswith('<')
+    if is_xml:
+        manifest = parse_mpd(manifest_file)
+    else:
+        manifest = parse_config(manifest_file)
+    save_manifest(manifest, cache_file)
+    return manifest
+
+
+def get_manifest(manifest_file):
+    """ Module to get the ManifestStore of an MPD or config file.
+        The manifest is parsed once and reused while the file does not change
+    """
+    file_hash = get_file_hash(manifest_file)
+    with MANIFEST_CACHE_LOCK:
+        if manifest_file in MANIFEST_CACHE and MANIFEST_CACHE[manifest_file][0] == file_hash:
+            return MANIFEST_CACHE[manifest_file][1]
+        manifest = read_manifest(manifest_file, file_hash)
+        MANIFEST_CACHE[manifest_file] = (file_hash, manifest)
+        return manifest
@@ -5,26 +5,12 @@
 """
 from __future__ import division
 import re
+import math
 import config_dash
-from collections import defaultdict
+import manifest_store
 
 FORMAT = 0
 URL_LIST = list()
-# Dictionary to convert size to bytes
-SIZE_DICT = {'bits':   0.125,
-             'Kbits':  128,
-             'Mbits':  1024*128,
-             'bytes':  1,
-             'KB':  1024,
-             'MB': 1024*1024,
-             }
-# Try to import the C implementation of ElementTree which is faster
-# In case of ImportError import the pure Python implementation
-try:
-    import xml.etree.cElementTree as ET
-except ImportError:
-    import xml.etree.ElementTree as ET
-
 MEDIA_PRESENTATION_DURATION = 'mediaPresentationDuration'
 MIN_BUFFER_TIME = 'minBufferTime'
 
@@ -61,13 +47,6 @@ def get_playback_time(playback_duration):
             total_duration += float(val) * 60 * 60
     return total_duration
 
-class SegmentInfo(object):
-    def __init__(self, _frame_id, _layer_id, _size, _ssim):
-        self.frame_id = _frame_id
-        self.layer_id = _layer_id
-        self.size = _size
-        self.ssim = _ssim
-
 class MediaObject(object):
     """Object to handel audio and video stream """
     def __init__(self):
@@ -78,12 +57,14 @@ class MediaObject(object):
         self.initialization = None
         self.base_url = None
         self.url_list = list()
-        self.segment_info = list()
+        self.segment_sizes = list()
+        # manifest_store.Representation with the columns of the segments
+        self.representation = None
 
     def __str__(self):
         return "min_buffer_time: {}; start: {}; timescale: {}\n".format(self.min_buffer_time, self.start, self.timescale) + \
             "segment_duration: {}; initialization: {}; base_url: {}".format(self.segment_duration, self.initialization, self.base_url) + \
-            "chunk_num: {}".format(len(self.segment_info))
+            "chunk_num: {}".format(len(self.segment_sizes))
 
 class DashPlayback:
     """
@@ -96,6 +77,23 @@ class DashPlayback:
         self.playback_duration = None
         self.audio = dict()
         self.video = dict()
+        self.manifest = None
+
+
+def get_media_duration(media, segment_duration):
+    """ Module to get the playback_duration of get_url_list that gives one URL for each segment size
+        (get_url_list also adds the URL of the segment after playback_duration)
+    """
+    return (len(media.segment_sizes) - media.start) * segment_duration
+
+
+def get_segment_count(playback_duration, segment_duration):
+    """ Module to get the number of segments of the playback. The last segment is shorter
+        than segment_duration when playback_duration is not a multiple of it
+        (Eg: 150 segments for 596.46 seconds of 4 second segments)
+    """
+    # Rounded so that the division errors do not add a segment
+    return int(math.ceil(round(playback_duration / segment_duration, 6)))
 
 
 def get_url_list(media, segment_duration,  playback_duration, bitrate):
@@ -111,10 +109,8 @@ def get_url_list(media, segment_duration,  playback_duration, bitrate):
         if "$Bandwidth$" in base_url:
             base_url = base_url.replace("$Bandwidth$", str(bitrate))
         if "$Number" in base_url:
-            base_url = base_url.split('$')
-            base_url[1] = base_url[1].replace('$', '')
-            base_url[1] = base_url[1].replace('Number', '')
-            base_url = ''.join(base_url)
+            # '$Number$%d' (sample MPDs), '$Number$' or '$Number%05d$'
+            base_url = re.sub(r'\$Number(%\d*d)?\$(%d)?', lambda match: match.group(1) or '%d', base_url)
         while True:
             media.url_list.append(base_url % segment_count)
             segment_count += 1
@@ -126,111 +122,32 @@ def get_url_list(media, segment_duration,  playback_duration, bitrate):
     #print media.url_list
     return media
 
-def read_videoconfig(config_file, dashplayback):
-    config_dash.LOG.info("Reading the config file")
-    chunk_info = defaultdict(list)
-    with open(config_file, "r") as fin:
-        for line in fin:
-            words = line.split(" ")
-            # frame_id, layer_id, size, ssim
-            segment = SegmentInfo(int(words[1]), int(words[2]),
-                                  int(words[3]), float(words[4]))
-            chunk_info[int(words[0])].append(segment)
-    config_dash.JSON_HANDLE["video_metadata"] = {'mpd_file': config_file}
+def read_mpd(mpd_file, dashplayback):
+    """ Module to read the MPD or config file (see manifest_store.py)
+    :return: (dashplayback, video_segment_duration)
+    """
+    config_dash.LOG.info("Reading the MPD file")
+    manifest = manifest_store.get_manifest(mpd_file)
+    config_dash.JSON_HANDLE["video_metadata"] = {'mpd_file': mpd_file}
+    dashplayback.playback_duration = manifest.playback_duration
+    dashplayback.min_buffer_time = manifest.min_buffer_time
+    dashplayback.manifest = manifest
+    config_dash.JSON_HANDLE["video_metadata"]['playback_duration'] = dashplayback.playback_duration
+    config_dash.JSON_HANDLE["video_metadata"]['bitrate_unit'] = manifest.bitrate_unit
     config_dash.LOG.info("Retrieving Media")
     config_dash.JSON_HANDLE["video_metadata"]['available_bitrates'] = list()
-
-    # hardcode video configuration
-    dashplayback.playback_duration = get_playback_time("PT0H5M00S")
-    dashplayback.min_buffer_time = get_playback_time("PT1.50000S")
-    config_dash.JSON_HANDLE["video_metadata"]['playback_duration'] = dashplayback.playback_duration
-    media_object = dashplayback.video
-    video_segment_duration = 4
-    for bw, chunks in chunk_info.items():
-        config_dash.JSON_HANDLE["video_metadata"]['available_bitrates'].append(bw)
-        media_object[bw] = MediaObject()
-        media_object[bw].segment_sizes = []
-        # hardcode those values
-        media_object[bw].base_url = "media/BigBuckBunny/4sec/bunny_$Bandwidth$bps/BigBuckBunny_4s$Number$%d.m4s"
-        media_object[bw].start = 0
-        media_object[bw].timescale = len(chunks)
-        media_object[bw].initialization = "media/BigBuckBunny/4sec/bunny_$Bandwidth$bps/BigBuckBunny_4s_init.mp4"
-        for segment in chunks:
-            media_object[bw].segment_info.append(segment)
-            media_object[bw].segment_sizes.append(segment.size)
-    return dashplayback, video_segment_duration
-
-
-def read_mpd(mpd_file, dashplayback):
-    return read_videoconfig(mpd_file, dashplayback)
-
-#def read_mpd(mpd_file, dashplayback):
-#    """ Module to read the MPD file"""
-#    global FORMAT
-#    config_dash.LOG.info("Reading the MPD file")
-#    try:
-#        tree = ET.parse(mpd_file)
-#    except IOError:
-#        config_dash.LOG.error("MPD file not found. Exiting")
-#        return None
-#    config_dash.JSON_HANDLE["video_metadata"] = {'mpd_file': mpd_file}
-#    root = tree.getroot()
-#    if 'MPD' in get_tag_name(root.tag).upper():
-#        if MEDIA_PRESENTATION_DURATION in root.attrib:
-#            dashplayback.playback_duration = get_playback_time(root.attrib[MEDIA_PRESENTATION_DURATION])
-#            config_dash.JSON_HANDLE["video_metadata"]['playback_duration'] = dashplayback.playback_duration
-#        if MIN_BUFFER_TIME in root.attrib:
-#            dashplayback.min_buffer_time = get_playback_time(root.attrib[MIN_BUFFER_TIME])
-#    format = 0;
-#    if "Period" in get_tag_name(root[0].tag):
-#        child_period = root[0]
-#        FORMAT = 0
-#    elif "Period" in get_tag_name(root[1].tag):
-#        child_period = root[1]
-#        FORMAT = 1
-#    #print child_period
-#    video_segment_duration = None
-#    if FORMAT == 0:
-#        for adaptation_set in child_period:
-#
-#            if 'mimeType' in adaptation_set.attrib:
-#
-#                media_found = False
-#                if 'audio' in adaptation_set.attrib['mimeType']:
-#                    media_object = dashplayback.audio
-#                    media_found = False
-#                    config_dash.LOG.info("Found Audio")
-#                elif 'video' in adaptation_set.attrib['mimeType']:
-#                    media_object = dashplayback.video
-#                    media_found = True
-#                    config_dash.LOG.info("Found Video")
-#                if media_found:
-#                    config_dash.LOG.info("Retrieving Media")
-#                    config_dash.JSON_HANDLE["video_metadata"]['available_bitrates'] = list()
-#                    for representation in adaptation_set:
-#                        bandwidth = int(representation.attrib['bandwidth'])
-#                        config_dash.JSON_HANDLE["video_metadata"]['available_bitrates'].append(bandwidth)
-#                        media_object[bandwidth] = MediaObject()
-#                        media_object[bandwidth].segment_sizes = []
-#                        for segment_info in representation:
-#                            if "SegmentTemplate" in get_tag_name(segment_info.tag):
-#                                media_object[bandwidth].base_url = segment_info.attrib['media']
-#                                media_object[bandwidth].start = int(segment_info.attrib['startNumber'])
-#                                media_object[bandwidth].timescale = float(segment_info.attrib['timescale'])
-#                                media_object[bandwidth].initialization = segment_info.attrib['initialization']
-#                            if 'video' in adaptation_set.attrib['mimeType']:
-#                                if "SegmentSize" in get_tag_name(segment_info.tag):
-#                                    try:
-#                                        segment_size = int( float(segment_info.attrib['size']) * SIZE_DICT[segment_info.attrib['scale']] )
-#                                    except KeyError, e:
-#                                        config_dash.LOG.error("Error in reading Segment sizes :{}".format(e))
-#                                        continue
-#                                    media_object[bandwidth].segment_sizes.append(segment_size)
-#                                elif "SegmentTemplate" in get_tag_name(segment_info.tag):
-#                                    video_segment_duration = (float(segment_info.attrib['duration'])/float(
-#                                        segment_info.attrib['timescale']))
-#                                    config_dash.LOG.debug("Segment Playback Duration = {}".format(video_segment_duration))
-#    else:
-#        print "Error: UknownFormat of MPD file!"
-#
-#    return dashplayback, int(video_segment_duration)
+    for representation in manifest.representations:
+        if representation.media_type == 'video':
+            config_dash.JSON_HANDLE["video_metadata"]['available_bitrates'].append(representation.bandwidth)
+            media_object = dashplayback.video
+        else:
+            media_object = dashplayback.audio
+        media = MediaObject()
+        media.base_url = representation.base_url
+        media.start = representation.start
+        media.timescale = representation.timescale
+        media.initialization = representation.initialization
+        media.segment_sizes = representation.segment_sizes
+        media.representation = representation
+        media_object[representation.bandwidth] = media
+    return dashplayback, manifest.segment_duration
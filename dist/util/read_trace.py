@@ -0,0 +1,62 @@
+""" Module for reading the mahimahi packet-delivery traces in trace/
+    Each line of a trace is a timestamp (in ms) at which one MTU-sized packet
+    can be delivered. The trace repeats itself once the last timestamp is reached.
+    Eg: '12Mbps.trace' has a single line "1", i.e. one 1500 byte packet every ms.
+"""
+from __future__ import division
+from bisect import bisect_left, bisect_right
+import config_dash
+
+# Size of a packet delivered at each delivery opportunity (bytes)
+PACKET_SIZE = 1500
+
+
+class MahimahiTrace(object):
+    """ Packet-delivery opportunities of a mahimahi trace """
+    def __init__(self, trace_file):
+        self.trace_file = trace_file
+        self.opportunities = list()
+        with open(trace_file, "r") as fin:
+            for line in fin:
+                line = line.strip()
+                if line:
+                    self.opportunities.append(int(line))
+        if not self.opportunities:
+            raise ValueError("Empty trace file: {}".format(trace_file))
+        self.opportunities.sort()
+        # Length of one repetition of the trace in ms
+        self.period = self.opportunities[-1]
+        if self.period <= 0:
+            raise ValueError("Trace {} must end with a positive timestamp".format(trace_file))
+        config_dash.LOG.info("Read trace {}: {} delivery opportunities over {} ms ({:.2f} Mbps)".format(
+            trace_file, len(self.opportunities), self.period, self.average_rate() / 1e6))
+
+    def average_rate(self):
+        """ :return: Average capacity of the trace in bits per second """
+        return len(self.opportunities) * PACKET_SIZE * 8 * 1000 / self.period
+
+    def first_opportunity(self, time_ms):
+        """ :return: Index of the first delivery opportunity at or after time_ms.
+            The opportunities are numbered across the repetitions of the trace
+        """
+        cycle = int(time_ms // self.period)
+        return cycle * len(self.opportunities) + bisect_left(self.opportunities, time_ms - cycle * self.period)
+
+    def opportunities_until(self, time_ms):
+        """ :return: Number of delivery opportunities at or before time_ms """
+        cycle = int(time_ms // self.period)
+        return cycle * len(self.opportunities) + bisect_right(self.opportunities, time_ms - cycle * self.period)
+
+    def opportunity_time(self, index):
+        """ :return: Time in ms of the delivery opportunity with the given index """
+        cycle, index = divmod(index, len(self.opportunities))
+        return cycle * self.period + self.opportunities[index]
+
+    def delivery_time(self, start_time, size):
+        """ Time at which the last byte of a transfer is delivered
+        :param start_time: Time (in seconds) at which the transfer starts
+        :param size: Number of bytes to deliver
+        :return: Time in seconds at which the transfer is completed
+        """
+        packets = max(1, -(-int(size) // PACKET_SIZE))
+        return self.opportunity_time(self.first_opportunity(start_time * 1000) + packets - 1) / 1000
@@ -0,0 +1,249 @@
+""" Module for the telemetry of a DASH session.
+
+    Recording an event on the hot path only appends a tuple to a bounded ring buffer
+    (collections.deque with maxlen). A background thread takes the records out of the
+    ring buffer and writes them to append-only files through handles that stay open:
+        - the records of a CSV stream (Eg: the buffer log of dash_buffer.py) as CSV rows,
+          with the header written only when the file is new,
+        - the other records as JSON lines: {"type": <stream>, "time": <timestamp>, ...}
+          The timestamps are taken from the clock of the sink: the clock of the session
+          (Eg: the virtual clock of a simulated session) or the wall clock.
+    If the writer falls behind, the oldest records are dropped (and counted) instead
+    of blocking the player.
+
+    Durations (adaptation decision latency, segment fetch time, rebuffering...) go to
+    Histograms with logarithmic buckets, summarized at the end of the session.
+"""
+from __future__ import division
+import os
+import csv
+import atexit
+import json
+import math
+import timeit
+import threading
+import itertools
+from bisect import bisect_left
+from collections import deque
+
+# Number of records kept in the ring buffer
+DEFAULT_CAPACITY = 65536
+# Seconds between the writes of the background thread
+DEFAULT_FLUSH_INTERVAL = 1.0
+# Upper bounds of the histogram buckets: 1us to ~1 hour, 4 buckets per power of 2
+HISTOGRAM_BOUNDS = [1e-6 * 2 ** (i / 4) for i in range(128)]
+HISTOGRAM_PERCENTILES = (50, 90, 99)
+# Sinks of get_sink that are still open. They are closed at exit
+OPEN_SINKS = set()
+OPEN_SINKS_LOCK = threading.Lock()
+
+
+class Histogram(object):
+    """ Histogram of durations (in seconds) with logarithmic buckets.
+        observe() is not locked: each histogram is expected to be fed by a single thread.
+    """
+    def __init__(self, bounds=HISTOGRAM_BOUNDS):
+        self.bounds = bounds
+        # The last bucket holds the values above the last bound
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        """ Add a value to the histogram """
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """ :return: Upper bound of the bucket of the percentile (the max for the last bucket) """
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(percent / 100 * self.count)))
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        """ :return: dict with the count, sum, mean, min, max and percentiles """
+        summary = {'count': self.count,
+                   'sum': self.total,
+                   'mean': self.total / self.count if self.count else None,
+                   'min': self.min,
+                   'max': self.max}
+        for percent in HISTOGRAM_PERCENTILES:
+            summary['p{}'.format(percent)] = self.percentile(percent)
+        return summary
+
+
+class TelemetrySink(object):
+    """ Ring buffer of the records of a session with a background writer """
+    def __init__(self, json_file=None, capacity=DEFAULT_CAPACITY, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 clock=timeit.default_timer):
+        """
+        :param json_file: JSON-lines file of the records that are not in a CSV stream.
+            If None these records are only kept in the ring buffer
+        :param capacity: Size of the ring buffer
+        :param flush_interval: Seconds between the writes of the background thread
+        :param clock: Source of the timestamps of the JSON records
+        """
+        self.json_file = json_file
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.records = deque(maxlen=capacity)
+        # Sequence numbers of the records. next() on itertools.count is atomic, so the
+        # records can come from several threads
+        self.counter = itertools.count()
+        self.written = 0
+        # Highest sequence number taken out of the ring buffer
+        self.last_sequence = -1
+        # stream -> (file name, file handle, csv writer)
+        self.csv_streams = dict()
+        self.json_handle = None
+        self.histograms = dict()
+        self.write_lock = threading.Lock()
+        self.wake_up = threading.Event()
+        self.closed = False
+        self.thread = None
+        if json_file:
+            self.start()
+
+    def add_csv(self, stream, csv_file, header):
+        """ Write the records of the stream as rows of csv_file. The header is written if the file is new """
+        with self.write_lock:
+            if stream in self.csv_streams and self.csv_streams[stream][0] == csv_file:
+                return
+            csv_handle = open(csv_file, 'ab')
+            writer = csv.writer(csv_handle, delimiter=",")
+            if csv_handle.tell() == 0:
+                writer.writerow(header)
+            self.csv_streams[stream] = (csv_file, csv_handle, writer)
+        self.start()
+
+    def start(self):
+        """ Start the background writer if it is not running """
+        if self.thread is None and not self.closed:
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def record(self, stream, row):
+        """ Add a record to the ring buffer
+        :param stream: Name of the stream of the record
+        :param row: tuple with the columns of a CSV stream, or a dict for the JSON lines
+        """
+        self.records.append((next(self.counter), stream, self.clock(), row))
+        if len(self.records) > self.capacity // 2:
+            self.wake_up.set()
+
+    def histogram(self, name):
+        """ :return: The histogram with the given name """
+        try:
+            return self.histograms[name]
+        except KeyError:
+            return self.histograms.setdefault(name, Histogram())
+
+    def observe(self, name, value):
+        """ Add a value to the histogram with the given name """
+        self.histogram(name).observe(value)
+
+    def run(self):
+        """ Background writer """
+        while not self.closed:
+            self.wake_up.wait(self.flush_interval)
+            self.wake_up.clear()
+            self.flush()
+
+    def flush(self):
+        """ Write the records of the ring buffer to the files """
+        with self.write_lock:
+            if self.json_handle is None and self.json_file:
+                self.json_handle = open(self.json_file, 'ab')
+            while True:
+                try:
+                    sequence, stream, timestamp, row = self.records.popleft()
+                except IndexError:
+                    break
+                self.written += 1
+                self.last_sequence = max(self.last_sequence, sequence)
+                if stream in self.csv_streams:
+                    self.csv_streams[stream][2].writerow([str(column) for column in row])
+                elif self.json_handle:
+                    self.write_json_record(stream, timestamp, row)
+            for _, csv_handle, _ in self.csv_streams.values():
+                csv_handle.flush()
+            if self.json_handle:
+                self.json_handle.flush()
+
+    def write_json_record(self, stream, timestamp, row):
+        """ Write a record as a JSON line. Called with the write_lock """
+        json_record = {'type': stream, 'time': timestamp}
+        json_record.update(row)
+        self.json_handle.write(json.dumps(json_record) + "\n")
+
+    def dropped(self):
+        """ :return: Number of records that were dropped from the ring buffer before they were written.
+            Exact once the records have been flushed
+        """
+        return self.last_sequence + 1 - self.written
+
+    def summary(self):
+        """ :return: dict with the summary of each histogram """
+        return dict((name, histogram.summary()) for name, histogram in self.histograms.items())
+
+    def close(self):
+        """ Stop the background writer, write the remaining records and the histograms and close the files """
+        if self.closed:
+            return
+        self.closed = True
+        with OPEN_SINKS_LOCK:
+            OPEN_SINKS.discard(self)
+        self.wake_up.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        with self.write_lock:
+            if self.json_handle:
+                self.write_json_record('summary', self.clock(), {'histograms': self.summary(),
+                                                                 'dropped_records': self.dropped()})
+            for _, csv_handle, _ in self.csv_streams.values():
+                csv_handle.close()
+            self.csv_streams = dict()
+            if self.json_handle:
+                self.json_handle.close()
+                self.json_handle = None
+
+
+def get_sink(json_file=None, **kwargs):
+    """ :return: A TelemetrySink that writes its JSON lines to json_file, creating its folder if needed.
+        The sink is closed at exit if it is still open
+    """
+    if json_file:
+        folder = os.path.dirname(json_file)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+    sink = TelemetrySink(json_file, **kwargs)
+    with OPEN_SINKS_LOCK:
+        OPEN_SINKS.add(sink)
+    return sink
+
+
+def close_sinks():
+    """ Close the sinks of get_sink that are still open """
+    with OPEN_SINKS_LOCK:
+        sinks = list(OPEN_SINKS)
+    for sink in sinks:
+        sink.close()
+
+
+atexit.register(close_sinks)
@@ -0,0 +1,132 @@
+""" Tests of manifest_store.py. Run with: python -m unittest discover -s dist/util -p 'test_*.py' """
+from __future__ import division
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import config_dash
+import manifest_store
+import read_mpd
+
+MPD = """<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" minBufferTime="PT1.500000S" type="static" mediaPresentationDuration="PT0H0M10.5S">
+  <Period duration="PT0H0M10.5S">
+    <AdaptationSet mimeType="video/mp4">
+      <Representation id="low" mimeType="video/mp4" bandwidth="45226">
+        <SegmentTemplate timescale="96" media="bunny_$Bandwidth$bps/BigBuckBunny_4s$Number$%d.m4s" startNumber="1" duration="384" initialization="bunny_$Bandwidth$bps/BigBuckBunny_4s_init.mp4"/>
+        <SegmentSize id="BigBuckBunny_4s1.m4s" size="168.0" scale="Kbits"/>
+        <SegmentSize id="BigBuckBunny_4s2.m4s" size="184.0" scale="Kbits"/>
+        <SegmentSize id="BigBuckBunny_4s3.m4s" size="100" scale="bytes"/>
+      </Representation>
+      <Representation id="high" mimeType="video/mp4" bandwidth="88783">
+        <SegmentTemplate timescale="96" media="bunny_$Bandwidth$bps/BigBuckBunny_4s$Number$%d.m4s" startNumber="1" duration="384" initialization="bunny_$Bandwidth$bps/BigBuckBunny_4s_init.mp4"/>
+        <SegmentSize id="BigBuckBunny_4s1.m4s" size="1" scale="KB"/>
+        <SegmentSize id="BigBuckBunny_4s2.m4s" size="2" scale="KB"/>
+        <SegmentSize id="BigBuckBunny_4s3.m4s" size="3" scale="KB"/>
+      </Representation>
+    </AdaptationSet>
+    <AdaptationSet mimeType="audio/mp4">
+      <SegmentTemplate timescale="1000" media="audio/seg$Number$.m4s" startNumber="1" duration="4000"/>
+      <Representation id="audio" mimeType="audio/mp4" bandwidth="32000">
+        <SegmentSize id="seg1.m4s" size="16" scale="KB"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+# bitrate frame_id layer_id size ssim
+CONFIG = """1200 0 0 1000 10.1
+1200 1 0 2000 10.2
+2000 0 0 3000 11.1
+2000 0 1 500 11.5
+"""
+# The warnings of the invalid indexes are expected
+logging.getLogger(config_dash.LOG_NAME).addHandler(logging.NullHandler())
+
+
+class ManifestStoreTest(unittest.TestCase):
+    def setUp(self):
+        config_dash.LOG = logging.getLogger(config_dash.LOG_NAME)
+        self.folder = tempfile.mkdtemp()
+        self.saved_cache_folder = config_dash.MANIFEST_CACHE_FOLDER
+        config_dash.MANIFEST_CACHE_FOLDER = os.path.join(self.folder, "cache")
+        manifest_store.MANIFEST_CACHE.clear()
+
+    def tearDown(self):
+        manifest_store.MANIFEST_CACHE.clear()
+        config_dash.MANIFEST_CACHE_FOLDER = self.saved_cache_folder
+        shutil.rmtree(self.folder)
+
+    def write_manifest(self, name, text):
+        manifest_file = os.path.join(self.folder, name)
+        with open(manifest_file, "w") as fout:
+            fout.write(text)
+        return manifest_file
+
+    def check_mpd(self, manifest):
+        self.assertEqual(sorted(manifest.bitrates), [45226, 88783])
+        self.assertEqual(manifest.bitrate_unit, 'bps')
+        self.assertEqual(manifest.playback_duration, 10.5)
+        self.assertEqual(manifest.min_buffer_time, 1.5)
+        self.assertEqual(manifest.segment_duration, 4)
+        low = manifest.video[45226]
+        self.assertEqual(low.segment_sizes.tolist(), [168 * 128, 184 * 128, 100])
+        self.assertEqual(low.start, 1)
+        self.assertEqual(low.base_url, "bunny_$Bandwidth$bps/BigBuckBunny_4s$Number$%d.m4s")
+        self.assertEqual(low.get_size(1, 3), 184 * 128 + 100)
+        self.assertEqual(manifest.get_segment_sizes(2), {45226: 100, 88783: 3072})
+        self.assertEqual(manifest.get_average_segment_sizes()[88783], 2048)
+        # The audio representation uses the SegmentTemplate of its AdaptationSet
+        self.assertEqual(manifest.audio[32000].segment_sizes.tolist(), [16384])
+        self.assertEqual(read_mpd.get_segment_count(manifest.playback_duration, manifest.segment_duration), 3)
+
+    def test_parse_mpd(self):
+        self.check_mpd(manifest_store.parse_mpd(self.write_manifest("test.mpd", MPD)))
+
+    def test_parse_config(self):
+        manifest = manifest_store.parse_config(self.write_manifest("test.config", CONFIG))
+        self.assertEqual(sorted(manifest.bitrates), [1200, 2000])
+        self.assertEqual(manifest.bitrate_unit, 'Kbps')
+        self.assertEqual(manifest.segment_duration, manifest_store.CONFIG_METADATA['segment_duration'])
+        self.assertEqual(manifest.video[2000].segment_sizes.tolist(), [3000, 500])
+        self.assertEqual(manifest.video[2000].layers[1].tolist(), [500])
+        self.assertEqual(manifest.video[1200].columns['ssim'].tolist(), [10.1, 10.2])
+        self.assertEqual(manifest.get_segment_sizes(1), {1200: 2000, 2000: 500})
+
+    def test_unequal_representations(self):
+        manifest = manifest_store.parse_config(self.write_manifest("test.config", CONFIG + "1200 2 0 4000 10.3\n"))
+        self.assertTrue(manifest.size_matrix is None)
+        self.assertEqual(manifest.get_segment_sizes(1), {1200: 2000, 2000: 500})
+
+    def test_cache(self):
+        mpd_file = self.write_manifest("test.mpd", MPD)
+        manifest = manifest_store.get_manifest(mpd_file)
+        self.assertTrue(manifest_store.get_manifest(mpd_file) is manifest)
+        cache_file = manifest_store.get_cache_file(mpd_file, manifest_store.get_file_hash(mpd_file))
+        self.assertTrue(os.path.exists(cache_file))
+        # The next process loads the binary index
+        self.check_mpd(manifest_store.load_manifest(cache_file))
+        manifest_store.MANIFEST_CACHE.clear()
+        self.check_mpd(manifest_store.get_manifest(mpd_file))
+
+    def test_modified_file(self):
+        config_file = self.write_manifest("test.config", CONFIG)
+        manifest = manifest_store.get_manifest(config_file)
+        self.write_manifest("test.config", CONFIG.replace("1200", "1500"))
+        modified = manifest_store.get_manifest(config_file)
+        self.assertFalse(modified is manifest)
+        self.assertEqual(sorted(modified.bitrates), [1500, 2000])
+
+    def test_invalid_cache(self):
+        config_file = self.write_manifest("test.config", CONFIG)
+        cache_file = manifest_store.get_cache_file(config_file, manifest_store.get_file_hash(config_file))
+        os.makedirs(os.path.dirname(cache_file))
+        with open(cache_file, "wb") as fout:
+            fout.write("not an index")
+        manifest = manifest_store.get_manifest(config_file)
+        self.assertEqual(sorted(manifest.bitrates), [1200, 2000])
+
+
+if __name__ == "__main__":
+    unittest.main()
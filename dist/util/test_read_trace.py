@@ -0,0 +1,64 @@
+""" Tests of read_trace.py. Run with: python -m unittest discover -s dist/util -p 'test_*.py' """
+from __future__ import division
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import config_dash
+import read_trace
+
+
+class MahimahiTraceTest(unittest.TestCase):
+    def setUp(self):
+        config_dash.LOG = logging.getLogger(config_dash.LOG_NAME)
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_trace(self, lines):
+        trace_file = os.path.join(self.folder, "test.trace")
+        with open(trace_file, "w") as fout:
+            fout.write("\n".join(lines) + "\n")
+        return read_trace.MahimahiTrace(trace_file)
+
+    def test_constant_trace(self):
+        # One packet every ms: 12 Mbps
+        trace = self.write_trace(["1"])
+        self.assertEqual(trace.period, 1)
+        self.assertAlmostEqual(trace.average_rate(), 12e6)
+        # 15000 bytes = 10 packets, delivered at 1, 2, ... 10 ms
+        self.assertAlmostEqual(trace.delivery_time(0, 15000), 0.010)
+        self.assertAlmostEqual(trace.delivery_time(1, 15000), 1.010)
+
+    def test_partial_packet(self):
+        trace = self.write_trace(["1"])
+        # A single byte still takes a delivery opportunity
+        self.assertAlmostEqual(trace.delivery_time(0, 1), 0.001)
+        self.assertAlmostEqual(trace.delivery_time(0, read_trace.PACKET_SIZE + 1), 0.002)
+
+    def test_repetition(self):
+        # Two opportunities per 10 ms cycle, at 5 and 10 ms
+        trace = self.write_trace(["5", "10", ""])
+        self.assertEqual(trace.period, 10)
+        self.assertEqual([trace.opportunity_time(index) for index in range(5)], [5, 10, 15, 20, 25])
+        self.assertEqual(trace.first_opportunity(0), 0)
+        self.assertEqual(trace.first_opportunity(6), 1)
+        self.assertEqual(trace.first_opportunity(11), 2)
+        self.assertEqual(trace.opportunities_until(10), 2)
+        self.assertEqual(trace.opportunities_until(24), 4)
+        # 3 packets from 7 ms: 10, 15 and 20 ms
+        self.assertAlmostEqual(trace.delivery_time(0.007, 3 * read_trace.PACKET_SIZE), 0.020)
+
+    def test_unsorted_trace(self):
+        trace = self.write_trace(["10", "5"])
+        self.assertEqual(trace.opportunities, [5, 10])
+
+    def test_invalid_traces(self):
+        self.assertRaises(ValueError, self.write_trace, [""])
+        self.assertRaises(ValueError, self.write_trace, ["0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
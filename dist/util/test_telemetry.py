@@ -0,0 +1,166 @@
+""" Tests of telemetry.py. Run with: python -m unittest discover -s dist/util -p 'test_*.py' """
+from __future__ import division
+import os
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+import config_dash
+import telemetry
+import configure_log_file
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class HistogramTest(unittest.TestCase):
+    def test_empty(self):
+        histogram = telemetry.Histogram()
+        self.assertEqual(histogram.percentile(50), None)
+        self.assertEqual(histogram.summary()['mean'], None)
+
+    def test_summary(self):
+        histogram = telemetry.Histogram()
+        for value in [0.001] * 90 + [0.1] * 9 + [2.0]:
+            histogram.observe(value)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 100)
+        self.assertAlmostEqual(summary['sum'], 0.09 + 0.9 + 2.0)
+        self.assertEqual(summary['min'], 0.001)
+        self.assertEqual(summary['max'], 2.0)
+        # The percentiles are the upper bounds of the buckets: within a factor 2 ** (1 / 4)
+        for percent, value in ((50, 0.001), (90, 0.001), (99, 0.1)):
+            self.assertTrue(value <= summary['p{}'.format(percent)] < value * 2 ** 0.25)
+        self.assertEqual(histogram.percentile(100), 2.0)
+
+    def test_out_of_bounds(self):
+        histogram = telemetry.Histogram()
+        histogram.observe(0)
+        histogram.observe(1e6)
+        self.assertEqual(histogram.buckets[0], 1)
+        self.assertEqual(histogram.buckets[-1], 1)
+        self.assertEqual(histogram.percentile(100), 1e6)
+
+
+class TelemetrySinkTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def read_json(self, json_file):
+        with open(json_file) as json_handle:
+            return [json.loads(line) for line in json_handle]
+
+    def read_csv(self, csv_file):
+        with open(csv_file) as csv_handle:
+            return list(csv.reader(csv_handle))
+
+    def test_records(self):
+        json_file = os.path.join(self.folder, "sub", "telemetry.jsonl")
+        csv_file = os.path.join(self.folder, "buffer.csv")
+        clock = FakeClock()
+        sink = telemetry.get_sink(json_file, clock=clock, flush_interval=60)
+        sink.add_csv('buffer', csv_file, ['time', 'state'])
+        sink.record('buffer', (0, 'INITIAL_BUFFERING'))
+        clock.now = 1.5
+        sink.record('segment', {'bitrate': 45226})
+        sink.record('buffer', (1.5, 'PLAY'))
+        sink.observe('decision', 0.001)
+        sink.close()
+        self.assertEqual(self.read_csv(csv_file), [['time', 'state'], ['0', 'INITIAL_BUFFERING'], ['1.5', 'PLAY']])
+        segment, summary = self.read_json(json_file)
+        self.assertEqual(segment, {'type': 'segment', 'time': 1.5, 'bitrate': 45226})
+        self.assertEqual(summary['type'], 'summary')
+        self.assertEqual(summary['dropped_records'], 0)
+        self.assertEqual(summary['histograms']['decision']['count'], 1)
+        # Closing twice does nothing
+        sink.close()
+        self.assertEqual(len(self.read_json(json_file)), 2)
+
+    def test_csv_header_once(self):
+        csv_file = os.path.join(self.folder, "buffer.csv")
+        for state in ('PLAY', 'END'):
+            sink = telemetry.TelemetrySink()
+            sink.add_csv('buffer', csv_file, ['state'])
+            sink.record('buffer', (state,))
+            sink.close()
+        self.assertEqual(self.read_csv(csv_file), [['state'], ['PLAY'], ['END']])
+
+    def test_dropped(self):
+        sink = telemetry.TelemetrySink(capacity=4)
+        for index in range(10):
+            sink.record('event', {'index': index})
+        self.assertEqual(len(sink.records), 4)
+        sink.flush()
+        self.assertEqual(sink.written, 4)
+        self.assertEqual(sink.dropped(), 6)
+        sink.close()
+
+    def test_background_writer(self):
+        json_file = os.path.join(self.folder, "telemetry.jsonl")
+        sink = telemetry.TelemetrySink(json_file, capacity=8, flush_interval=60)
+        # Filling half the ring buffer wakes up the writer
+        for index in range(5):
+            sink.record('event', {'index': index})
+        for _ in range(100):
+            if sink.written == 5:
+                break
+            sink.thread.join(0.01)
+        self.assertEqual(sink.written, 5)
+        sink.close()
+        self.assertEqual([record.get('index') for record in self.read_json(json_file)], [0, 1, 2, 3, 4, None])
+
+    def test_open_sinks(self):
+        sink = telemetry.get_sink()
+        other = telemetry.get_sink()
+        self.assertTrue(sink in telemetry.OPEN_SINKS)
+        sink.close()
+        self.assertFalse(sink in telemetry.OPEN_SINKS)
+        # What the atexit handler does
+        telemetry.close_sinks()
+        self.assertTrue(other.closed)
+        self.assertFalse(other in telemetry.OPEN_SINKS)
+
+
+class ConfigureTelemetryTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.saved_config = (config_dash.TELEMETRY, config_dash.TELEMETRY_LOG)
+        config_dash.TELEMETRY = None
+        config_dash.TELEMETRY_LOG = os.path.join(self.folder, "telemetry.jsonl")
+
+    def tearDown(self):
+        configure_log_file.close_telemetry()
+        config_dash.TELEMETRY, config_dash.TELEMETRY_LOG = self.saved_config
+        shutil.rmtree(self.folder)
+
+    def test_session_sinks(self):
+        """ Each session gets a new sink and the closed one is not kept in config_dash """
+        clock = FakeClock()
+        clock.now = 12.5
+        sink = configure_log_file.configure_telemetry(clock=clock)
+        self.assertTrue(config_dash.TELEMETRY is sink)
+        sink.record('segment', {'bitrate': 45226})
+        other = configure_log_file.configure_telemetry()
+        self.assertTrue(sink.closed)
+        self.assertFalse(other is sink)
+        configure_log_file.close_telemetry()
+        self.assertTrue(other.closed)
+        self.assertEqual(config_dash.TELEMETRY, None)
+        with open(config_dash.TELEMETRY_LOG) as json_handle:
+            records = [json.loads(line) for line in json_handle]
+        # The records are timed by the clock of the session
+        self.assertEqual([(record['type'], record['time']) for record in records[:2]],
+                         [('segment', 12.5), ('summary', 12.5)])
+
+
+if __name__ == "__main__":
+    unittest.main()